@@ -0,0 +1,35 @@
+#!/usr/bin/python3
+"""Micro-benchmarks for BaseModel construction and serialization
+
+Usage: ./benchmarks/bench_base_model.py [<number>]
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.place import Place  # noqa: E402
+
+
+def report(name, func, number):
+    """Print the best per-call time of func in microseconds"""
+    best = min(timeit.repeat(func, number=number, repeat=5))
+    print(f"{name:<28} {best / number * 1e6:8.2f} us")
+
+
+def main(number=20000):
+    """Run every micro-benchmark number times per repeat"""
+    place = Place(name="Loft", city_id="c", user_id="u", max_guest=4,
+                  price_by_night=120, latitude=37.7, longitude=-122.4)
+    record = place.to_dict()
+    report("Place()", Place, number)
+    report("Place(**record)", lambda: Place(**record), number)
+    report("Place.from_storage(record)",
+           lambda: Place.from_storage(record), number)
+    report("to_dict()", place.to_dict, number)
+    report("__str__()", place.__str__, number)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,396 @@
+#!/usr/bin/python3
+"""Benchmarks for DBStorage
+
+Runs against an embedded SQLite database in a temporary directory unless
+HBNB_TYPE_STORAGE / HBNB_DB_URL already point somewhere else.
+
+Usage: ./benchmarks/bench_db_storage.py <benchmark> [<count>]
+"""
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+WORKDIR = tempfile.mkdtemp()
+os.environ.setdefault('HBNB_TYPE_STORAGE', 'sqlite')
+os.environ.setdefault('HBNB_SQLITE_PATH', os.path.join(WORKDIR, 'hbnb.db'))
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert, text  # noqa: E402
+from models import storage  # noqa: E402
+from models.base_model import Base  # noqa: E402
+from models.amenity import Amenity  # noqa: E402
+from models.city import City  # noqa: E402
+from models.place import Place, place_amenity  # noqa: E402
+from models.review import Review  # noqa: E402
+from models.state import State  # noqa: E402
+from models.user import User  # noqa: E402
+
+
+def populate(states, cities_per_state=10):
+    """Store states with cities_per_state cities each; return state ids"""
+    ids = []
+    with storage.batch():
+        for i in range(states):
+            state = State(name=f"State {i}")
+            storage.new(state)
+            ids.append(state.id)
+            for j in range(cities_per_state):
+                storage.new(City(name=f"City {j}", state_id=state.id))
+    storage.save()
+    storage.close()
+    return ids
+
+
+def timed(func, repeat=3):
+    """Return the best wall time of repeat calls to func, in seconds"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def bench_writes(count=20000):
+    """Create + save() throughput, one commit per object and batched"""
+    start = time.perf_counter()
+    for i in range(count // 10):
+        state = State(name=f"Single {i}")
+        storage.new(state)
+        storage.save()
+    single = time.perf_counter() - start
+    start = time.perf_counter()
+    populate(count // 10, 9)
+    batched = time.perf_counter() - start
+    print(f"commit per object {count // 10 / single:10.0f} objects/s")
+    print(f"one batch         {count / batched:10.0f} objects/s")
+
+
+def bench_reads(states=2000):
+    """Read paths over states with ten cities each"""
+    ids = populate(states)
+    sample = random.sample(ids, min(len(ids), 1000))
+
+    def get():
+        for state_id in sample:
+            storage.get(State, state_id)
+        storage.close()
+
+    def related():
+        for state_id in sample:
+            storage.related(City, 'state_id', state_id)
+        storage.close()
+
+    def cities(load):
+        def walk():
+            for state in storage.all(State, load=load).values():
+                state.cities
+            storage.close()
+        return walk
+
+    print(f"{states} states, {states * 10} cities")
+    print(f"get()                {len(sample) / timed(get):10.0f} /s")
+    print(f"related()            {len(sample) / timed(related):10.0f} /s")
+    print(f"all(City)            "
+          f"{timed(lambda: storage.all(City)) * 1000:10.1f} ms")
+    print(f"states.cities lazy   {timed(cities(None)) * 1000:10.1f} ms")
+    print(f"states.cities loaded {timed(cities(['cities'])) * 1000:10.1f} ms")
+
+
+def bench_concurrent_reads(states=2000, threads=8, seconds=3):
+    """get() throughput from several threads sharing the pool"""
+    ids = populate(states)
+    done = []
+    stop = time.perf_counter() + seconds
+
+    def reader():
+        reads = 0
+        while time.perf_counter() < stop:
+            storage.get(State, random.choice(ids))
+            reads += 1
+        storage.close()
+        done.append(reads)
+
+    workers = [threading.Thread(target=reader) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    print(f"{threads} threads: {sum(done) / seconds:10.0f} get()/s")
+    print(storage.stats())
+
+
+def bench_bulk(count=100000):
+    """Session inserts against bulk_new() for states with one city each"""
+    def objects(prefix):
+        for i in range(count // 2):
+            state = State(name=f"{prefix} {i}")
+            yield state
+            yield City(name=f"{prefix} {i}", state_id=state.id)
+
+    start = time.perf_counter()
+    with storage.batch():
+        for obj in objects("Session"):
+            storage.new(obj)
+    storage.close()
+    session = time.perf_counter() - start
+    start = time.perf_counter()
+    storage.bulk_new(objects("Bulk"))
+    bulk = time.perf_counter() - start
+    print(f"session new() + commit {count / session:10.0f} rows/s")
+    print(f"bulk_new()             {count / bulk:10.0f} rows/s")
+
+
+def seed(states):
+    """Store a connected dataset; return sample values to look up"""
+    sample = {}
+    with storage.batch():
+        users = [User(email=f"user{i}@hbnb.io", password="pwd")
+                 for i in range(states)]
+        for user in users:
+            storage.new(user)
+        for i in range(states):
+            state = State(name=f"State {i}")
+            storage.new(state)
+            for j in range(10):
+                city = City(name=f"City {i}.{j}", state_id=state.id)
+                place = Place(name="Loft", city_id=city.id,
+                              user_id=users[j].id)
+                storage.new(city)
+                storage.new(place)
+                storage.new(Review(text="Nice", place_id=place.id,
+                                   user_id=users[i].id))
+        sample.update(state_id=state.id, name=state.name,
+                      email=users[-1].email, city_id=city.id,
+                      place_id=place.id)
+    storage.save()
+    storage.close()
+    return sample
+
+
+QUERIES = {
+    'cities of a state': "SELECT * FROM cities WHERE state_id = :state_id",
+    'state by name': "SELECT * FROM states WHERE name = :name",
+    'user by email': "SELECT * FROM users WHERE email = :email",
+    'places of a city': "SELECT * FROM places WHERE city_id = :city_id",
+    'reviews of a place': "SELECT * FROM reviews WHERE place_id = :place_id",
+}
+
+
+def bench_indexes(states=5000, lookups=200):
+    """Query plans and latency with and without the declared indexes"""
+    engine = storage._DBStorage__engine
+    sample = seed(states)
+    explain = ('EXPLAIN QUERY PLAN ' if engine.dialect.name == 'sqlite'
+               else 'EXPLAIN ')
+    indexes = [index for table in Base.metadata.sorted_tables
+               for index in table.indexes]
+    print(f"{states} states, {states * 10} cities, places and reviews")
+    for indexed in (True, False):
+        if not indexed:
+            for index in indexes:
+                index.drop(engine)
+            # fresh connections, so no cached statement keeps an old plan
+            engine.dispose()
+        print("declared indexes" if indexed else "without indexes")
+        with engine.connect() as connection:
+            for name, query in QUERIES.items():
+                plan = connection.execute(text(explain + query),
+                                          sample).fetchall()
+                elapsed = timed(lambda: [
+                    connection.execute(text(query), sample).fetchall()
+                    for _ in range(lookups)])
+                print(f"  {name:<20} {elapsed / lookups * 1e6:10.1f} us  "
+                      f"{' | '.join(str(row[-1]) for row in plan)}")
+    for index in indexes:
+        index.create(engine)
+
+
+def bench_search(count=1000000):
+    """search_places() latency over count places with five amenities each"""
+    rng = random.Random(0)
+    user = User(email="host@hbnb.io", password="pwd")
+    states = [State(name=f"State {i}") for i in range(50)]
+    cities = [City(name=f"City {i}", state_id=states[i % 50].id)
+              for i in range(1000)]
+    amenities = [Amenity(name=f"Amenity {i}") for i in range(30)]
+    storage.bulk_new([user] + states + cities + amenities)
+    links = []
+
+    def places():
+        for i in range(count):
+            place = Place(name="Loft", city_id=rng.choice(cities).id,
+                          user_id=user.id,
+                          price_by_night=rng.randrange(20, 500),
+                          max_guest=rng.randrange(1, 11))
+            links.extend({'place_id': place.id, 'amenity_id': amenity.id}
+                         for amenity in rng.sample(amenities, 5))
+            yield place
+    start = time.perf_counter()
+    storage.bulk_new(places(), chunk_size=10000)
+    session = storage._DBStorage__session
+    for i in range(0, len(links), 50000):
+        session.execute(insert(place_amenity), links[i:i + 50000])
+    storage.save()
+    storage.close()
+    print(f"{count} places loaded in {time.perf_counter() - start:.1f} s")
+    ids = [amenity.id for amenity in amenities]
+    queries = {
+        'one state': dict(states=[states[0].id]),
+        'city + 2 amenities': dict(cities=[cities[0].id], amenities=ids[:2]),
+        '3 amenities': dict(amenities=ids[:3]),
+        'state + amenity + price': dict(states=[states[1].id],
+                                        amenities=ids[3:4],
+                                        price_range=(100, 200)),
+        'price + guests': dict(price_range=(450, None), max_guest=9),
+    }
+    for name, query in queries.items():
+        def search():
+            found = storage.search_places(**query)
+            storage.close()
+            return found
+        found = len(search())
+        print(f"{name:<24} {found:>7} places "
+              f"{timed(search) * 1000:10.2f} ms")
+
+
+def bench_near(count=1000000):
+    """places_near() latency over count places clustered around towns"""
+    rng = random.Random(0)
+    towns = [(rng.uniform(25, 49), rng.uniform(-125, -67))
+             for _ in range(300)]
+    user = User(email="host@hbnb.io", password="pwd")
+    state = State(name="State")
+    city = City(name="City", state_id=state.id)
+    storage.bulk_new([user, state, city])
+
+    def places():
+        for _ in range(count):
+            latitude, longitude = rng.choice(towns)
+            yield Place(name="Loft", city_id=city.id, user_id=user.id,
+                        latitude=rng.gauss(latitude, 0.2),
+                        longitude=rng.gauss(longitude, 0.2))
+    start = time.perf_counter()
+    storage.bulk_new(places(), chunk_size=10000)
+    print(f"{count} places loaded in {time.perf_counter() - start:.1f} s")
+    latitude, longitude = towns[0]
+    queries = {
+        'town centre 2 km': (latitude, longitude, 2, None),
+        'town 10 km, 20 nearest': (latitude, longitude, 10, 20),
+        'region 50 km': (latitude, longitude, 50, None),
+        'empty 25 km': (49.5, -60.0, 25, None),
+    }
+    for name, query in queries.items():
+        def near():
+            found = storage.places_near(*query)
+            storage.close()
+            return found
+        found = len(near())
+        print(f"{name:<24} {found:>7} places "
+              f"{timed(near) * 1000:10.2f} ms")
+
+
+def bench_aggregate(count=200000):
+    """SQL GROUP BY against averaging all(Place) in Python"""
+    rng = random.Random(0)
+    user = User(email="host@hbnb.io", password="pwd")
+    states = [State(name=f"State {i}") for i in range(50)]
+    cities = [City(name=f"City {i}", state_id=states[i % 50].id)
+              for i in range(1000)]
+    storage.bulk_new([user] + states + cities)
+    storage.bulk_new((Place(name="Loft", city_id=rng.choice(cities).id,
+                            user_id=user.id,
+                            price_by_night=rng.randrange(20, 500),
+                            max_guest=rng.randrange(1, 11))
+                      for _ in range(count)), chunk_size=10000)
+    storage.close()
+
+    def loop():
+        prices = {}
+        for place in storage.all(Place).values():
+            prices.setdefault(place.city_id, []).append(place.price_by_night)
+        storage.close()
+        return {city_id: sum(values) / len(values)
+                for city_id, values in prices.items()}
+
+    def aggregate(group_by, percentiles=()):
+        def run():
+            found = storage.aggregate(Place, 'price_by_night', group_by,
+                                      percentiles)
+            storage.close()
+            return found
+        return run
+    print(f"{count} places")
+    print(f"mean per city, python loop   {timed(loop) * 1000:10.1f} ms")
+    print(f"mean per city, GROUP BY      "
+          f"{timed(aggregate('city_id')) * 1000:10.1f} ms")
+    print(f"mean per state, GROUP BY     "
+          f"{timed(aggregate('state_id')) * 1000:10.1f} ms")
+    print(f"p50/p90 per city, two columns "
+          f"{timed(aggregate('city_id', [50, 90])) * 1000:9.1f} ms")
+
+
+def bench_text(count=200000):
+    """search_text() through FTS5 against a LIKE scan of descriptions"""
+    engine = storage._DBStorage__engine
+    rng = random.Random(0)
+    words = ["sunny", "loft", "quiet", "cabin", "beach", "river", "view",
+             "garden", "cozy", "modern", "forest", "pool"]
+    words += [f"word{i}" for i in range(20000)]
+    weights = [1 / (rank + 1) for rank in range(len(words))]
+    user = User(email="host@hbnb.io", password="pwd")
+    state = State(name="State")
+    city = City(name="City", state_id=state.id)
+    storage.bulk_new([user, state, city])
+    start = time.perf_counter()
+    storage.bulk_new((Place(name="Place", city_id=city.id, user_id=user.id,
+                            description=" ".join(
+                                rng.choices(words, weights, k=30)))
+                      for _ in range(count)), chunk_size=10000)
+    print(f"{count} places loaded and indexed in "
+          f"{time.perf_counter() - start:.1f} s")
+    for query in ("word1234", "river word50", "sunny loft"):
+        def search():
+            found = storage.search_text(Place, query)
+            storage.close()
+            return found
+
+        def like():
+            with engine.connect() as connection:
+                return connection.execute(
+                    text("SELECT id FROM places WHERE " + " OR ".join(
+                        "description LIKE :w{}".format(i)
+                        for i in range(len(query.split())))),
+                    {f"w{i}": f"%{word}%" for i, word in
+                     enumerate(query.split())}).fetchall()
+        print(f"{query:<16} FTS5 {timed(search) * 1000:10.2f} ms  "
+              f"LIKE scan {timed(like, 1) * 1000:10.1f} ms")
+
+
+BENCHMARKS = {
+    'writes': bench_writes,
+    'reads': bench_reads,
+    'concurrent_reads': bench_concurrent_reads,
+    'indexes': bench_indexes,
+    'bulk': bench_bulk,
+    'search': bench_search,
+    'near': bench_near,
+    'aggregate': bench_aggregate,
+    'text': bench_text,
+}
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2 or sys.argv[1] not in BENCHMARKS:
+        print(__doc__.strip())
+        print("Benchmarks: " + ", ".join(BENCHMARKS))
+        sys.exit(1)
+    try:
+        BENCHMARKS[sys.argv[1]](*[int(arg) for arg in sys.argv[2:]])
+    finally:
+        shutil.rmtree(WORKDIR)
@@ -0,0 +1,543 @@
+#!/usr/bin/python3
+"""Benchmarks for FileStorage
+
+Usage: ./benchmarks/bench_file_storage.py <benchmark> [<count>]
+"""
+import heapq
+import itertools
+import json
+import os
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import storage  # noqa: E402
+from models.amenity import Amenity  # noqa: E402
+from models.city import City  # noqa: E402
+from models.engine import analytics, geo  # noqa: E402
+from models.engine.text_index import tokenize  # noqa: E402
+from models.place import Place  # noqa: E402
+from models.review import Review  # noqa: E402
+from models.state import State  # noqa: E402
+from models.user import User  # noqa: E402
+
+CLASSES = [Review, Review, Review, Place, Place, User, City, Amenity, State]
+
+
+def populate(count):
+    """Fill storage with count objects of mixed classes"""
+    storage.all().clear()
+    for i in range(count):
+        storage.new(CLASSES[i % len(CLASSES)]())
+
+
+def timed(func, repeat=5):
+    """Return the best wall time of repeat calls to func, in seconds"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def bench_class_lookup(count=1000000):
+    """Per-class all(cls) lookups against a full scan of the store"""
+    populate(count)
+    objects = storage.all()
+    print(f"{count} objects in storage")
+    for cls in (State, Amenity, City, Review):
+        def scan():
+            return {key: value for key, value in objects.items()
+                    if isinstance(value, cls) or
+                    cls == value.__class__.__name__}
+        size = len(storage.all(cls))
+        indexed = timed(lambda: storage.all(cls.__name__))
+        full = timed(scan, repeat=2)
+        print(f"all({cls.__name__:<8}) {size:>8} objects: "
+              f"indexed {indexed * 1000:9.3f} ms  "
+              f"full scan {full * 1000:9.3f} ms")
+
+
+def bench_journal(count=100000, baseline=2000):
+    """Sequential create + save(), journal against full rewrites
+
+    Full rewrites are quadratic, so they run baseline creates only.
+    """
+    workdir = tempfile.mkdtemp()
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        for journal, runs in ((True, count), (False, baseline)):
+            storage.all().clear()
+            storage._FileStorage__journal = journal
+            start = time.perf_counter()
+            for i in range(runs):
+                CLASSES[i % len(CLASSES)]().save()
+            elapsed = time.perf_counter() - start
+            written = sum(os.path.getsize(path) for path in os.listdir('.'))
+            print(f"{'journal' if journal else 'snapshot':<8} {runs} creates:"
+                  f" {elapsed:9.3f} s  {runs / elapsed:10.0f} creates/s"
+                  f"  {written / 1e6:8.1f} MB on disk")
+            for path in os.listdir('.'):
+                os.remove(path)
+    finally:
+        vars(storage).pop('_FileStorage__journal', None)
+        os.chdir(cwd)
+        shutil.rmtree(workdir)
+
+
+def bench_dirty_save(count=200000, touched=10):
+    """save() after touching a handful of objects in a large store"""
+    workdir = tempfile.mkdtemp()
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        populate(count)
+        storage.save()
+        objects = list(storage.all().values())
+
+        def touch_and_save():
+            for obj in objects[:touched]:
+                obj.name = "touched"
+            storage.save()
+
+        def uncached_save():
+            storage._FileStorage__serialized.clear()
+            touch_and_save()
+
+        print(f"{count} objects, {touched} modified per save")
+        print(f"save() reusing clean objects: "
+              f"{timed(touch_and_save) * 1000:9.1f} ms")
+        print(f"save() serializing all:       "
+              f"{timed(uncached_save) * 1000:9.1f} ms")
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir)
+
+
+def write_snapshot(path, size_mb):
+    """Write a synthetic snapshot of roughly size_mb megabytes"""
+    template = CLASSES[0]().to_dict()
+    written = 0
+    i = 0
+    with open(path, 'w') as f:
+        # one record per line, as FileStorage.compact() writes them
+        f.write('{\n')
+        while written < size_mb * 1024 * 1024:
+            cls = CLASSES[i % len(CLASSES)]
+            record = dict(template, __class__=cls.__name__,
+                          id=str(uuid.UUID(int=i)), text="review " * 8)
+            text = ('' if i == 0 else ',\n') + json.dumps(
+                cls.__name__ + '.' + record['id']) + ': ' + json.dumps(record)
+            f.write(text)
+            written += len(text)
+            i += 1
+        f.write('\n}')
+    return i
+
+
+def reload_child(mode, path):
+    """Reload path in this process and report time and peak RSS"""
+    type(storage)._FileStorage__file_path = path
+    start = time.perf_counter()
+    if mode == 'stream':
+        storage.reload()
+    else:
+        classes = {cls.__name__: cls for cls in CLASSES}
+        with open(path) as f:
+            for key, val in json.load(f).items():
+                storage.all()[key] = classes[val['__class__']](**val)
+    elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"{mode:<9} {len(storage.all())} objects: {elapsed:8.2f} s"
+          f"  peak RSS {peak:9.1f} MB")
+
+
+def bench_reload_memory(size_mb=2048):
+    """Peak memory of streaming reload() against json.load()"""
+    workdir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(workdir, 'file.json')
+        count = write_snapshot(path, size_mb)
+        print(f"{size_mb} MB snapshot, {count} records")
+        for mode in ('stream', 'json.load'):
+            subprocess.run([sys.executable, os.path.abspath(__file__),
+                            '--reload-child', mode, path], check=True)
+    finally:
+        shutil.rmtree(workdir)
+
+
+def bench_lazy_reload(size_mb=100):
+    """reload() + one lookup, eager against lazy materialization"""
+    workdir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(workdir, 'file.json')
+        count = write_snapshot(path, size_mb)
+        type(storage)._FileStorage__file_path = path
+        print(f"{size_mb} MB snapshot, {count} records")
+        key = 'Review.' + str(uuid.UUID(int=count // 2 // 3 * 3))
+        for lazy in (True, False):
+            storage.all().clear()
+            storage._FileStorage__lazy = lazy
+            start = time.perf_counter()
+            storage.reload()
+            loaded = time.perf_counter()
+            storage.get('Review', key.partition('.')[2])
+            done = time.perf_counter()
+            print(f"{'lazy' if lazy else 'eager':<6} reload "
+                  f"{(loaded - start) * 1000:9.1f} ms  first get "
+                  f"{(done - loaded) * 1000:7.3f} ms")
+    finally:
+        vars(storage).pop('_FileStorage__lazy', None)
+        shutil.rmtree(workdir)
+
+
+def bench_formats(count=200000):
+    """Save/reload throughput and file size, JSON against binary"""
+    workdir = tempfile.mkdtemp()
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        populate(count)
+        print(f"{count} objects")
+        for fmt in ('json', 'binary'):
+            storage.convert(fmt)
+
+            def save():
+                storage._FileStorage__serialized.clear()
+                storage.compact()
+            save = timed(save, repeat=3)
+            size = os.path.getsize('file.json')
+
+            def reload():
+                storage.all().clear()
+                storage.reload()
+            load = timed(reload, repeat=3)
+            print(f"{fmt:<7} save {count / save:10.0f} obj/s  "
+                  f"reload {count / load:10.0f} obj/s  "
+                  f"size {size / 1e6:8.1f} MB")
+    finally:
+        type(storage)._FileStorage__format = None
+        os.chdir(cwd)
+        shutil.rmtree(workdir)
+
+
+def rss_mb():
+    """Current resident set size of this process in MB (Linux)"""
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def compact_child(mode, path):
+    """Reload and rewrite path in this process, report the RSS it adds
+
+    compact() encodes every object, as saves do over time.
+    """
+    type(storage)._FileStorage__file_path = path
+    storage._FileStorage__compact = mode == 'compact'
+    before = rss_mb()
+    storage.reload()
+    storage.compact()
+    used = rss_mb() - before
+    count = storage.count()
+    print(f"{mode:<8} {count} objects: {used:8.1f} MB RSS"
+          f"  {used * 1024 * 1024 / count:7.0f} bytes/object")
+
+
+def bench_compact_memory(count=200000):
+    """Process memory after reload() + compact(), regular against compact
+
+    Each mode runs in a fresh process and keeps whatever storage holds
+    in normal use, serialized cache included.
+    """
+    workdir = tempfile.mkdtemp()
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        populate(count)
+        parents = [str(uuid.uuid4()) for _ in range(100)]
+        for i, obj in enumerate(storage.all().values()):
+            for name in ('state_id', 'city_id', 'place_id', 'user_id'):
+                if hasattr(obj, name):
+                    setattr(obj, name, parents[i % len(parents)])
+        storage.save()
+        path = os.path.join(workdir, 'file.json')
+        for mode in ('regular', 'compact'):
+            subprocess.run([sys.executable, os.path.abspath(__file__),
+                            '--compact-child', mode, path], check=True)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir)
+
+
+def search_dataset(count, place_cls, city_cls, state_cls):
+    """Build count places over 1000 cities in 50 states; return queries"""
+    rng = random.Random(0)
+    states = [state_cls() for _ in range(50)]
+    cities = [city_cls(state_id=states[i % 50].id) for i in range(1000)]
+    amenities = [str(uuid.UUID(int=i)) for i in range(30)]
+    places = [place_cls(city_id=rng.choice(cities).id,
+                        price_by_night=rng.randrange(20, 500),
+                        max_guest=rng.randrange(1, 11),
+                        amenity_ids=rng.sample(amenities, 5))
+              for _ in range(count)]
+    queries = {
+        'one state': dict(states=[states[0].id]),
+        'city + 2 amenities': dict(cities=[cities[0].id],
+                                   amenities=amenities[:2]),
+        '3 amenities': dict(amenities=amenities[:3]),
+        'state + amenity + price': dict(states=[states[1].id],
+                                        amenities=amenities[3:4],
+                                        price_range=(100, 200)),
+        'price + guests': dict(price_range=(450, None), max_guest=9),
+    }
+    return states + cities + places, queries
+
+
+def scan_places(places, cities_of_state, states=None, cities=None,
+                amenities=None, price_range=None, max_guest=None):
+    """Filter places one by one, as callers had to before search_places"""
+    city_ids = set(cities or ())
+    for state_id in states or ():
+        city_ids.update(cities_of_state[state_id])
+    low, high = price_range or (None, None)
+    return [place for place in places
+            if (not city_ids or place.city_id in city_ids) and
+            all(a in place.amenity_ids for a in amenities or ()) and
+            (low is None or place.price_by_night >= low) and
+            (high is None or place.price_by_night <= high) and
+            (max_guest is None or place.max_guest >= max_guest)]
+
+
+def bench_search(count=1000000):
+    """search_places() latency against scanning every place"""
+    storage.all().clear()
+    objects, queries = search_dataset(count, Place, City, State)
+    for obj in objects:
+        storage.new(obj)
+    places = list(storage.all(Place).values())
+    cities_of_state = {}
+    for city in storage.all(City).values():
+        cities_of_state.setdefault(city.state_id, []).append(city.id)
+    print(f"{count} places")
+    for name, query in queries.items():
+        found = len(storage.search_places(**query))
+        indexed = timed(lambda: storage.search_places(**query))
+        scan = timed(lambda: scan_places(places, cities_of_state, **query),
+                     repeat=1)
+        print(f"{name:<24} {found:>7} places: indexed "
+              f"{indexed * 1000:9.2f} ms  scan {scan * 1000:9.1f} ms")
+
+
+def near_dataset(count, place_cls, seed=0):
+    """Yield count places clustered around 300 towns in a US-sized box"""
+    rng = random.Random(seed)
+    towns = [(rng.uniform(25, 49), rng.uniform(-125, -67))
+             for _ in range(300)]
+    for _ in range(count):
+        latitude, longitude = rng.choice(towns)
+        yield place_cls(name="Loft",
+                        latitude=min(90.0, rng.gauss(latitude, 0.2)),
+                        longitude=rng.gauss(longitude, 0.2))
+
+
+def bench_near(count=1000000):
+    """places_near() latency against a distance scan of every place"""
+    storage.all().clear()
+    for place in near_dataset(count, Place):
+        storage.new(place)
+    places = list(storage.all(Place).values())
+    town = places[0]
+    queries = {
+        'town centre 2 km': (town.latitude, town.longitude, 2, None),
+        'town 10 km, 20 nearest': (town.latitude, town.longitude, 10, 20),
+        'region 50 km': (town.latitude, town.longitude, 50, None),
+        'empty 25 km': (49.5, -60.0, 25, None),
+    }
+
+    def scan(latitude, longitude, radius_km, limit):
+        found = sorted(
+            (distance, place.id) for place in places
+            for distance in [geo.distance_km(latitude, longitude,
+                                             place.latitude, place.longitude)]
+            if distance <= radius_km)
+        return found[:limit]
+    print(f"{count} places")
+    for name, query in queries.items():
+        found = len(storage.places_near(*query))
+        indexed = timed(lambda: storage.places_near(*query))
+        brute = timed(lambda: scan(*query), repeat=1)
+        print(f"{name:<24} {found:>7} places: indexed "
+              f"{indexed * 1000:9.2f} ms  scan {brute * 1000:9.1f} ms")
+
+
+def bench_aggregate(count=1000000):
+    """aggregate() against a Python loop over all(Place)"""
+    storage.all().clear()
+    objects, _ = search_dataset(count, Place, City, State)
+    for obj in objects:
+        storage.new(obj)
+
+    def loop():
+        prices = {}
+        for place in storage.all(Place).values():
+            prices.setdefault(place.city_id, []).append(place.price_by_night)
+        stats = {}
+        for city_id, values in prices.items():
+            values.sort()
+            total = sum(values)
+            stats[city_id] = (len(values), total, total / len(values),
+                              values[0], values[-1],
+                              values[(len(values) - 1) // 2],
+                              values[(len(values) - 1) * 9 // 10])
+        return stats
+
+    def aggregate():
+        return storage.aggregate(Place, 'price_by_night', 'city_id',
+                                 [50, 90])
+    print(f"{count} places, NumPy "
+          f"{'not installed' if analytics.numpy is None else 'installed'}")
+    print(f"python loop {timed(loop, repeat=1) * 1000:10.1f} ms")
+    print(f"aggregate() {timed(aggregate, repeat=1) * 1000:10.1f} ms")
+
+
+WORDS = ("sunny cozy quiet spacious modern rustic charming bright private "
+         "loft house cabin villa studio apartment cottage room suite "
+         "beach lake mountain forest city garden pool view balcony "
+         "kitchen fireplace parking wifi downtown walk park river").split()
+
+
+def text_dataset(count, place_cls, seed=0):
+    """Yield count places with 30-word descriptions
+
+    Words follow a Zipf distribution over WORDS and 20000 rarer ones.
+    """
+    rng = random.Random(seed)
+    vocabulary = WORDS + [f"word{i}" for i in range(20000)]
+    weights = list(itertools.accumulate(
+        1 / rank for rank in range(1, len(vocabulary) + 1)))
+    for i in range(count):
+        yield place_cls(name=f"Place {i}", description=" ".join(
+            rng.choices(vocabulary, cum_weights=weights, k=30)))
+
+
+def bench_text(count=200000):
+    """search_text() latency, index build and reload of a saved index"""
+    storage.all().clear()
+    for place in text_dataset(count, Place):
+        storage.new(place)
+    places = list(storage.all(Place).values())
+    start = time.perf_counter()
+    storage.search_text(Place, "warmup")
+    build = time.perf_counter() - start
+
+    def scan(words):
+        matches = []
+        for place in places:
+            tokens = tokenize(place.description)
+            hits = sum(tokens.count(word) for word in words)
+            if hits:
+                matches.append((hits, place.id))
+        return heapq.nlargest(10, matches)
+    queries = ("word1234", "river word50", "sunny loft",
+               "quiet cabin forest view")
+    print(f"{count} places, index built in {build:.1f} s")
+    for query in queries:
+        indexed = timed(lambda: storage.search_text(Place, query, 10))
+        scanned = timed(lambda: scan(query.split()), repeat=1)
+        print(f"{query:<24} indexed {indexed * 1000:9.2f} ms  "
+              f"tokenizing scan {scanned * 1000:9.1f} ms")
+    storage.save()
+    for saved in (True, False):
+        if not saved:
+            os.remove('file.json.text')
+        storage.all().clear()
+        start = time.perf_counter()
+        storage.reload()
+        storage.search_text(Place, "river")
+        print(f"reload + first search, "
+              f"{'saved index' if saved else 'no saved index'} "
+              f"{time.perf_counter() - start:9.1f} s")
+
+
+def bench_import(count=100000, baseline=2000):
+    """console.py --bulk against piping create lines into the console
+
+    Every piped create saves the whole store, so that path runs baseline
+    lines only.
+    """
+    workdir = tempfile.mkdtemp()
+    console = os.path.join(os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__))), 'console.py')
+    rng = random.Random(0)
+    commands = os.path.join(workdir, 'places.txt')
+    records = os.path.join(workdir, 'places.jsonl')
+    with open(commands, 'w') as f, open(records, 'w') as g:
+        for i in range(count):
+            price, latitude = rng.randrange(20, 500), rng.uniform(-60, 60)
+            f.write(f'create Place name="Loft_{i}" price_by_night={price}'
+                    f' latitude={latitude:.4f}\n')
+            g.write(json.dumps({'__class__': 'Place', 'id': str(uuid.uuid4()),
+                                'name': f"Loft {i}", 'price_by_night': price,
+                                'latitude': round(latitude, 4)}) + '\n')
+    with open(commands) as f:
+        head = ''.join(itertools.islice(f, baseline))
+    runs = [('stdin', baseline, [], head),
+            ('--bulk commands', count, ['--bulk', commands], None),
+            ('--bulk JSON Lines', count, ['--bulk', records], None)]
+    try:
+        for name, lines, args, stdin in runs:
+            for path in os.listdir(workdir):
+                if path.startswith('file.json'):
+                    os.remove(os.path.join(workdir, path))
+            start = time.perf_counter()
+            subprocess.run([sys.executable, console] + args, input=stdin,
+                           cwd=workdir, stdout=subprocess.DEVNULL,
+                           stderr=subprocess.DEVNULL, text=True, check=True)
+            elapsed = time.perf_counter() - start
+            print(f"{name:<18} {lines:>7} lines {elapsed:9.2f} s"
+                  f"  {lines / elapsed:10.0f} lines/s")
+    finally:
+        shutil.rmtree(workdir)
+
+
+BENCHMARKS = {
+    'class_lookup': bench_class_lookup,
+    'journal': bench_journal,
+    'dirty_save': bench_dirty_save,
+    'reload_memory': bench_reload_memory,
+    'lazy_reload': bench_lazy_reload,
+    'formats': bench_formats,
+    'compact_memory': bench_compact_memory,
+    'search': bench_search,
+    'near': bench_near,
+    'aggregate': bench_aggregate,
+    'text': bench_text,
+    'import': bench_import,
+}
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['--reload-child']:
+        reload_child(*sys.argv[2:4])
+        sys.exit(0)
+    if sys.argv[1:2] == ['--compact-child']:
+        compact_child(*sys.argv[2:4])
+        sys.exit(0)
+    if len(sys.argv) < 2 or sys.argv[1] not in BENCHMARKS:
+        print(__doc__.strip())
+        print("Benchmarks: " + ", ".join(BENCHMARKS))
+        sys.exit(1)
+    args = [int(arg) for arg in sys.argv[2:]]
+    BENCHMARKS[sys.argv[1]](*args)
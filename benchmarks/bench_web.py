@@ -0,0 +1,84 @@
+#!/usr/bin/python3
+"""Requests per second of the web_flask application
+
+Without a URL the app from create_app() is driven in-process through
+the Flask test client; with one, a running server (e.g. gunicorn
+'web_flask.wsgi:app') is hit from several threads.
+
+Usage: ./benchmarks/bench_web.py [<requests>] [<url> [<threads>]]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import storage  # noqa: E402
+from models.amenity import Amenity  # noqa: E402
+from models.city import City  # noqa: E402
+from models.state import State  # noqa: E402
+from web_flask.app import create_app  # noqa: E402
+
+ROUTES = ['/hbnb', '/number_template/7', '/states_list',
+          '/cities_by_states', '/states', '/hbnb_filters']
+
+
+def seed(states=50):
+    """Store states with five cities each and a few amenities"""
+    with storage.batch():
+        for i in range(states):
+            state = State(name=f"State {i}")
+            storage.new(state)
+            for j in range(5):
+                storage.new(City(name=f"City {j}", state_id=state.id))
+        for i in range(10):
+            storage.new(Amenity(name=f"Amenity {i}"))
+
+
+def in_process(requests):
+    """Requests per second of each route through the test client"""
+    client = create_app().test_client()
+    for route in ROUTES:
+        client.get(route)
+        start = time.perf_counter()
+        for _ in range(requests):
+            client.get(route)
+        elapsed = time.perf_counter() - start
+        print(f"{route:<22} {requests / elapsed:10.0f} req/s")
+
+
+def over_http(requests, url, threads=8):
+    """Requests per second of each route from several client threads"""
+    for route in ROUTES:
+        def client():
+            for _ in range(requests // threads):
+                with urllib.request.urlopen(url.rstrip('/') + route) as r:
+                    r.read()
+        workers = [threading.Thread(target=client) for _ in range(threads)]
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - start
+        print(f"{route:<22} {requests / elapsed:10.0f} req/s")
+
+
+if __name__ == '__main__':
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    if len(sys.argv) > 2:
+        over_http(requests, sys.argv[2], *[int(a) for a in sys.argv[3:4]])
+    else:
+        workdir = tempfile.mkdtemp()
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            seed()
+            in_process(requests)
+        finally:
+            os.chdir(cwd)
+            shutil.rmtree(workdir)
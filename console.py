@@ -1,8 +1,10 @@
 #!/usr/bin/python3
 """ Console Module """
 import cmd
+import json
 import sys
 import shlex
+import time
 from models.base_model import BaseModel
 from models.__init__ import storage
 from models.user import User
@@ -11,6 +13,7 @@ from models.state import State
 from models.city import City
 from models.amenity import Amenity
 from models.review import Review
+from models.engine import geo
 
 
 class HBNBCommand(cmd.Cmd):
@@ -142,6 +145,133 @@ class HBNBCommand(cmd.Cmd):
 
         return result_dict
 
+    def do_begin(self, args):
+        """ Opens a batch: changes are written once on commit """
+        storage.begin()
+
+    def help_begin(self):
+        """ Help information for the begin command """
+        print("Opens a batch, deferring saves until commit")
+        print("[Usage]: begin\n")
+
+    def do_commit(self, args):
+        """ Closes a batch and writes its changes """
+        storage.commit()
+
+    def help_commit(self):
+        """ Help information for the commit command """
+        print("Closes a batch and saves its changes in one write")
+        print("[Usage]: commit\n")
+
+    def do_rollback(self, args):
+        """ Discards a batch and restores the last saved state """
+        storage.rollback()
+
+    def help_rollback(self):
+        """ Help information for the rollback command """
+        print("Discards the open batch and reloads the saved state")
+        print("[Usage]: rollback\n")
+
+    def do_convert(self, args):
+        """ Rewrites the storage file in another format """
+        if not hasattr(storage, 'convert'):
+            print("** convert needs file storage **")
+            return
+        fmt = args.partition(' ')[0]
+        if fmt not in ('json', 'binary'):
+            print("** format must be json or binary **")
+            return
+        storage.convert(fmt)
+
+    def help_convert(self):
+        """ Help information for the convert command """
+        print("Rewrites the storage file as json or binary")
+        print("[Usage]: convert <json|binary>\n")
+
+    def do_import(self, args):
+        """ Applies a file of commands or JSON Lines records in batches """
+        args = args.split()
+        if not args:
+            print("** file name missing **")
+            return
+        size = 10000
+        for arg in args[1:]:
+            if arg.startswith('batch=') and arg[6:].isdigit() and \
+                    int(arg[6:]) > 0:
+                size = int(arg[6:])
+        try:
+            f = sys.stdin if args[0] == '-' else open(args[0])
+        except OSError:
+            print("** file doesn't exist **")
+            return
+        start = time.perf_counter()
+        try:
+            count = self._import_lines(f, size)
+        finally:
+            if f is not sys.stdin:
+                f.close()
+        elapsed = time.perf_counter() - start
+        print("{} lines in {:.2f} s ({:.0f} lines/s)".format(
+            count, elapsed, count / elapsed if elapsed else 0))
+
+    def _import_lines(self, lines, size):
+        """Run lines as commands or records, committing every size lines
+
+        Returns the number of lines read.
+        """
+        objects = []
+        count = 0
+        storage.begin()
+        try:
+            for count, line in enumerate(lines, 1):
+                line = line.strip()
+                if line.startswith('{'):
+                    obj = self._import_record(line)
+                    if obj is not None:
+                        objects.append(obj)
+                elif line and not line.startswith('#'):
+                    # records before a command are stored first, so it
+                    # can refer to them
+                    if objects:
+                        storage.bulk_new(objects)
+                        objects = []
+                    self.onecmd(self.precmd(line))
+                if count % size == 0:
+                    if objects:
+                        storage.bulk_new(objects)
+                        objects = []
+                    storage.commit()
+                    storage.begin()
+        finally:
+            if objects:
+                storage.bulk_new(objects)
+            storage.commit()
+        return count
+
+    def _import_record(self, line):
+        """Build the object of a JSON record, or None if it is invalid"""
+        try:
+            record = json.loads(line)
+            name = record.pop('__class__', None)
+        except (ValueError, AttributeError):
+            print("** invalid record **")
+            return None
+        if name not in HBNBCommand.classes:
+            print("** class doesn't exist **")
+            return None
+        try:
+            return HBNBCommand.classes[name](**record)
+        except (AttributeError, TypeError, ValueError):
+            print("** invalid record **")
+            return None
+
+    def help_import(self):
+        """ Help information for the import command """
+        print("Applies console commands, or JSON objects with a __class__")
+        print("key, from a file or - for stdin; changes are saved every")
+        print("batch lines instead of after each command")
+        print("[Usage]: import <file> [batch=<lines>]\n")
+
     def do_create(self, args):
         """Create an object of any class."""
         if not args:
@@ -190,11 +320,11 @@ class HBNBCommand(cmd.Cmd):
             print("** instance id missing **")
             return
 
-        key = c_name + "." + c_id
-        try:
-            print(storage.all()[key])
-        except KeyError:
+        obj = storage.get(c_name, c_id)
+        if obj is None:
             print("** no instance found **")
+        else:
+            print(obj)
 
     def help_show(self):
         """ Help information for the show command """
@@ -221,13 +351,12 @@ class HBNBCommand(cmd.Cmd):
             print("** instance id missing **")
             return
 
-        key = c_name + "." + c_id
-
-        try:
-            del (storage.all()[key])
-            storage.save()
-        except KeyError:
+        obj = storage.get(c_name, c_id)
+        if obj is None:
             print("** no instance found **")
+        else:
+            storage.delete(obj)
+            storage.save()
 
     def help_destroy(self):
         """ Help information for the destroy command """
@@ -236,21 +365,17 @@ class HBNBCommand(cmd.Cmd):
 
     def do_all(self, args):
         """ Shows all objects, or all objects of a class"""
-        print_list = []
-
         if args:
             args = args.split(' ')[0]  # remove possible trailing args
             if args not in HBNBCommand.classes:
                 print("** class doesn't exist **")
                 return
-            for k, v in storage.all().items():
-                if k.split('.')[0] == args:
-                    print_list.append(str(v))
-        else:
-            for k, v in storage.all().items():
-                print_list.append(str(v))
-
-        print(print_list)
+        # stream the list one object at a time instead of building it
+        separator = '['
+        for k, v in storage.iter_all(args or None):
+            print(separator + repr(str(v)), end='')
+            separator = ', '
+        print('[]' if separator == '[' else ']')
 
     def help_all(self):
         """ Help information for the all command """
@@ -259,16 +384,105 @@ class HBNBCommand(cmd.Cmd):
 
     def do_count(self, args):
         """Count current number of class instances"""
-        count = 0
-        for k, v in storage.all().items():
-            if args == k.split('.')[0]:
-                count += 1
-        print(count)
+        print(storage.count(args) if args else 0)
 
     def help_count(self):
         """ """
         print("Usage: count <class_name>")
 
+    def do_aggregate(self, args):
+        """ Prints statistics of an attribute per group """
+        args = args.split()
+        if not args:
+            print("** class name missing **")
+            return
+        if args[0] not in HBNBCommand.classes:
+            print("** class doesn't exist **")
+            return
+        column = group_by = None
+        percentiles = ()
+        for arg in args[1:]:
+            name, sep, value = arg.partition('=')
+            if not sep:
+                column = arg
+            elif name == 'by':
+                group_by = value
+            elif name == 'percentiles':
+                try:
+                    percentiles = [float(q) for q in value.split(',')]
+                except ValueError:
+                    percentiles = [-1]
+                if not all(0 <= q <= 100 for q in percentiles):
+                    print("** invalid percentiles **")
+                    return
+        try:
+            result = storage.aggregate(args[0], column, group_by,
+                                       percentiles)
+        except AttributeError:
+            print("** attribute doesn't exist **")
+            return
+        for group in sorted(result, key=str):
+            print("{} {}".format(group, result[group]))
+
+    def help_aggregate(self):
+        """ Help information for the aggregate command """
+        print("Prints count, sum, mean, min, max and percentiles of an")
+        print("attribute per value of another, e.g. aggregate Place")
+        print("price_by_night by=city_id percentiles=50,90")
+        print("[Usage]: aggregate <className> [<attribute>] [by=<attribute>]"
+              " [percentiles=<q>,...]\n")
+
+    def do_search(self, args):
+        """ Lists the objects whose text best matches a query """
+        args = args.split()
+        if not args:
+            print("** class name missing **")
+            return
+        if args[0] not in HBNBCommand.classes:
+            print("** class doesn't exist **")
+            return
+        limit = 10
+        words = []
+        for arg in args[1:]:
+            if arg.startswith('limit=') and arg[6:].isdigit():
+                limit = int(arg[6:])
+            else:
+                words.append(arg)
+        if not words:
+            print("** query missing **")
+            return
+        for obj in storage.search_text(args[0], ' '.join(words), limit):
+            print(obj)
+
+    def help_search(self):
+        """ Help information for the search command """
+        print("Lists the objects whose text best matches the query words")
+        print("[Usage]: search <className> <word> ... [limit=<count>]\n")
+
+    def do_near(self, args):
+        """ Lists the places closest to a point """
+        args = args.split()
+        if len(args) < 3:
+            print("** latitude, longitude or radius missing **")
+            return
+        try:
+            latitude, longitude, radius = map(float, args[:3])
+            limit = int(args[3]) if len(args) > 3 else None
+            places = storage.places_near(latitude, longitude, radius, limit)
+        except ValueError:
+            print("** invalid point **")
+            return
+        for place in places:
+            # coordinates given to create are kept as strings
+            distance = geo.distance_km(latitude, longitude, *geo.coordinates(
+                place.latitude, place.longitude))
+            print("{:.3f} km {}".format(distance, place))
+
+    def help_near(self):
+        """ Help information for the near command """
+        print("Lists the places within radius km of a point, nearest first")
+        print("[Usage]: near <latitude> <longitude> <radius_km> [limit]\n")
+
     def do_update(self, args):
         """ Updates a certain object with new info """
         c_name = c_id = att_name = att_val = kwargs = ''
@@ -292,11 +506,9 @@ class HBNBCommand(cmd.Cmd):
             print("** instance id missing **")
             return
 
-        # generate key from class and id
-        key = c_name + "." + c_id
-
-        # determine if key is present
-        if key not in storage.all():
+        # retrieve the instance to update
+        new_dict = storage.get(c_name, c_id)
+        if new_dict is None:
             print("** no instance found **")
             return
 
@@ -329,9 +541,6 @@ class HBNBCommand(cmd.Cmd):
 
             args = [att_name, att_val]
 
-        # retrieve dictionary of current objects
-        new_dict = storage.all()[key]
-
         # iterate through attr names and values
         for i, att_name in enumerate(args):
             # block only runs on even iterations
@@ -347,8 +556,8 @@ class HBNBCommand(cmd.Cmd):
                 if att_name in HBNBCommand.types:
                     att_val = HBNBCommand.types[att_name](att_val)
 
-                # update dictionary with name, value pair
-                new_dict.__dict__.update({att_name: att_val})
+                # update instance with name, value pair
+                setattr(new_dict, att_name, att_val)
 
         new_dict.save()  # save updates to file
 
@@ -359,4 +568,9 @@ class HBNBCommand(cmd.Cmd):
 
 
 if __name__ == "__main__":
-    HBNBCommand().cmdloop()
+    if sys.argv[1:2] == ['--bulk']:
+        console = HBNBCommand()
+        for path in sys.argv[2:] or ['-']:
+            console.do_import(path)
+    else:
+        HBNBCommand().cmdloop()
@@ -3,6 +3,9 @@
 from os import getenv
 
 storage_type = getenv("HBNB_TYPE_STORAGE")
+if storage_type == "sqlite":
+    # the embedded database runs the same SQLAlchemy models as MySQL
+    storage_type = "db"
 
 try:
     if storage_type == "db":
@@ -12,5 +15,9 @@ try:
         from models.engine.file_storage import FileStorage
         storage = FileStorage()
     storage.reload()
+    if storage_type == "db" and \
+            getenv("HBNB_CACHE", "") in ("1", "true", "yes"):
+        from models.engine.cached_storage import CachedStorage, cache_options
+        storage = CachedStorage(storage, **cache_options())
 except Exception as e:
     print(f"Error during storage instantiation: {e}")
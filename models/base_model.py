@@ -1,10 +1,13 @@
 #!/usr/bin/python3
 """This module defines a base class for all models in our hbnb clone"""
 
-from sqlalchemy import Column, String, DateTime
+from sqlalchemy import BINARY, Column, String, DateTime, TypeDecorator
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
 from models import storage_type
+from os import getenv
+import models
+import sys
 import uuid
 
 if storage_type == "db":
@@ -13,19 +16,54 @@ else:
     Base = object
 
 
+class BinaryUUID(TypeDecorator):
+    """UUID strings stored as 16 raw bytes instead of VARCHAR(60)"""
+    impl = BINARY(16)
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        """Pack a UUID string for the database
+
+        Ids that are not UUIDs bind as empty bytes, which match no row.
+        """
+        if value is None:
+            return None
+        try:
+            return uuid.UUID(value).bytes
+        except (AttributeError, TypeError, ValueError):
+            return b''
+
+    def process_result_value(self, value, dialect):
+        """Unpack database bytes into the canonical UUID string"""
+        return None if value is None else str(uuid.UUID(bytes=value))
+
+
+def id_type():
+    """Column type of ids and foreign keys
+
+    HBNB_BINARY_UUIDS=1 selects BINARY(16) columns for new schemas.
+    """
+    if getenv('HBNB_BINARY_UUIDS', '') in ('1', 'true', 'yes'):
+        return BinaryUUID()
+    return String(60)
+
+
 class BaseModel:
     """A base class for all hbnb models"""
     if storage_type == "db":
-        id = Column(String(60), primary_key=True)
+        id = Column(id_type(), primary_key=True)
         created_at = Column(DateTime, default=datetime.utcnow)
         updated_at = Column(DateTime, default=datetime.utcnow)
 
     def __init__(self, *args, **kwargs):
         """Instatntiates a new model"""
-        try:
-            self.id = str(uuid.UUID(kwargs.get("id", str(uuid.uuid4()))))
-        except ValueError:
-            raise ValueError("Invalid UUID provided for 'id'")
+        if "id" not in kwargs:
+            self.id = str(uuid.uuid4())
+        else:
+            try:
+                self.id = str(uuid.UUID(kwargs["id"]))
+            except ValueError:
+                raise ValueError("Invalid UUID provided for 'id'")
 
         time_format = "%Y-%m-%dT%H:%M:%S.%f"
 
@@ -54,9 +92,67 @@ class BaseModel:
             if key != "__class__" and key not in ["id", "created_at", "updated_at"]:
                 setattr(self, key, value)
 
+    @classmethod
+    def from_storage(cls, record):
+        """Rebuilds an instance from a record written by a storage engine
+
+        The record is trusted: the id is not re-validated and timestamps
+        are parsed with datetime.fromisoformat instead of strptime.
+        """
+        if storage_type == "db":
+            return cls(**record)
+        obj = cls.__new__(cls)
+        attributes = obj.__dict__
+        attributes['id'] = record['id']
+        for name in ('created_at', 'updated_at'):
+            value = record.get(name)
+            attributes[name] = (datetime.fromisoformat(value)
+                                if isinstance(value, str) else
+                                value or datetime.utcnow())
+        for key, value in record.items():
+            if key not in attributes and key != '__class__':
+                attributes[key] = value
+        return obj
+
+    @classmethod
+    def compact_class(cls):
+        """Returns a variant of cls that keeps its fields in __slots__
+
+        Instances of the variant look like cls to storage, to_dict() and
+        __str__, but id, timestamps and the attributes declared on cls
+        live in slots instead of a per-instance __dict__.
+        """
+        if storage_type == "db" or issubclass(cls, CompactModel):
+            return cls
+        compact = cls.__dict__.get('_compact_class')
+        if compact is None:
+            defaults = {
+                name: value for name, value in vars(cls).items()
+                if not name.startswith('_') and not callable(value) and
+                not isinstance(value, (property, classmethod, staticmethod))}
+            names = CompactModel.fixed + tuple(defaults)
+            compact = type(cls.__name__, (CompactModel, cls), {
+                '__slots__': names + ('_extra',),
+                '_names': names,
+                '_known': frozenset(names + ('__class__',)),
+                '__module__': cls.__module__,
+                '__qualname__': cls.__qualname__,
+                '_defaults': defaults,
+            })
+            cls._compact_class = compact
+        return compact
+
+    if storage_type != "db":
+        def __setattr__(self, name, value):
+            """Sets an attribute and flags the instance for storage"""
+            super().__setattr__(name, value)
+            storage = getattr(models, 'storage', None)
+            if storage is not None and getattr(self, 'id', None):
+                storage.mark_dirty(self)
+
     def __str__(self):
         """Returns a string representation of the instance"""
-        cls = (str(type(self)).split('.')[-1]).split('\'')[0]
+        cls = type(self).__name__
         return '[{}] ({}) {}'.format(cls, self.id, self.__dict__)
 
     def save(self):
@@ -70,8 +166,86 @@ class BaseModel:
         """Convert instance into dict format"""
         dictionary = {}
         dictionary.update(self.__dict__)
-        dictionary.update({'__class__':
-                          (str(type(self)).split('.')[-1]).split('\'')[0]})
+        dictionary['__class__'] = type(self).__name__
+        dictionary['created_at'] = self.created_at.isoformat()
+        dictionary['updated_at'] = self.updated_at.isoformat()
+        return dictionary
+
+
+class CompactModel:
+    """Mixin for the __slots__ variants built by compact_class()
+
+    Attributes outside the slots still go to a __dict__; the _extra slot
+    is set once one does, so that reading the fields does not create an
+    empty __dict__ on every other instance.
+    """
+    __slots__ = ()
+    fixed = ('id', 'created_at', 'updated_at')
+
+    @classmethod
+    def from_storage(cls, record):
+        """Rebuilds an instance from a trusted storage record
+
+        Foreign keys are interned so every reference to the same object
+        shares one string, and equal timestamps share one datetime.
+        """
+        obj = cls.__new__(cls)
+        setter = object.__setattr__
+        for key, value in record.items():
+            if key == '__class__':
+                continue
+            if type(value) is str:
+                if key in ('created_at', 'updated_at'):
+                    value = datetime.fromisoformat(value)
+                elif key.endswith('_id'):
+                    value = sys.intern(value)
+            setter(obj, key, value)
+        created = record.get('created_at')
+        if not created:
+            setter(obj, 'created_at', datetime.utcnow())
+        if not record.get('updated_at'):
+            setter(obj, 'updated_at', datetime.utcnow())
+        elif record['updated_at'] == created:
+            setter(obj, 'updated_at', obj.created_at)
+        if not cls._known.issuperset(record):
+            setter(obj, '_extra', True)
+        return obj
+
+    def __setattr__(self, name, value):
+        """Sets an attribute, noting those kept outside the slots"""
+        super().__setattr__(name, value)
+        if name not in type(self)._known:
+            object.__setattr__(self, '_extra', True)
+
+    def __getattr__(self, name):
+        """Falls back to the class default for unset fields"""
+        defaults = type(self)._defaults
+        if name in defaults:
+            return defaults[name]
+        raise AttributeError("'{}' object has no attribute '{}'".format(
+            type(self).__name__, name))
+
+    def fields(self):
+        """Returns the instance attributes, slots first"""
+        values = {}
+        for name in type(self)._names:
+            try:
+                values[name] = object.__getattribute__(self, name)
+            except AttributeError:
+                pass
+        if getattr(self, '_extra', False):
+            values.update(self.__dict__)
+        return values
+
+    def __str__(self):
+        """Returns a string representation of the instance"""
+        return '[{}] ({}) {}'.format(
+            type(self).__name__, self.id, self.fields())
+
+    def to_dict(self):
+        """Convert instance into dict format"""
+        dictionary = self.fields()
+        dictionary['__class__'] = type(self).__name__
         dictionary['created_at'] = self.created_at.isoformat()
         dictionary['updated_at'] = self.updated_at.isoformat()
         return dictionary
@@ -1,7 +1,7 @@
 #!/usr/bin/python3
 """ City Module for HBNB project """
-from sqlalchemy import Column, String, ForeignKey
-from models.base_model import BaseModel, Base
+from sqlalchemy import Column, String, ForeignKey, Index
+from models.base_model import BaseModel, Base, id_type
 from sqlalchemy.orm import relationship
 from models import storage_type
 
@@ -10,8 +10,12 @@ class City(BaseModel, Base):
     """ The city class, contains state ID and name """
     if storage_type == "db":
         __tablename__ = 'cities'
-        state_id = Column(String(60), ForeignKey('states.id'), nullable=False)
-        name = Column(String(128), nullable=False)
+        # serves both the state_id foreign key and cities by name
+        __table_args__ = (Index('ix_cities_state_id_name',
+                                'state_id', 'name'),)
+        state_id = Column(id_type(), ForeignKey('states.id'),
+                          nullable=False)
+        name = Column(String(128), nullable=False, index=True)
         places = relationship("Place", backref="cities")
     else:
         state_id = ""
@@ -0,0 +1,137 @@
+#!/usr/bin/python3
+"""Group-by aggregates over numeric model attributes
+
+Storage engines call aggregate() with the objects of a class; values are
+pulled into column arrays and reduced per group with NumPy when it is
+installed, or with plain Python otherwise. Both return
+
+    {group: {'count': n, 'sum': s, 'mean': m, 'min': lo, 'max': hi,
+             'p50': ..., ...}}
+
+where only 'count' is present when no column is aggregated, and groups
+without any value of the column are left out.
+"""
+import itertools
+import math
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# groupings that follow a foreign key to the parent's attribute:
+# (class name, group) -> (foreign key, parent class name, attribute)
+DERIVED = {
+    ('Place', 'state_id'): ('city_id', 'City', 'state_id'),
+}
+
+
+def percentile_name(q):
+    """Result key of the q-th percentile, e.g. p50 or p99.9"""
+    return 'p{:g}'.format(q)
+
+
+def extract(objects, group_by=None, column=None, parents=None):
+    """Return the (groups, labels, values) columns of objects
+
+    groups lists the distinct group keys and labels holds the index in
+    groups of each object's key. parents maps foreign key values to
+    group keys for DERIVED groups. Objects whose column is not a number
+    are skipped; values is None when no column is given.
+    """
+    objects = list(objects)
+    values = None
+    if column is not None:
+        values = [getattr(obj, column, None) for obj in objects]
+        if not set(map(type, values)) <= {int}:
+            numeric = [type(value) in (int, float) and value == value
+                       for value in values]
+            objects = list(itertools.compress(objects, numeric))
+            values = list(itertools.compress(values, numeric))
+    if group_by:
+        keys = [getattr(obj, group_by, None) for obj in objects]
+    else:
+        keys = [None] * len(objects)
+    if parents is not None:
+        keys = [parents.get(key) for key in keys]
+    codes = {}
+    labels = [codes.setdefault(key, len(codes)) for key in keys]
+    return list(codes), labels, values
+
+
+def aggregate(objects, group_by=None, column=None, percentiles=(),
+              parents=None):
+    """Aggregate column per group_by over objects"""
+    return _reduce(*extract(objects, group_by, column, parents),
+                   percentiles)
+
+
+def group_stats(keys, values=None, percentiles=()):
+    """Aggregate values per key; keys and values are parallel lists"""
+    codes = {}
+    labels = [codes.setdefault(key, len(codes)) for key in keys]
+    return _reduce(list(codes), labels, values, percentiles)
+
+
+def _reduce(groups, labels, values, percentiles):
+    """Statistics of values per group, labels indexing groups"""
+    if values is None:
+        counts = [0] * len(groups)
+        for label in labels:
+            counts[label] += 1
+        return {key: {'count': count} for key, count in zip(groups, counts)}
+    if numpy is not None and groups:
+        return _numpy_stats(groups, labels, values, percentiles)
+    columns = [[] for _ in groups]
+    for label, value in zip(labels, values):
+        columns[label].append(value)
+    result = {}
+    for key, column in zip(groups, columns):
+        column.sort()
+        total = math.fsum(column)
+        stats = result[key] = {
+            'count': len(column), 'sum': total,
+            'mean': total / len(column),
+            'min': float(column[0]), 'max': float(column[-1])}
+        for q in percentiles:
+            position = (len(column) - 1) * q / 100
+            low = math.floor(position)
+            high = min(low + 1, len(column) - 1)
+            stats[percentile_name(q)] = float(
+                column[low] + (column[high] - column[low]) *
+                (position - low))
+    return result
+
+
+def _numpy_stats(groups, labels, values, percentiles):
+    """group_stats() of numeric values with vectorized reductions"""
+    labels = numpy.asarray(labels, dtype=numpy.intp)
+    values = numpy.asarray(values, dtype=numpy.float64)
+    counts = numpy.bincount(labels, minlength=len(groups))
+    sums = numpy.bincount(labels, weights=values, minlength=len(groups))
+    lows = numpy.full(len(groups), numpy.inf)
+    numpy.minimum.at(lows, labels, values)
+    highs = numpy.full(len(groups), -numpy.inf)
+    numpy.maximum.at(highs, labels, values)
+    columns = {'count': counts, 'sum': sums, 'mean': sums / counts,
+               'min': lows, 'max': highs}
+    if percentiles:
+        # one sort of (group, rank of value) keys lays every group out
+        # as a contiguous sorted run, cheaper than an argsort or lexsort
+        distinct, ranks = numpy.unique(values, return_inverse=True)
+        runs = numpy.sort(labels.astype(numpy.int64) * len(distinct) +
+                          ranks.reshape(-1))
+        ordered = distinct[runs % len(distinct)]
+        starts = numpy.concatenate(([0], numpy.cumsum(counts)[:-1]))
+    for q in percentiles:
+        position = (counts - 1) * (q / 100)
+        low = numpy.floor(position).astype(numpy.intp)
+        high = numpy.minimum(low + 1, counts - 1)
+        columns[percentile_name(q)] = (
+            ordered[starts + low] + (ordered[starts + high] -
+                                     ordered[starts + low]) * (position - low))
+    result = {}
+    for index, key in enumerate(groups):
+        result[key] = {name: column[index].item()
+                       for name, column in columns.items()}
+    return result
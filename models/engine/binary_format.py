@@ -0,0 +1,235 @@
+#!/usr/bin/python3
+"""Compact binary snapshot format for FileStorage
+
+Records are grouped per class and stored column by column: ids as
+16-byte UUIDs, created_at/updated_at as signed 64-bit microseconds since
+the epoch, and every other attribute as a column of tagged values.
+
+    file    := MAGIC VERSION class* END
+    class   := name(str) count(u32) id_kind(u8) ids times(2 x i64[count])
+               ncolumns(u32) (name(str) value[count])*
+    str     := length(u32) utf-8 bytes
+"""
+import json
+import mmap
+import struct
+from datetime import datetime, timedelta
+
+MAGIC = b'HBNB\x00BIN'
+VERSION = 1
+END = b'\xff\xff\xff\xff'
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+_TIMES = ('created_at', 'updated_at')
+_FIXED = ('id', '__class__') + _TIMES
+
+# id column kinds
+_UUID_IDS = 0
+_TEXT_IDS = 1
+
+# value tags
+_MISSING, _NONE, _FALSE, _TRUE, _INT, _FLOAT, _STR, _JSON = range(8)
+
+_u8 = struct.Struct('<B')
+_u32 = struct.Struct('<I')
+_i64 = struct.Struct('<q')
+_f64 = struct.Struct('<d')
+
+# returned by _Reader.value() for attributes a record does not have
+_missing = object()
+
+
+def sniff(head):
+    """Return True if head starts with the binary snapshot magic"""
+    return head[:len(MAGIC)] == MAGIC
+
+
+def _micros(value):
+    """Return a timestamp as microseconds since the epoch"""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return (value - _EPOCH) // _MICROSECOND
+
+
+def _write_str(out, text):
+    """Append a length-prefixed utf-8 string"""
+    data = text.encode('utf-8')
+    out += _u32.pack(len(data))
+    out += data
+
+
+def _write_value(out, value):
+    """Append one tagged value"""
+    if value is None:
+        out.append(_NONE)
+    elif value is True or value is False:
+        out.append(_TRUE if value else _FALSE)
+    elif type(value) is int and -(1 << 63) <= value < (1 << 63):
+        out.append(_INT)
+        out += _i64.pack(value)
+    elif type(value) is float:
+        out.append(_FLOAT)
+        out += _f64.pack(value)
+    elif type(value) is str:
+        out.append(_STR)
+        _write_str(out, value)
+    else:
+        out.append(_JSON)
+        _write_str(out, json.dumps(value))
+
+
+def _uuid_bytes(ids):
+    """Return the ids packed as 16-byte UUIDs, or None if one is not"""
+    out = bytearray()
+    for value in ids:
+        # only canonical lower-case ids survive the round trip unchanged
+        if type(value) is not str or len(value) != 36 or \
+                value[8] != '-' or value[13] != '-' or \
+                value[18] != '-' or value[23] != '-' or \
+                value != value.lower():
+            return None
+        try:
+            out += bytes.fromhex(value.replace('-', ''))
+        except ValueError:
+            return None
+    return out
+
+
+def _uuid_strings(raw, count):
+    """Return the canonical strings of count packed 16-byte UUIDs"""
+    text = raw.hex()
+    return ['-'.join((h[:8], h[8:12], h[12:16], h[16:20], h[20:]))
+            for h in (text[i:i + 32] for i in range(0, 32 * count, 32))]
+
+
+def dump(records, f):
+    """Write (key, record) pairs as a binary snapshot to binary file f
+
+    Records are to_dict() style dictionaries; keys are rebuilt from the
+    class name and id on load.
+    """
+    by_class = {}
+    for key, record in records:
+        by_class.setdefault(record['__class__'], []).append(record)
+    f.write(MAGIC + _u8.pack(VERSION))
+    for name, rows in by_class.items():
+        out = bytearray()
+        _write_str(out, name)
+        out += _u32.pack(len(rows))
+        ids = [row['id'] for row in rows]
+        packed = _uuid_bytes(ids)
+        if packed is not None:
+            out.append(_UUID_IDS)
+            out += packed
+        else:
+            out.append(_TEXT_IDS)
+            for value in ids:
+                _write_str(out, value)
+        for column in _TIMES:
+            out += struct.pack('<%dq' % len(rows),
+                               *[_micros(row[column]) for row in rows])
+        columns = {}
+        for row in rows:
+            for column in row:
+                if column not in _FIXED:
+                    columns.setdefault(column)
+        out += _u32.pack(len(columns))
+        for column in columns:
+            _write_str(out, column)
+            for row in rows:
+                if column in row:
+                    _write_value(out, row[column])
+                else:
+                    out.append(_MISSING)
+        f.write(out)
+    f.write(END)
+
+
+class _Reader:
+    """Cursor over the bytes of a binary snapshot"""
+
+    def __init__(self, data):
+        """Start reading data after the header"""
+        self.data = data
+        self.pos = len(MAGIC) + 1
+
+    def take(self, size):
+        """Return the next size bytes"""
+        start = self.pos
+        self.pos += size
+        if self.pos > len(self.data):
+            raise ValueError("Truncated binary snapshot")
+        return self.data[start:self.pos]
+
+    def u32(self):
+        """Read an unsigned 32-bit integer"""
+        return _u32.unpack(self.take(4))[0]
+
+    def text(self):
+        """Read a length-prefixed utf-8 string"""
+        return self.take(self.u32()).decode('utf-8')
+
+    def value(self):
+        """Read one tagged value; returns _missing for absent cells"""
+        tag = self.take(1)[0]
+        if tag == _STR:
+            return self.text()
+        if tag == _INT:
+            return _i64.unpack(self.take(8))[0]
+        if tag == _FLOAT:
+            return _f64.unpack(self.take(8))[0]
+        if tag == _NONE:
+            return None
+        if tag == _TRUE:
+            return True
+        if tag == _FALSE:
+            return False
+        if tag == _JSON:
+            return json.loads(self.text())
+        if tag == _MISSING:
+            return _missing
+        raise ValueError("Unknown value tag {} in snapshot".format(tag))
+
+
+def load(f):
+    """Yield (key, record) pairs from a binary snapshot in binary file f
+
+    Timestamps are returned as datetime objects, ready for
+    BaseModel.from_storage(). The file is memory-mapped and decoded one
+    class at a time.
+    """
+    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        if not sniff(data):
+            raise ValueError("Not a binary snapshot")
+        if data[len(MAGIC)] != VERSION:
+            raise ValueError("Unsupported binary snapshot version {}".format(
+                data[len(MAGIC)]))
+        yield from _load_classes(_Reader(data))
+
+
+def _load_classes(reader):
+    """Yield (key, record) pairs class by class until the END marker"""
+    while True:
+        if reader.data[reader.pos:reader.pos + 4] == END:
+            return
+        name = reader.text()
+        count = reader.u32()
+        if reader.take(1)[0] == _UUID_IDS:
+            ids = _uuid_strings(reader.take(16 * count), count)
+        else:
+            ids = [reader.text() for _ in range(count)]
+        times = [struct.unpack('<%dq' % count, reader.take(8 * count))
+                 for _ in _TIMES]
+        rows = [{'id': ids[i],
+                 'created_at': _EPOCH + times[0][i] * _MICROSECOND,
+                 'updated_at': _EPOCH + times[1][i] * _MICROSECOND,
+                 '__class__': name} for i in range(count)]
+        for _ in range(reader.u32()):
+            column = reader.text()
+            for row in rows:
+                value = reader.value()
+                if value is not _missing:
+                    row[column] = value
+        for row in rows:
+            yield name + '.' + row['id'], row
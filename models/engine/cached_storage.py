@@ -0,0 +1,263 @@
+#!/usr/bin/python3
+"""
+Contains the class CachedStorage
+"""
+
+from collections import OrderedDict
+from contextlib import contextmanager
+from models.engine import analytics
+from os import getenv
+import threading
+import time
+
+
+def cache_options():
+    """CachedStorage arguments from the HBNB_CACHE_* variables
+
+    HBNB_CACHE_TTL is a default number of seconds optionally followed by
+    per-class values, e.g. "60,State=600,Amenity=600".
+    """
+    ttl = {}
+    default = 60.0
+    for item in getenv('HBNB_CACHE_TTL', '').split(','):
+        name, sep, seconds = item.strip().rpartition('=')
+        if not seconds:
+            continue
+        if sep:
+            ttl[name] = float(seconds)
+        else:
+            default = float(seconds)
+    return {'ttl': ttl, 'default_ttl': default,
+            'max_objects': int(getenv('HBNB_CACHE_MAX_OBJECTS', '100000'))}
+
+
+class CachedStorage:
+    """read-through cache of query results in front of a storage engine
+
+    all(), get(), count() and related() results are kept per class for
+    a time to live and evicted least recently used first once the cached
+    results hold more than max_objects objects. new(), delete(), save()
+    and the other writes drop every entry: cached objects keep the
+    relationships they loaded, such as State.cities, so a write to one
+    class can make the results of another stale. Every other attribute
+    is served by the wrapped storage.
+    """
+
+    def __init__(self, storage, ttl=None, default_ttl=60.0,
+                 max_objects=100000):
+        """Wrap storage; ttl maps class names to seconds"""
+        self.__storage = storage
+        self.__ttl = dict(ttl or {})
+        self.__default_ttl = default_ttl
+        self.__max_objects = max_objects
+        # (method, class name, arguments) -> (expiry, size, result)
+        self.__entries = OrderedDict()
+        self.__objects = 0
+        self.__lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __getattr__(self, name):
+        """Delegate everything not cached to the wrapped storage"""
+        if name.startswith('_CachedStorage__'):
+            raise AttributeError(name)
+        return getattr(self.__storage, name)
+
+    @staticmethod
+    def __name(cls):
+        """Class name of a class filter, or None for every class"""
+        if cls is None or isinstance(cls, str):
+            return cls
+        return cls.__name__
+
+    def __cached(self, key, ttl, load):
+        """Return the cached result for key, calling load on a miss"""
+        now = time.monotonic()
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is not None and entry[0] > now:
+                self.__entries.move_to_end(key)
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+        result = load()
+        size = len(result) if isinstance(result, dict) else 1
+        with self.__lock:
+            old = self.__entries.pop(key, None)
+            if old is not None:
+                self.__objects -= old[1]
+            self.__entries[key] = (now + ttl, size, result)
+            self.__objects += size
+            while self.__objects > self.__max_objects and \
+                    len(self.__entries) > 1:
+                self.__objects -= self.__entries.popitem(last=False)[1][1]
+                self.evictions += 1
+        return result
+
+    def __ttl_of(self, name):
+        """Time to live of the results of class name"""
+        return self.__ttl.get(name, self.__default_ttl)
+
+    def all(self, cls=None, load=None):
+        """Return the objects of cls, from the cache when fresh"""
+        name = self.__name(cls)
+        key = ('all', name, tuple(load or ()))
+        return dict(self.__cached(key, self.__ttl_of(name),
+                                  lambda: self.__storage.all(cls, load=load)))
+
+    def get(self, cls, id):
+        """Return the object of cls with the given id, or None"""
+        name = self.__name(cls)
+        return self.__cached(('get', name, id), self.__ttl_of(name),
+                             lambda: self.__storage.get(cls, id))
+
+    def count(self, cls=None):
+        """Count the objects of cls, or of all classes"""
+        name = self.__name(cls)
+        return self.__cached(('count', name), self.__ttl_of(name),
+                             lambda: self.__storage.count(cls))
+
+    def related(self, cls, attribute, value):
+        """Return the objects of cls whose foreign key equals value"""
+        name = self.__name(cls)
+        return dict(self.__cached(
+            ('related', name, attribute, value), self.__ttl_of(name),
+            lambda: self.__storage.related(cls, attribute, value)))
+
+    def search_places(self, states=None, cities=None, amenities=None,
+                      price_range=None, max_guest=None):
+        """Return the places matching every given filter
+
+        Results depend on cities and amenities too, so any write drops
+        them.
+        """
+        key = ('search_places', None, tuple(sorted(states or ())),
+               tuple(sorted(cities or ())), tuple(sorted(amenities or ())),
+               tuple(price_range or ()), max_guest)
+        return dict(self.__cached(
+            key, self.__default_ttl,
+            lambda: self.__storage.search_places(
+                states, cities, amenities, price_range, max_guest)))
+
+    def places_near(self, latitude, longitude, radius_km, limit=None):
+        """Return the places within radius_km of a point, nearest first"""
+        return list(self.__cached(
+            ('places_near', 'Place', latitude, longitude, radius_km, limit),
+            self.__ttl_of('Place'),
+            lambda: self.__storage.places_near(latitude, longitude,
+                                               radius_km, limit)))
+
+    def search_text(self, cls, query, limit=10):
+        """Return the objects of cls best matching query, best first"""
+        name = self.__name(cls)
+        return list(self.__cached(
+            ('search_text', name, query, limit), self.__ttl_of(name),
+            lambda: self.__storage.search_text(cls, query, limit)))
+
+    def aggregate(self, cls, column=None, group_by=None, percentiles=()):
+        """Return statistics of column per value of group_by
+
+        Groups taken from a parent class depend on that class too, so
+        those results are dropped by any write.
+        """
+        name = self.__name(cls)
+        derived = (name, group_by) in analytics.DERIVED
+        key = ('aggregate', None if derived else name, column, group_by,
+               tuple(percentiles))
+        return dict(self.__cached(
+            key, self.__ttl_of(name),
+            lambda: self.__storage.aggregate(cls, column, group_by,
+                                             percentiles)))
+
+    def ordered(self, cls, attribute='name', load=None, **equal):
+        """Return the objects of cls sorted by attribute"""
+        name = self.__name(cls)
+        key = ('ordered', name, attribute, tuple(load or ()),
+               tuple(sorted(equal.items())))
+        return list(self.__cached(
+            key, self.__ttl_of(name),
+            lambda: self.__storage.ordered(cls, attribute, load, **equal)))
+
+    def invalidate(self, cls=None):
+        """Drop the cached results of cls, or every cached result"""
+        name = self.__name(cls)
+        with self.__lock:
+            for key in list(self.__entries):
+                if name is None or key[1] is None or key[1] == name:
+                    self.__objects -= self.__entries.pop(key)[1]
+
+    def new(self, obj):
+        """Add obj to storage and drop every cached result"""
+        self.__storage.new(obj)
+        self.invalidate()
+
+    def delete(self, obj=None):
+        """Delete obj from storage and drop every cached result"""
+        self.__storage.delete(obj)
+        if obj is not None:
+            self.invalidate()
+
+    def save(self):
+        """Save storage and drop every cached result"""
+        try:
+            self.__storage.save()
+        finally:
+            self.invalidate()
+
+    def bulk_new(self, objects, *args, **kwargs):
+        """Insert objects and drop every cached result"""
+        try:
+            return self.__storage.bulk_new(objects, *args, **kwargs)
+        finally:
+            self.invalidate()
+
+    def begin(self):
+        """Open a batch of the wrapped storage"""
+        self.__storage.begin()
+
+    def commit(self):
+        """Close a batch of the wrapped storage and drop every result"""
+        try:
+            self.__storage.commit()
+        finally:
+            self.invalidate()
+
+    def rollback(self):
+        """Roll back storage and drop every cached result"""
+        try:
+            self.__storage.rollback()
+        finally:
+            self.invalidate()
+
+    @contextmanager
+    def batch(self):
+        """Context manager grouping saves into one commit, or none on error
+
+        Results cached inside the batch are dropped when it ends either
+        way, as they may hold objects that were rolled back.
+        """
+        self.begin()
+        try:
+            yield self
+        except BaseException:
+            self.rollback()
+            raise
+        self.commit()
+
+    transaction = batch
+
+    def reload(self):
+        """Reload storage and drop every cached result"""
+        self.__storage.reload()
+        self.invalidate()
+
+    def stats(self):
+        """Return the wrapped storage stats plus cache counters"""
+        stats = getattr(self.__storage, 'stats', dict)()
+        with self.__lock:
+            stats.update(cache_hits=self.hits, cache_misses=self.misses,
+                         cache_evictions=self.evictions,
+                         cache_entries=len(self.__entries),
+                         cache_objects=self.__objects)
+        return stats
@@ -3,52 +3,208 @@
 Contains the class DBStorage
 """
 
+from contextlib import contextmanager
 from models.amenity import Amenity
 from models.base_model import Base
-from sqlalchemy import create_engine
-from sqlalchemy.orm import scoped_session, sessionmaker
+from models.engine import analytics, geo
+from models.engine.text_index import FIELDS, TextIndex, tokenize
+from sqlalchemy import Column, Integer, Table, create_engine, event, func
+from sqlalchemy import insert, inspect, select, text, update
+from sqlalchemy.exc import IntegrityError, OperationalError, TimeoutError
+from sqlalchemy.orm import scoped_session, selectinload, sessionmaker
+from sqlalchemy.pool import QueuePool
 from models.city import City
-from models.place import Place
+from models.place import Place, place_amenity
 from models.review import Review
 from models.state import State
 from models.user import User
 from os import getenv
+import heapq
+import os
+import threading
+import time
 
 
 classes = {"Amenity": Amenity, "City": City,
            "Place": Place, "Review": Review,
            "State": State, "User": User}
 
+# a single row bumped by every commit made through DBStorage, so that
+# processes sharing the database can tell when it changed
+storage_version = Table('storage_version', Base.metadata,
+                        Column('id', Integer, primary_key=True,
+                               autoincrement=False),
+                        Column('version', Integer, nullable=False))
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long checkouts wait for a connection"""
+
+    def __init__(self, *args, **kwargs):
+        """Instantiate the pool with zeroed statistics"""
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_time = 0.0
+        self.max_wait = 0.0
+        # QueuePool._do_get() calls itself on some paths; time the
+        # outermost call of each thread only
+        self.__local = threading.local()
+
+    def _do_get(self):
+        """Check out a connection, timing the wait"""
+        if getattr(self.__local, 'timing', False):
+            return super()._do_get()
+        self.__local.timing = True
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except TimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            self.__local.timing = False
+            waited = time.perf_counter() - start
+            self.checkouts += 1
+            self.wait_time += waited
+            self.max_wait = max(self.max_wait, waited)
+
+
+def pool_options():
+    """create_engine() pool arguments from the HBNB_MYSQL_POOL_* variables"""
+    return {
+        'poolclass': TimedQueuePool,
+        'pool_size': int(getenv('HBNB_MYSQL_POOL_SIZE', '5')),
+        'max_overflow': int(getenv('HBNB_MYSQL_MAX_OVERFLOW', '10')),
+        'pool_timeout': float(getenv('HBNB_MYSQL_POOL_TIMEOUT', '30')),
+        'pool_recycle': int(getenv('HBNB_MYSQL_POOL_RECYCLE', '3600')),
+        'pool_pre_ping': getenv('HBNB_MYSQL_POOL_PRE_PING', '1') in
+        ('1', 'true', 'yes'),
+    }
+
+
+def engine_url():
+    """database URL from HBNB_DB_URL, or built for the storage type"""
+    url = getenv('HBNB_DB_URL')
+    if url:
+        return url
+    if getenv('HBNB_TYPE_STORAGE') == 'sqlite':
+        return 'sqlite:///' + getenv('HBNB_SQLITE_PATH', 'hbnb.db')
+    return 'mysql+mysqldb://{}:{}@{}/{}'.format(getenv('HBNB_MYSQL_USER'),
+                                                getenv('HBNB_MYSQL_PWD'),
+                                                getenv('HBNB_MYSQL_HOST'),
+                                                getenv('HBNB_MYSQL_DB'))
+
+
+def sqlite_pragmas(dbapi_connection, connection_record):
+    """tune each new SQLite connection for concurrent reads"""
+    cursor = dbapi_connection.cursor()
+    for pragma in ('journal_mode = WAL', 'synchronous = NORMAL',
+                   'foreign_keys = ON', 'temp_store = MEMORY',
+                   'mmap_size = {}'.format(
+                       int(getenv('HBNB_SQLITE_MMAP_SIZE', 256 << 20))),
+                   'cache_size = -{}'.format(
+                       int(getenv('HBNB_SQLITE_CACHE_KB', 64 << 10)))):
+        cursor.execute('PRAGMA ' + pragma)
+    cursor.close()
+
+
+def create_fts(connection):
+    """Create FTS5 tables kept in sync by triggers for SQLite
+
+    Returns False when SQLite was built without FTS5.
+    """
+    for name, fields in FIELDS.items():
+        table = classes[name].__tablename__
+        columns = ', '.join(fields)
+        new = ', '.join('new.' + field for field in fields)
+        old = ', '.join('old.' + field for field in fields)
+        delete = (f"INSERT INTO {table}_fts({table}_fts, rowid, {columns}) "
+                  f"VALUES ('delete', old.rowid, {old});")
+        add = (f"INSERT INTO {table}_fts(rowid, {columns}) "
+               f"VALUES (new.rowid, {new});")
+        exists = connection.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE name = :name"),
+            {'name': table + '_fts'}).first()
+        try:
+            connection.execute(text(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {table}_fts USING "
+                f"fts5({columns}, content='{table}', content_rowid='rowid')"))
+        except OperationalError:
+            return False
+        for event_name, body in (('insert', add), ('delete', delete),
+                                 ('update', delete + ' ' + add)):
+            connection.execute(text(
+                f"CREATE TRIGGER IF NOT EXISTS {table}_fts_{event_name} "
+                f"AFTER {event_name.upper()} ON {table} BEGIN {body} END"))
+        if not exists:
+            # index the rows stored before the FTS table existed
+            connection.execute(text(
+                f"INSERT INTO {table}_fts({table}_fts) VALUES ('rebuild')"))
+    return True
+
+
+def drop_fts(connection):
+    """Drop the FTS5 tables made by create_fts()"""
+    for name in FIELDS:
+        connection.execute(text(
+            f"DROP TABLE IF EXISTS {classes[name].__tablename__}_fts"))
+
 
 class DBStorage:
     """interaacts with the MySQL database"""
     __engine = None
     __session = None
+    __batch_depth = 0
+    # whether text search runs on SQLite FTS5 tables
+    __fts = False
 
     def __init__(self):
         """Instantiate a DBStorage object"""
-        HBNB_MYSQL_USER = getenv('HBNB_MYSQL_USER')
-        HBNB_MYSQL_PWD = getenv('HBNB_MYSQL_PWD')
-        HBNB_MYSQL_HOST = getenv('HBNB_MYSQL_HOST')
-        HBNB_MYSQL_DB = getenv('HBNB_MYSQL_DB')
         HBNB_ENV = getenv('HBNB_ENV')
-        self.__engine = create_engine('mysql+mysqldb://{}:{}@{}/{}'.
-                                      format(HBNB_MYSQL_USER,
-                                             HBNB_MYSQL_PWD,
-                                             HBNB_MYSQL_HOST,
-                                             HBNB_MYSQL_DB))
+        url = engine_url()
+        if url.startswith('sqlite') and (
+                url.rstrip('/') == 'sqlite:' or ':memory:' in url):
+            # every pooled connection would open its own empty database
+            self.__engine = create_engine(url)
+        else:
+            self.__engine = create_engine(url, **pool_options())
+        if self.__engine.dialect.name == 'sqlite':
+            event.listen(self.__engine, 'connect', sqlite_pragmas)
         if HBNB_ENV == "test":
             Base.metadata.drop_all(self.__engine)
+            if self.__engine.dialect.name == 'sqlite':
+                with self.__engine.begin() as connection:
+                    drop_fts(connection)
+        if hasattr(os, 'register_at_fork'):
+            # WSGI servers that fork workers after import must not share
+            # the parent's pooled connections
+            os.register_at_fork(after_in_child=self.__after_fork)
+
+    def __after_fork(self):
+        """drop the connections and sessions inherited from the parent"""
+        self.__engine.dispose(close=False)
+        if self.__session is not None:
+            self.__session.registry.clear()
+
+    def all(self, target_class=None, load=None):
+        """query on the current database session
 
-    def all(self, target_class=None):
-        """query on the current database session"""
+        load names relationships to fetch along with the objects, e.g.
+        all(State, load=["cities"]); each one costs a single
+        SELECT ... IN query instead of one query per object.
+        """
         result_dict = {}
 
         try:
             for class_name, class_instance in classes.items():
                 if target_class is None or target_class is class_instance or\
-                        target_class is class_name:
-                    objects = self.__session.query(class_instance).all()
+                        target_class == class_name:
+                    relationships = inspect(class_instance).relationships
+                    objects = self.__session.query(class_instance).options(
+                        *[selectinload(getattr(class_instance, name))
+                          for name in load or () if name in relationships]
+                    ).all()
                     for obj in objects:
                         key = f"{obj.__class__.__name__}.{obj.id}"
                         result_dict[key] = obj
@@ -58,22 +214,352 @@ class DBStorage:
 
         return result_dict
 
+    def iter_all(self, cls=None, batch_size=1000):
+        """yield (key, object) pairs of cls, or of all classes
+
+        Rows are streamed batch_size at a time with yield_per, so huge
+        tables are walked without holding every object in memory.
+        """
+        if cls is None:
+            kinds = classes.values()
+        elif isinstance(cls, str):
+            kinds = [classes[cls]] if cls in classes else []
+        else:
+            kinds = [cls]
+        for kind in kinds:
+            rows = self.__session.scalars(
+                select(kind).execution_options(yield_per=batch_size))
+            prefix = kind.__name__ + '.'
+            for obj in rows:
+                yield prefix + obj.id, obj
+
+    def stats(self):
+        """return connection pool statistics
+
+        checked_out and overflow describe the pool right now; checkouts,
+        timeouts and wait_time / max_wait (seconds) accumulate since the
+        engine was created.
+        """
+        pool = self.__engine.pool
+        stats = {}
+        for name in ('size', 'checkedin', 'checkedout', 'overflow'):
+            method = getattr(pool, name, None)
+            if method is not None:
+                stats[name.replace('checked', 'checked_')] = method()
+        for name in ('checkouts', 'timeouts', 'wait_time', 'max_wait'):
+            if hasattr(pool, name):
+                stats[name] = getattr(pool, name)
+        return stats
+
+    def search_places(self, states=None, cities=None, amenities=None,
+                      price_range=None, max_guest=None):
+        """query the places matching every given filter in one statement
+
+        Filters mean the same as in FileStorage.search_places(); cities
+        of states and places with all amenities are found by indexed
+        subqueries.
+        """
+        query = self.__session.query(Place)
+        if states or cities:
+            located = Place.city_id.in_(list(cities or ()))
+            if states:
+                located |= Place.city_id.in_(select(City.id).where(
+                    City.state_id.in_(list(states))))
+            query = query.filter(located)
+        if amenities:
+            amenities = set(amenities)
+            query = query.filter(Place.id.in_(
+                select(place_amenity.c.place_id).where(
+                    place_amenity.c.amenity_id.in_(list(amenities))
+                ).group_by(place_amenity.c.place_id).having(
+                    func.count() == len(amenities))))
+        low, high = price_range or (None, None)
+        if low is not None:
+            query = query.filter(Place.price_by_night >= low)
+        if high is not None:
+            query = query.filter(Place.price_by_night <= high)
+        if max_guest is not None:
+            query = query.filter(Place.max_guest >= max_guest)
+        return {'Place.' + place.id: place for place in query}
+
+    def places_near(self, latitude, longitude, radius_km, limit=None):
+        """query the places within radius_km of a point, nearest first
+
+        The coordinates of the places inside the circle's bounding box
+        are read through the latitude/longitude index, exact distances
+        are computed here, and only the places kept are then loaded.
+        """
+        center = geo.coordinates(latitude, longitude)
+        if center is None:
+            raise ValueError("Invalid latitude or longitude")
+        south, north, west, east = geo.bounding_box(*center, radius_km)
+        query = select(Place.id, Place.latitude, Place.longitude).where(
+            Place.latitude.between(south, north))
+        if west <= east:
+            query = query.where(Place.longitude.between(west, east))
+        else:
+            query = query.where((Place.longitude >= west) |
+                                (Place.longitude <= east))
+        found = []
+        for place_id, lat, lon in self.__session.execute(query):
+            distance = geo.distance_km(*center, lat, lon)
+            if distance <= radius_km:
+                found.append((distance, place_id))
+        if limit is None:
+            found.sort()
+        else:
+            found = heapq.nsmallest(limit, found)
+        if not found:
+            return []
+        places = {place.id: place for place in self.__session.query(
+            Place).filter(Place.id.in_([place_id for _, place_id in found]))}
+        return [places[place_id] for _, place_id in found]
+
+    def search_text(self, cls, query, limit=10):
+        """query the objects of cls best matching query, best first
+
+        On SQLite the FTS5 tables rank matches with their bm25();
+        other databases have the text columns read and ranked with
+        models.engine.text_index.
+        """
+        if isinstance(cls, str):
+            cls = classes[cls]
+        name = cls.__name__
+        terms = tokenize(query)
+        if name not in FIELDS or not terms:
+            return []
+        if self.__fts:
+            table = cls.__tablename__
+            statement = (
+                f"SELECT {table}.id FROM {table}_fts JOIN {table} "
+                f"ON {table}.rowid = {table}_fts.rowid "
+                f"WHERE {table}_fts MATCH :query ORDER BY bm25({table}_fts)")
+            if limit is not None:
+                statement += " LIMIT :limit"
+            ids = self.__session.execute(
+                text(statement).columns(cls.__table__.c.id), {
+                    'query': ' OR '.join(f'"{term}"' for term in terms),
+                    'limit': limit}).scalars().all()
+        else:
+            index = TextIndex()
+            columns = [getattr(cls, field) for field in FIELDS[name]]
+            for row in self.__session.execute(select(cls.id, *columns)):
+                index.add(row[0], ' '.join(
+                    value for value in row[1:] if value))
+            ids = [key for _, key in index.search(query, limit)]
+        if not ids:
+            return []
+        found = {obj.id: obj for obj in self.__session.query(cls).filter(
+            cls.id.in_(ids))}
+        return [found[key] for key in ids]
+
+    def aggregate(self, cls, column=None, group_by=None, percentiles=()):
+        """compute statistics of column per value of group_by in SQL
+
+        count, sum, mean, min and max come from one GROUP BY. Percentiles
+        need every value, so then only the group and value columns are
+        read and reduced by models.engine.analytics.
+        """
+        if isinstance(cls, str):
+            cls = classes[cls]
+        via = analytics.DERIVED.get((cls.__name__, group_by))
+        if via is not None:
+            parent = classes[via[1]]
+            keys = [getattr(parent, via[2])]
+        else:
+            keys = [getattr(cls, group_by)] if group_by else []
+        value = getattr(cls, column) if column else None
+        if value is None:
+            query = select(*keys, func.count())
+        elif percentiles:
+            query = select(*keys, value).where(value.isnot(None))
+        else:
+            query = select(*keys, func.count(value), func.sum(value),
+                           func.avg(value), func.min(value), func.max(value))
+        query = query.select_from(cls)
+        if via is not None:
+            query = query.join(parent, getattr(cls, via[0]) == parent.id)
+        rows = self.__session.execute(query if value is not None and
+                                      percentiles else query.group_by(*keys))
+        if value is not None and percentiles:
+            groups, values = [], []
+            for row in rows:
+                groups.append(row[0] if keys else None)
+                values.append(row[-1])
+            return analytics.group_stats(groups, values, percentiles)
+        result = {}
+        for row in rows:
+            stats = row[len(keys):]
+            if not stats[0]:
+                continue
+            group = row[0] if keys else None
+            result[group] = {'count': stats[0]}
+            if value is not None:
+                result[group].update(zip(('sum', 'mean', 'min', 'max'),
+                                         map(float, stats[1:])))
+        return result
+
+    def ordered(self, cls, attribute='name', load=None, **equal):
+        """query the objects of cls sorted by attribute in the database
+
+        Keyword arguments filter on equality and load names
+        relationships to fetch along, as in all().
+        """
+        if isinstance(cls, str):
+            cls = classes[cls]
+        relationships = inspect(cls).relationships
+        return self.__session.query(cls).filter_by(**equal).options(
+            *[selectinload(getattr(cls, name))
+              for name in load or () if name in relationships]
+        ).order_by(getattr(cls, attribute)).all()
+
+    def get(self, cls, id):
+        """return the object of cls with the given id, or None"""
+        if isinstance(cls, str):
+            cls = classes.get(cls)
+            if cls is None:
+                return None
+        return self.__session.get(cls, id)
+
+    def count(self, cls=None):
+        """count the objects of cls, or of all classes"""
+        if cls is None:
+            return sum(self.__session.query(kind).count()
+                       for kind in classes.values())
+        if isinstance(cls, str):
+            cls = classes.get(cls)
+            if cls is None:
+                return 0
+        return self.__session.query(cls).count()
+
+    def related(self, cls, attribute, value):
+        """query the objects of cls whose foreign key equals value"""
+        if isinstance(cls, str):
+            cls = classes[cls]
+        objects = self.__session.query(cls).filter(
+            getattr(cls, attribute) == value)
+        return {cls.__name__ + '.' + obj.id: obj for obj in objects}
+
     def new(self, obj):
         """add the object to the current database session"""
         self.__session.add(obj)
 
+    def bulk_new(self, objects, chunk_size=1000):
+        """insert objects with executemany, chunk_size rows at a time
+
+        Rows skip the session and its identity map; only column values
+        are written, not relationship collections. Parent tables are
+        flushed before their children, so objects must come after the
+        objects they reference. Returns the number of rows inserted.
+        """
+        tables = Base.metadata.sorted_tables
+        pending = {}
+        buffered = inserted = 0
+        for obj in objects:
+            table = obj.__table__
+            pending.setdefault(table, []).append({
+                column.key: self.__value(obj, column)
+                for column in table.columns})
+            buffered += 1
+            if buffered >= chunk_size:
+                inserted += self.__insert(tables, pending)
+                buffered = 0
+        inserted += self.__insert(tables, pending)
+        self.save()
+        return inserted
+
+    def __insert(self, tables, pending):
+        """execute the buffered rows table by table, parents first"""
+        inserted = 0
+        for table in tables:
+            rows = pending.pop(table, None)
+            if rows:
+                self.__session.execute(insert(table), rows)
+                inserted += len(rows)
+        return inserted
+
+    @staticmethod
+    def __value(obj, column):
+        """value of column for obj, falling back to a scalar default"""
+        value = getattr(obj, column.key, None)
+        if value is None and column.default is not None and \
+                column.default.is_scalar:
+            return column.default.arg
+        return value
+
     def save(self):
-        """commit all changes of the current database session"""
+        """commit all changes of the current database session
+
+        Inside a batch the commit is deferred to the final commit().
+        """
+        if not self.__batch_depth:
+            self.__commit()
+
+    def begin(self):
+        """open a batch: save() calls are deferred until commit()"""
+        self.__batch_depth += 1
+
+    def commit(self):
+        """close a batch, committing the session when the last one closes"""
+        if self.__batch_depth:
+            self.__batch_depth -= 1
+        if not self.__batch_depth:
+            self.__commit()
+
+    def __commit(self):
+        """bump the version row and commit the session"""
+        self.__session.execute(update(storage_version).values(
+            version=storage_version.c.version + 1))
         self.__session.commit()
 
+    def rollback(self):
+        """abandon open batches and roll back the current session"""
+        self.__batch_depth = 0
+        self.__session.rollback()
+
+    @contextmanager
+    def batch(self):
+        """context manager grouping saves into one commit, or none on error"""
+        self.begin()
+        try:
+            yield self
+        except BaseException:
+            self.rollback()
+            raise
+        self.commit()
+
+    transaction = batch
+
     def delete(self, obj=None):
         """delete from the current database session obj if not None"""
         if obj:
             self.__session.delete(obj)
 
+    def version(self):
+        """return a counter that changes whenever the database is written
+
+        It is read from the storage_version row, which every commit made
+        through DBStorage bumps, so writes by other processes count once
+        they are committed.
+        """
+        return self.__session.execute(
+            select(storage_version.c.version)).scalar()
+
     def reload(self):
         """reloads data from the database"""
         Base.metadata.create_all(self.__engine)
+        try:
+            with self.__engine.begin() as connection:
+                if connection.execute(
+                        select(storage_version.c.id)).first() is None:
+                    connection.execute(insert(storage_version).values(
+                        id=1, version=0))
+        except IntegrityError:
+            # another process inserted the row first
+            pass
+        if self.__engine.dialect.name == 'sqlite':
+            with self.__engine.begin() as connection:
+                self.__fts = create_fts(connection)
         session_factory = sessionmaker(
             bind=self.__engine, expire_on_commit=False)
         Session = scoped_session(session_factory)
@@ -1,31 +1,349 @@
 #!/usr/bin/python3
 """This module defines a class to manage file storage for hbnb clone"""
+import bisect
+import heapq
+import itertools
 import json
+import math
+import os
+import re
+from contextlib import contextmanager
+from models.engine import analytics, binary_format, geo
+from models.engine import text_index
+from models.engine.text_index import FIELDS, TextIndex, document
+from os import getenv
+
+_decoder = json.JSONDecoder()
+_whitespace = re.compile(r'[ \t\n\r]*')
+
+
+def _sort_key(value):
+    """Key ordering values of mixed types without raising TypeError
+
+    Numbers sort first, then strings, then other values by type and
+    repr, then None.
+    """
+    if value is None:
+        return (3, '', '')
+    if isinstance(value, str):
+        return (1, '', value)
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return (0, '', value)
+    return (2, type(value).__name__, repr(value))
+
+
+def _number(value):
+    """Return value as a float, or None if it is not a number"""
+    if isinstance(value, bool):
+        return None
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if value != value else value
+
+
+def _own_value(obj, name):
+    """Return attribute name as set on obj, or None for a class default
+
+    Stored records only hold the attributes set on the object, so this
+    is what indexes built from records would see.
+    """
+    if name in getattr(type(obj), '__slots__', ()):
+        try:
+            # unset slots fall back to defaults in __getattr__ only
+            return object.__getattribute__(obj, name)
+        except AttributeError:
+            return None
+    return getattr(obj, '__dict__', {}).get(name)
+
+
+def _iter_snapshot(f, read_size=1 << 16):
+    """Yield (key, record, raw text) for each member of a JSON object
+
+    The file is read read_size characters at a time and each record is
+    decoded as soon as it is complete, so memory use is bounded by the
+    largest record rather than by the size of the file.
+    """
+    buf = ''
+    pos = 0
+    eof = False
+
+    def fill():
+        """Read more text, dropping what was consumed; False at EOF"""
+        nonlocal buf, pos, eof
+        chunk = f.read(read_size)
+        if not chunk:
+            eof = True
+            return False
+        buf = buf[pos:] + chunk
+        pos = 0
+        return True
+
+    def skip():
+        """Advance past whitespace and return the next character"""
+        nonlocal pos
+        while True:
+            pos = _whitespace.match(buf, pos).end()
+            if pos < len(buf):
+                return buf[pos]
+            if not fill():
+                return ''
+
+    def decode():
+        """Decode the JSON value at pos, reading on until it is complete"""
+        nonlocal pos
+        while True:
+            try:
+                value, end = _decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof or not fill():
+                    raise
+                continue
+            if end == len(buf) and not eof and fill():
+                continue  # a number may continue in the next chunk
+            start, pos = pos, end
+            return value, buf[start:end]
+
+    def expect(chars):
+        """Consume one of chars, raising a decode error otherwise"""
+        nonlocal pos
+        char = skip()
+        if not char or char not in chars:
+            raise json.JSONDecodeError(
+                "Expecting " + " or ".join(map(repr, chars)), buf, pos)
+        pos += 1
+        return char
+
+    if not skip():
+        raise json.JSONDecodeError("Expecting value", buf, pos)
+    expect('{')
+    if skip() == '}':
+        return
+    while True:
+        skip()
+        key, _ = decode()
+        expect(':')
+        skip()
+        record, raw = decode()
+        yield key, record, raw
+        if expect(',}') == '}':
+            return
+
+
+def _iter_lines(f):
+    """Yield (key, raw JSON text) of a snapshot with one record per line
+
+    compact() writes snapshots this way so that lazy reload() can split
+    records without decoding them. Raises ValueError at the first line
+    that does not hold exactly one record, as in other layouts.
+    """
+    if f.readline() != '{\n':
+        raise ValueError("Expecting one record per line")
+    more = closed = False
+    for line in f:
+        if closed or line == '\n':
+            if line.strip():
+                raise ValueError("Extra data after the last record")
+            continue
+        if line == '}' or line == '}\n':
+            if more:
+                raise ValueError("Expecting a record after ','")
+            closed = True
+            continue
+        more = line.endswith(',\n')
+        end = line.find('": {')
+        raw = line[end + 3:].rstrip(',\n')
+        key = line[1:end]
+        # JSON strings hold no raw newline, so a line that opens and
+        # closes one object around no other brace holds all of it
+        if end < 1 or line[0] != '"' or '"' in key or '\\' in key or \
+                raw[-1:] != '}' or raw.count('{') != 1 or \
+                raw.count('}') != 1:
+            member = json.loads('{' + line.rstrip(',\n') + '}')
+            if len(member) != 1:
+                raise ValueError("Expecting one record per line")
+            key, val = member.popitem()
+            raw = json.dumps(val)
+        yield key, raw
+    if not closed:
+        raise ValueError("Expecting '}'")
 
 
 class FileStorage:
-    """This class manages storage of hbnb models in JSON format"""
+    """This class manages storage of hbnb models in JSON format
+
+    __objects is changed through new(), bulk_new(), delete() and
+    reload(), which keep the secondary indexes in step. The dict that
+    all() returns may also be changed directly; the next indexed lookup
+    then checks it against the indexes and rebuilds them if it differs.
+    """
     __file_path = 'file.json'
     __objects = {}
+    # set when all() hands out __objects itself, which the caller may
+    # change behind the indexes' back
+    __exposed = False
+    # journal mode appends changed records to <file_path>.log on save()
+    # and folds the log into a new snapshot once it passes __journal_max
+    __journal = getenv('HBNB_FILE_JOURNAL', '') in ('1', 'true', 'yes')
+    __journal_max = int(getenv('HBNB_JOURNAL_MAX_BYTES', 16 * 1024 * 1024))
+    # snapshot encoding written by compact(): 'json' or 'binary'; when
+    # unset, the format found by the last reload() is kept
+    __format = getenv('HBNB_FILE_FORMAT')
+    __detected = None
+    # lazy mode keeps the raw JSON of each record from reload() and only
+    # decodes it when the model is looked up or an indexed query needs it
+    __lazy = getenv('HBNB_LAZY_RELOAD', '') in ('1', 'true', 'yes')
+    # compact mode builds reloaded records as the __slots__ variants
+    # returned by BaseModel.compact_class() and keeps no serialized cache
+    __compact = getenv('HBNB_COMPACT_MODELS', '') in ('1', 'true', 'yes')
+    # unbuilt records: class name -> {key: raw JSON text}
+    __pending = {}
+    # class names whose pending records are not yet in the foreign key,
+    # member and grid indexes
+    __unindexed = set()
+    # class name -> model class, filled on the first reload()
+    __classes = {}
+    # keys written through new() / delete() since the last save()
+    __dirty = set()
+    __deleted = set()
+    # key -> (obj, '"key": {...}' JSON text) reused by save() while clean;
+    # filled by the first save() of an object, not by reload(), so the
+    # text of a reloaded snapshot is not kept alongside its models
+    __serialized = {}
+    # characters read at a time when streaming the snapshot in reload()
+    __read_size = 1 << 16
+    # open begin() calls; save() is deferred while any is pending
+    __batch_depth = 0
+    __batch_pending = False
+    # bumped by every save(), delete(), reload() and rollback() so
+    # callers can tell whether cached views of storage are stale
+    __version = 0
+    # secondary index: class name -> {key: obj} subset of __objects
+    __by_class = {}
+    # class name -> class, used to resolve isinstance() style filters
+    __types = {}
+    # foreign key attributes given a reverse index, per class name
+    __foreign_keys = {
+        'City': ('state_id',),
+        'Place': ('city_id', 'user_id'),
+        'Review': ('place_id', 'user_id'),
+    }
+    # reverse index: (class name, attribute) -> {value: {key: obj}},
+    # where obj is None for records lazy mode has not built yet
+    __by_fk = {}
+    # key -> {attribute: value} as last indexed, to find stale buckets
+    __fk_values = {}
+    # list attributes given an inverted index, per class name
+    __members = {'Place': ('amenity_ids',)}
+    # inverted index: (class name, attribute) -> {member: set of keys}
+    __by_member = {}
+    # key -> {attribute: tuple of members} as last indexed
+    __member_values = {}
+    # (latitude, longitude) attributes given a grid index, per class name
+    __points = {'Place': ('latitude', 'longitude')}
+    # grid cell side in degrees, about 11 km of latitude
+    __cell_size = 0.1
+    # grid index: class name -> {(row, column): {key: (lat, lon)}}
+    __grid = {}
+    # key -> (cell, (lat, lon)) as last indexed
+    __grid_cells = {}
+    # BM25 text indexes by class name, built by the first search_text()
+    # and saved next to the snapshot; None until then
+    __text = None
+    # key -> object or record to index again, or None to drop, applied
+    # by the next search_text() or compact()
+    __text_stale = {}
+    # set while the records read are known to be in the text index
+    __text_current = False
+    # bytes of the saved text index written by its last full dump and
+    # appended since; a size of 0 means it must be dumped again
+    __text_size = 0
+    __text_appended = 0
+    # class name -> {key: text or None} applied to the text index since
+    # it was last saved
+    __text_changes = {}
+    # sorted indexes built by ordered(), kept up to date by new() and
+    # delete(): (class name, attribute, equality attributes) ->
+    # ({equality values: [(sort key, key)]},
+    #  {key: (equality values, (sort key, key))})
+    __ordered = {}
+
+    def all(self, cls=None, load=None):
+        """Return a dictionary of models currently in storage.
 
-    def all(self, cls=None):
-        """Return a dictionary of models currently in storage."""
+        load is accepted for DBStorage compatibility; related objects
+        are already indexed in memory.
+        """
+        if cls is None:
+            self.__materialize_all()
+            FileStorage.__exposed = True
+            return self.__objects
         try:
-            if cls is not None:
-                filtered_objects = {
-                    key: value for key, value in self.__objects.items()
-                    if isinstance(value, cls) or
-                    cls == value.__class__.__name__
-                }
-                return filtered_objects
+            names = self.__class_names(cls)
         except (AttributeError, TypeError) as e:
             print(f"Error during class filtering: {e}")
+            self.__materialize_all()
+            FileStorage.__exposed = True
+            return self.__objects
 
-        return self.__objects
+        self.__check_index()
+        for name in names:
+            if self.__pending.get(name):
+                self.__materialize(name, list(self.__pending[name]))
+        if len(names) == 1:
+            return dict(self.__by_class.get(names[0], {}))
+        result = {}
+        for name in names:
+            result.update(self.__by_class.get(name, {}))
+        return result
+
+    def iter_all(self, cls=None, batch_size=1000):
+        """Yield (key, object) pairs of cls, or of every class
+
+        Lazily reloaded records are built batch_size at a time as the
+        iteration reaches them.
+        """
+        self.__check_index()
+        if cls is None:
+            names = list(self.__by_class)
+            names += [name for name in self.__pending if name not in names]
+        else:
+            names = self.__class_names(cls)
+        for name in names:
+            yield from list(self.__by_class.get(name, {}).items())
+            pending = self.__pending.get(name)
+            while pending:
+                keys = list(itertools.islice(pending, batch_size))
+                self.__materialize(name, keys)
+                bucket = self.__by_class[name]
+                yield from [(key, bucket[key]) for key in keys]
 
     def new(self, obj):
         """Adds new object to storage dictionary"""
-        self.all().update({obj.to_dict()['__class__'] + '.' + obj.id: obj})
+        key = obj.__class__.__name__ + '.' + obj.id
+        self.__pending.get(obj.__class__.__name__, {}).pop(key, None)
+        self.__objects[key] = obj
+        self.__index(key, obj)
+        self.__dirty.add(key)
+        self.__deleted.discard(key)
+
+    def bulk_new(self, objects):
+        """Adds many objects and writes them with a single save()
+
+        Returns the number of objects added.
+        """
+        added = {}
+        for obj in objects:
+            added[obj.__class__.__name__ + '.' + obj.id] = obj
+        for key, obj in added.items():
+            self.__pending.get(key.partition('.')[0], {}).pop(key, None)
+            self.__index(key, obj)
+        self.__objects.update(added)
+        self.__dirty.update(added)
+        self.__deleted.difference_update(added)
+        self.save()
+        return len(added)
 
     def delete(self, obj=None):
         """Delete obj from __objects if it exists."""
@@ -33,36 +351,841 @@ class FileStorage:
             key = f"{obj.__class__.__name__}.{obj.id}"
             if key in self.__objects:
                 del self.__objects[key]
+                self.__unindex(key)
+                self.__deleted.add(key)
+                self.__dirty.discard(key)
+                self.__serialized.pop(key, None)
+                FileStorage.__version += 1
+
+    def version(self):
+        """Return a counter that changes whenever storage changes"""
+        return FileStorage.__version
+
+    def mark_dirty(self, obj):
+        """Flag a stored object as modified since the last save()"""
+        key = obj.__class__.__name__ + '.' + obj.id
+        if self.__objects.get(key) is obj:
+            self.__dirty.add(key)
+
+    def get(self, cls, id):
+        """Return the object of cls with the given id, or None"""
+        name = cls if isinstance(cls, str) else cls.__name__
+        key = name + '.' + str(id)
+        if key in self.__pending.get(name, ()):
+            self.__materialize(name, [key])
+        return self.__objects.get(key)
+
+    def count(self, cls=None):
+        """Return the number of objects of cls, or of all classes"""
+        self.__check_index()
+        if cls is None:
+            return len(self.__objects) + sum(
+                len(bucket) for bucket in self.__pending.values())
+        try:
+            names = self.__class_names(cls)
+        except (AttributeError, TypeError):
+            return 0
+        return sum(len(self.__by_class.get(name, ())) +
+                   len(self.__pending.get(name, ())) for name in names)
+
+    def related(self, cls, attribute, value):
+        """Return the objects of cls whose foreign key equals value"""
+        name = cls if isinstance(cls, str) else cls.__name__
+        if attribute not in self.__foreign_keys.get(name, ()):
+            return {key: obj for key, obj in self.all(name).items()
+                    if getattr(obj, attribute, None) == value}
+        self.__check_index()
+        self.__index_pending(name)
+        bucket = self.__by_fk.get((name, attribute), {}).get(value, {})
+        unbuilt = [key for key, obj in bucket.items() if obj is None]
+        if unbuilt:
+            self.__materialize(name, unbuilt)
+        return dict(bucket)
+
+    def search_places(self, states=None, cities=None, amenities=None,
+                      price_range=None, max_guest=None):
+        """Return the places matching every given filter
+
+        A place matches states and cities when its city is one of cities
+        or belongs to one of states, and amenities when it has all of
+        them; all three are lists of ids. price_range is an inclusive
+        (low, high) price_by_night pair where either end may be None,
+        and max_guest the number of guests the place must fit. Prices and
+        guests stored as strings, as create can leave them, are compared
+        as numbers, and places where they are not numbers do not match.
+        """
+        self.__check_index()
+        self.__index_pending('City', 'Place')
+        keys = None
+        if states or cities:
+            city_ids = set(cities or ())
+            by_state = self.__by_fk.get(('City', 'state_id'), {})
+            for state_id in states or ():
+                city_ids.update(key.partition('.')[2]
+                                for key in by_state.get(state_id, ()))
+            by_city = self.__by_fk.get(('Place', 'city_id'), {})
+            keys = set()
+            for city_id in city_ids:
+                keys.update(by_city.get(city_id, ()))
+        if amenities:
+            by_amenity = self.__by_member.get(('Place', 'amenity_ids'), {})
+            for members in sorted((by_amenity.get(amenity, set())
+                                   for amenity in set(amenities)), key=len):
+                keys = set(members) if keys is None else keys & members
+                if not keys:
+                    break
+        low, high = price_range or (None, None)
+        if keys is None and (low is not None or high is not None):
+            keys = self.__range('Place', 'price_by_night', low, high)
+            # strings sort after every number; the loop below checks them
+            keys += self.__range('Place', 'price_by_night', '', chr(0x10ffff))
+        pending = self.__pending.get('Place', {})
+        if keys is None:
+            if pending:
+                self.__materialize('Place', list(pending))
+            keys = self.__by_class.get('Place', {})
+        else:
+            unbuilt = [key for key in keys if key in pending]
+            if unbuilt:
+                self.__materialize('Place', unbuilt)
+        bucket = self.__by_class.get('Place', {})
+        result = {}
+        for key in keys:
+            obj = bucket.get(key)
+            if obj is None:
+                continue
+            if low is not None or high is not None:
+                price = _number(obj.price_by_night)
+                if price is None or low is not None and price < low or \
+                        high is not None and price > high:
+                    continue
+            if max_guest is not None:
+                guests = _number(obj.max_guest)
+                if guests is None or guests < max_guest:
+                    continue
+            result[key] = obj
+        return result
+
+    def places_near(self, latitude, longitude, radius_km, limit=None):
+        """Return the places within radius_km of a point, nearest first
+
+        Only the grid cells overlapping the circle's bounding box are
+        visited, and only the places returned are built from a lazy
+        reload. limit keeps the nearest limit places.
+        """
+        center = geo.coordinates(latitude, longitude)
+        if center is None:
+            raise ValueError("Invalid latitude or longitude")
+        self.__check_index()
+        self.__index_pending('Place')
+        south, north, west, east = geo.bounding_box(*center, radius_km)
+        size = self.__cell_size
+        rows = range(math.floor(south / size), math.floor(north / size) + 1)
+        if west <= east:
+            spans = [(west, east)]
+        else:
+            spans = [(west, 180.0), (-180.0, east)]
+        columns = [range(math.floor(low / size), math.floor(high / size) + 1)
+                   for low, high in spans]
+        cells = self.__grid.get('Place', {})
+        if len(rows) * sum(map(len, columns)) > len(cells):
+            buckets = [bucket for cell, bucket in cells.items()
+                       if cell[0] in rows and
+                       any(cell[1] in span for span in columns)]
+        else:
+            buckets = [cells[cell] for cell in itertools.product(
+                rows, itertools.chain(*columns)) if cell in cells]
+        found = []
+        for bucket in buckets:
+            for key, point in bucket.items():
+                distance = geo.distance_km(*center, *point)
+                if distance <= radius_km:
+                    found.append((distance, key))
+        if limit is None:
+            found.sort()
+        else:
+            found = heapq.nsmallest(limit, found)
+        pending = self.__pending.get('Place', {})
+        unbuilt = [key for _, key in found if key in pending]
+        if unbuilt:
+            self.__materialize('Place', unbuilt)
+        bucket = self.__by_class.get('Place', {})
+        return [bucket[key] for _, key in found]
+
+    def search_text(self, cls, query, limit=10):
+        """Return the objects of cls best matching query, best first
+
+        Objects are ranked with BM25 over the attributes listed in
+        models.engine.text_index.FIELDS; limit None returns every match.
+        """
+        name = cls if isinstance(cls, str) else cls.__name__
+        if name not in FIELDS:
+            return []
+        self.__check_index()
+        self.__flush_text()
+        found = FileStorage.__text[name].search(query, limit)
+        pending = self.__pending.get(name, {})
+        unbuilt = [key for _, key in found if key in pending]
+        if unbuilt:
+            self.__materialize(name, unbuilt)
+        bucket = self.__by_class.get(name, {})
+        return [bucket[key] for _, key in found]
+
+    def aggregate(self, cls, column=None, group_by=None, percentiles=()):
+        """Return statistics of column per value of group_by
+
+        See models.engine.analytics for the shape of the result. Like
+        DBStorage, raises AttributeError for an attribute that neither
+        the model nor any stored object has.
+        """
+        name = cls if isinstance(cls, str) else cls.__name__
+        parents = None
+        via = analytics.DERIVED.get((name, group_by))
+        if via is not None:
+            parents = {obj.id: getattr(obj, via[2], None)
+                       for obj in self.all(via[1]).values()}
+            group_by = via[0]
+        objects = self.all(name).values()
+        kind = self.__model_classes().get(name)
+        for attribute in (column, group_by):
+            if attribute and not hasattr(kind, attribute) and not any(
+                    hasattr(obj, attribute) for obj in objects):
+                raise AttributeError(
+                    "type object '{}' has no attribute '{}'".format(
+                        name, attribute))
+        return analytics.aggregate(objects, group_by, column, percentiles,
+                                   parents)
+
+    def ordered(self, cls, attribute='name', load=None, **equal):
+        """Return the objects of cls sorted by attribute
+
+        Keyword arguments keep only objects whose attributes equal the
+        given values, e.g. ordered(City, 'name', state_id=state.id).
+        The first call builds a sorted index that new() and delete()
+        then maintain, so later calls do no sorting. load is accepted
+        for DBStorage compatibility.
+        """
+        name = cls if isinstance(cls, str) else cls.__name__
+        fields = tuple(sorted(equal))
+        self.__check_index()
+        index = self.__ordered_index(name, attribute, fields)
+        bucket = self.__by_class.get(name, {})
+        group = tuple(equal[field] for field in fields)
+        return [bucket[key] for _, key in index[0].get(group, ())]
+
+    def __ordered_index(self, name, attribute, fields=()):
+        """Return the ordered index of name by attribute, building it"""
+        if self.__pending.get(name):
+            self.__materialize(name, list(self.__pending[name]))
+        index_id = (name, attribute, fields)
+        index = self.__ordered.get(index_id)
+        if index is None:
+            index = self.__ordered[index_id] = ({}, {})
+            for key, obj in self.__by_class.get(name, {}).items():
+                self.__place(index_id, index, key, obj)
+        return index
+
+    def __range(self, name, attribute, low=None, high=None):
+        """Return the keys of name whose attribute is within low, high"""
+        entries = self.__ordered_index(name, attribute)[0].get((), [])
+        start = 0 if low is None else bisect.bisect_left(
+            entries, (_sort_key(low),))
+        # keys are str, so no key sorts after chr(0x10ffff)
+        end = len(entries) if high is None else bisect.bisect_right(
+            entries, (_sort_key(high), chr(0x10ffff)))
+        return [key for _, key in entries[start:end]]
 
     def save(self):
-        """Saves storage dictionary to file"""
-        with open(FileStorage.__file_path, 'w') as f:
-            temp = {}
-            temp.update(FileStorage.__objects)
-            for key, val in temp.items():
-                temp[key] = val.to_dict()
-            json.dump(temp, f)
+        """Saves storage dictionary to file
+
+        Only objects passed to new() or modified through attribute
+        assignment since the last save are serialized again; in-place
+        changes to mutable attributes need obj.save() to be picked up.
+        Inside a batch the write is deferred to the final commit().
+        """
+        FileStorage.__version += 1
+        if FileStorage.__batch_depth:
+            FileStorage.__batch_pending = True
+            return
+        if not self.__journal:
+            self.compact()
+            return
+        with open(self.__journal_path(), 'a') as f:
+            for key in self.__deleted:
+                f.write(json.dumps({'key': key}) + '\n')
+            for key in self.__dirty:
+                if key in self.__objects:
+                    name = json.dumps(key)
+                    text = self.__serialize(key, self.__objects[key])
+                    f.write('{"key": %s, "value": %s}\n' % (
+                        name, text[len(name) + 2:]))
+            size = f.tell()
+        self.__dirty.clear()
+        self.__deleted.clear()
+        if size > self.__journal_max:
+            self.compact()
+
+    def begin(self):
+        """Open a batch: save() calls are deferred until commit()"""
+        FileStorage.__batch_depth += 1
+
+    def commit(self):
+        """Close a batch, writing once if anything was saved inside it"""
+        if FileStorage.__batch_depth:
+            FileStorage.__batch_depth -= 1
+        if not FileStorage.__batch_depth and FileStorage.__batch_pending:
+            FileStorage.__batch_pending = False
+            self.save()
+
+    def rollback(self):
+        """Abandon open batches and restore the last saved state"""
+        FileStorage.__batch_depth = 0
+        FileStorage.__batch_pending = False
+        self.__objects.clear()
+        self.__pending.clear()
+        self.__serialized.clear()
+        self.__rebuild_index()
+        self.reload()
+
+    @contextmanager
+    def batch(self):
+        """Context manager grouping saves into one write, or none on error"""
+        self.begin()
+        try:
+            yield self
+        except BaseException:
+            self.rollback()
+            raise
+        self.commit()
+
+    transaction = batch
+
+    def convert(self, fmt):
+        """Rewrite the snapshot as fmt ('json' or 'binary') and keep it"""
+        if fmt not in ('json', 'binary'):
+            raise ValueError("Unknown storage format: {}".format(fmt))
+        FileStorage.__format = fmt
+        self.compact()
+
+    def compact(self):
+        """Write a full snapshot to file and discard the journal"""
+        temp_path = FileStorage.__file_path + '.tmp'
+        if (self.__format or self.__detected) == 'binary':
+            with open(temp_path, 'wb') as f:
+                binary_format.dump(self.__records(), f)
+        else:
+            with open(temp_path, 'w') as f:
+                # one record per line, see _iter_lines()
+                f.write('{\n')
+                f.writelines(
+                    (',\n' if i else '') + text
+                    for i, text in enumerate(self.__fragments()))
+                f.write('\n}')
+        os.replace(temp_path, FileStorage.__file_path)
+        try:
+            os.remove(self.__journal_path())
+        except FileNotFoundError:
+            pass
+        self.__dirty.clear()
+        self.__deleted.clear()
+        self.__save_text()
 
     def reload(self):
-        """Loads storage dictionary from file"""
-        from models.base_model import BaseModel
-        from models.user import User
-        from models.place import Place
-        from models.state import State
-        from models.city import City
-        from models.amenity import Amenity
-        from models.review import Review
-
-        classes = {
-            'BaseModel': BaseModel, 'User': User, 'Place': Place,
-            'State': State, 'City': City, 'Amenity': Amenity,
-            'Review': Review
-        }
+        """Loads storage dictionary from file
+
+        In lazy mode records are only split here; each model is built
+        the first time all(), get() or related() returns it.
+        """
+        classes = self.__model_classes()
+        self.__check_index()
+        FileStorage.__text_current = self.__load_text()
+        try:
+            with open(FileStorage.__file_path, 'rb') as f:
+                if binary_format.sniff(f.read(len(binary_format.MAGIC))):
+                    FileStorage.__detected = 'binary'
+                    for key, val in binary_format.load(f):
+                        self.__forget(key)
+                        obj = classes[val['__class__']].from_storage(val)
+                        self.__objects[key] = obj
+                        self.__index(key, obj)
+                else:
+                    FileStorage.__detected = 'json'
+            if FileStorage.__detected == 'json':
+                self.__load_json(classes)
+        except FileNotFoundError:
+            FileStorage.__detected = None
+        finally:
+            if FileStorage.__text_current:
+                FileStorage.__text_current = False
+                self.__sync_text()
+        self.__replay(classes)
+        self.__dirty.clear()
+        self.__deleted.clear()
+        FileStorage.__version += 1
+
+    def __load_json(self, classes):
+        """Stream the records of a JSON snapshot into storage
+
+        Lazy mode splits snapshots written by compact() line by line
+        without decoding them, and decodes other layouts once to find
+        where each record ends.
+        """
+        with open(FileStorage.__file_path, 'r') as f:
+            if self.__lazy:
+                try:
+                    self.__defer(_iter_lines(f))
+                    return
+                except ValueError:
+                    f.seek(0)
+                # keep one record per line for the next compact()
+                self.__defer(
+                    (key, json.dumps(val) if '\n' in raw else raw)
+                    for key, val, raw in _iter_snapshot(f, self.__read_size))
+                return
+            for key, val, raw in _iter_snapshot(f, self.__read_size):
+                self.__forget(key)
+                obj = classes[val['__class__']].from_storage(val)
+                self.__objects[key] = obj
+                self.__index(key, obj)
+
+    def __model_classes(self):
+        """Return the model classes by name, importing them once
+
+        In compact mode the __slots__ variants are returned instead.
+        """
+        if not self.__classes:
+            from models.base_model import BaseModel
+            from models.user import User
+            from models.place import Place
+            from models.state import State
+            from models.city import City
+            from models.amenity import Amenity
+            from models.review import Review
+
+            self.__classes.update({
+                'BaseModel': BaseModel, 'User': User, 'Place': Place,
+                'State': State, 'City': City, 'Amenity': Amenity,
+                'Review': Review
+            })
+        if self.__compact:
+            return {name: cls.compact_class()
+                    for name, cls in self.__classes.items()}
+        return self.__classes
+
+    def __text_path(self):
+        """Return the path of the saved text index"""
+        return FileStorage.__file_path + '.text'
+
+    def __mark_text(self, key, values):
+        """Queue key for the text index; values None drops it"""
+        if FileStorage.__text is not None and \
+                not FileStorage.__text_current and \
+                key.partition('.')[0] in FIELDS:
+            self.__text_stale[key] = values
+
+    def __flush_text(self):
+        """Build the text index, or apply the queued changes to it"""
+        if FileStorage.__text is None:
+            FileStorage.__text = {name: TextIndex() for name in FIELDS}
+            FileStorage.__text_size = 0
+            self.__text_stale.clear()
+            self.__text_changes.clear()
+            for name, index in FileStorage.__text.items():
+                for key, obj in self.__by_class.get(name, {}).items():
+                    index.add(key, document(name, obj))
+                for key, raw in self.__pending.get(name, {}).items():
+                    index.add(key, document(name, json.loads(raw)))
+            return
+        for key, values in self.__text_stale.items():
+            name = key.partition('.')[0]
+            if values is None:
+                FileStorage.__text[name].remove(key)
+                text = None
+            else:
+                if isinstance(values, str):
+                    values = json.loads(values)
+                text = document(name, values)
+                FileStorage.__text[name].add(key, text)
+            self.__text_changes.setdefault(name, {})[key] = text
+        self.__text_stale.clear()
+
+    def __save_text(self):
+        """Write the text index, if built, tagged with the snapshot
+
+        The changes since the last save are appended to the saved file,
+        which is only dumped again once they outgrow the last dump.
+        """
+        if FileStorage.__text is None:
+            return
+        self.__flush_text()
+        stat = os.stat(FileStorage.__file_path)
+        snapshot = [stat.st_mtime_ns, stat.st_size]
+        path = self.__text_path()
+        size = FileStorage.__text_size
+        try:
+            # another process may have rewritten or removed it
+            current = os.path.getsize(path) == \
+                size + FileStorage.__text_appended
+        except OSError:
+            current = False
+        if current and size and FileStorage.__text_appended < size:
+            with open(path, 'ab') as f:
+                FileStorage.__text_appended += text_index.dump_changes(
+                    self.__text_changes, snapshot, f)
+        else:
+            temp_path = path + '.tmp'
+            with open(temp_path, 'wb') as f:
+                text_index.dump(FileStorage.__text, snapshot, f)
+                FileStorage.__text_size = f.tell()
+            os.replace(temp_path, path)
+            FileStorage.__text_appended = 0
+        self.__text_changes.clear()
+
+    def __load_text(self):
+        """Load the saved text index if it matches the snapshot file"""
+        FileStorage.__text_size = 0
+        try:
+            stat = os.stat(FileStorage.__file_path)
+            with open(self.__text_path(), 'rb') as f:
+                saved, indexes = text_index.load_base(f)
+                size = f.tell()
+                saved = text_index.load_changes(indexes, saved, f)
+                appended = f.tell() - size
+        except (OSError, EOFError, KeyError, ValueError):
+            return False
+        if saved != [stat.st_mtime_ns, stat.st_size]:
+            return False
+        FileStorage.__text = {name: indexes.get(name) or TextIndex()
+                              for name in FIELDS}
+        FileStorage.__text_size = size
+        FileStorage.__text_appended = appended
+        self.__text_stale.clear()
+        self.__text_changes.clear()
+        return True
+
+    def __sync_text(self):
+        """Queue the differences between a loaded text index and memory"""
+        for name, index in FileStorage.__text.items():
+            built = self.__by_class.get(name, {})
+            present = built.keys() | self.__pending.get(name, {}).keys()
+            for key in index.numbers.keys() - present:
+                self.__text_stale[key] = None
+            for key in present - index.numbers.keys():
+                self.__text_stale[key] = built.get(key) or json.loads(
+                    self.__pending[name][key])
+
+    def __journal_path(self):
+        """Return the path of the append-only journal"""
+        return FileStorage.__file_path + '.log'
+
+    def __replay(self, classes):
+        """Apply the journal records on top of the loaded snapshot
+
+        A torn last line left by an interrupted save() is cut off, so
+        the next save() appends after the last complete record.
+        """
         try:
-            temp = {}
-            with open(FileStorage.__file_path, 'r') as f:
-                temp = json.load(f)
-                for key, val in temp.items():
-                    self.all()[key] = classes[val['__class__']](**val)
+            with open(self.__journal_path(), 'r+b') as f:
+                end = 0
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        f.truncate(end)
+                        break
+                    end += len(line)
+                    record = json.loads(line)
+                    key = record['key']
+                    self.__forget(key)
+                    val = record.get('value')
+                    if val is not None:
+                        obj = classes[val['__class__']].from_storage(val)
+                        self.__objects[key] = obj
+                        self.__index(key, obj)
         except FileNotFoundError:
             pass
+
+    def __forget(self, key):
+        """Drop key from memory and every index, built or not"""
+        if key in self.__objects:
+            del self.__objects[key]
+        elif self.__pending.get(key.partition('.')[0], {}).pop(
+                key, None) is None:
+            return
+        self.__unindex(key)
+        self.__serialized.pop(key, None)
+
+    def __defer(self, records):
+        """Keep (key, raw JSON text) records without decoding them"""
+        objects, pending = self.__objects, self.__pending
+        mark = FileStorage.__text is not None and \
+            not FileStorage.__text_current
+        last = bucket = None
+        for key, raw in records:
+            name = key.partition('.')[0]
+            if name != last:
+                bucket = pending.get(name)
+                if bucket is None:
+                    bucket = pending[name] = {}
+                    self.__types[name] = self.__model_classes()[name]
+                self.__unindexed.add(name)
+                last = name
+            if key in objects or key in bucket:
+                self.__forget(key)
+            bucket[key] = raw
+            if mark:
+                self.__mark_text(key, raw)
+
+    def __index_pending(self, *names):
+        """Add the pending records of names to the secondary indexes"""
+        for name in names:
+            if name not in self.__unindexed:
+                continue
+            self.__unindexed.discard(name)
+            fks = self.__foreign_keys.get(name)
+            members = self.__members.get(name)
+            points = self.__points.get(name)
+            if not (fks or members or points):
+                continue
+            for key, raw in self.__pending.get(name, {}).items():
+                val = json.loads(raw)
+                if fks:
+                    self.__index_fks(key, name, {
+                        attribute: val.get(attribute) for attribute in fks})
+                if members:
+                    self.__index_members(key, name, {
+                        attribute: val.get(attribute)
+                        for attribute in members})
+                if points:
+                    self.__index_point(key, name, *map(val.get, points))
+
+    def __materialize(self, name, keys):
+        """Build the models of pending records of class name"""
+        pending = self.__pending[name]
+        cls = self.__model_classes()[name]
+        # building a record does not change its text
+        current, FileStorage.__text_current = \
+            FileStorage.__text_current, True
+        try:
+            for key in keys:
+                raw = pending.pop(key)
+                obj = cls.from_storage(json.loads(raw))
+                self.__objects[key] = obj
+                self.__index(key, obj)
+        finally:
+            FileStorage.__text_current = current
+
+    def __materialize_all(self):
+        """Build every pending model"""
+        for name, pending in self.__pending.items():
+            if pending:
+                self.__materialize(name, list(pending))
+
+    def __fragments(self):
+        """Yield the '"key": {...}' text of every stored record"""
+        for key, val in self.__objects.items():
+            yield self.__serialize(key, val)
+        for pending in self.__pending.values():
+            for key, raw in pending.items():
+                yield json.dumps(key) + ': ' + raw
+
+    def __records(self):
+        """Yield (key, to_dict() record) for every stored record"""
+        for key, val in self.__objects.items():
+            yield key, val.to_dict()
+        for pending in self.__pending.values():
+            for key, raw in pending.items():
+                yield key, json.loads(raw)
+
+    def __serialize(self, key, obj):
+        """Return '"key": {...}' for obj, cached until obj is marked dirty
+
+        Compact mode trades the cache for memory and encodes every time.
+        """
+        if self.__compact:
+            return json.dumps(key) + ': ' + json.dumps(obj.to_dict())
+        cached = self.__serialized.get(key)
+        if cached is not None and cached[0] is obj and \
+                key not in self.__dirty:
+            return cached[1]
+        cached = (obj, json.dumps(key) + ': ' + json.dumps(obj.to_dict()))
+        self.__serialized[key] = cached
+        return cached[1]
+
+    def __class_names(self, cls):
+        """Return the indexed class names matched by a class filter"""
+        if isinstance(cls, str):
+            return [cls]
+        return [name for name, kind in self.__types.items()
+                if issubclass(kind, cls)]
+
+    def __index(self, key, obj):
+        """Record key in the class and foreign key indexes"""
+        name = obj.__class__.__name__
+        self.__by_class.setdefault(name, {})[key] = obj
+        self.__types[name] = obj.__class__
+        attributes = self.__foreign_keys.get(name)
+        if attributes:
+            self.__index_fks(key, name, {
+                attribute: getattr(obj, attribute, None)
+                for attribute in attributes}, obj)
+        attributes = self.__members.get(name)
+        if attributes:
+            self.__index_members(key, name, {
+                attribute: getattr(obj, attribute, None)
+                for attribute in attributes})
+        attributes = self.__points.get(name)
+        if attributes:
+            # a Place without coordinates is not at (0, 0)
+            self.__index_point(key, name, *[
+                _own_value(obj, attribute) for attribute in attributes])
+        self.__mark_text(key, obj)
+        for index_id, index in self.__ordered.items():
+            if index_id[0] == name:
+                self.__place(index_id, index, key, obj)
+
+    @staticmethod
+    def __place(index_id, index, key, obj):
+        """Move key to its sorted position in an ordered index"""
+        group = tuple(getattr(obj, field, None) for field in index_id[2])
+        entry = (_sort_key(getattr(obj, index_id[1], None)), key)
+        old = index[1].get(key)
+        if old == (group, entry):
+            return
+        if old is not None:
+            FileStorage.__unplace(index, key)
+        bisect.insort(index[0].setdefault(group, []), entry)
+        index[1][key] = (group, entry)
+
+    @staticmethod
+    def __unplace(index, key):
+        """Remove key from an ordered index"""
+        old = index[1].pop(key, None)
+        if old is not None:
+            entries = index[0][old[0]]
+            del entries[bisect.bisect_left(entries, old[1])]
+            if not entries:
+                del index[0][old[0]]
+
+    def __index_fks(self, key, name, values, obj=None):
+        """Record key under its foreign key values; obj None if unbuilt"""
+        indexed = self.__fk_values.setdefault(key, {})
+        for attribute, value in values.items():
+            buckets = self.__by_fk.setdefault((name, attribute), {})
+            if attribute in indexed and indexed[attribute] != value:
+                self.__drop_fk(buckets, indexed[attribute], key)
+            buckets.setdefault(value, {})[key] = obj
+            indexed[attribute] = value
+
+    def __index_members(self, key, name, values):
+        """Record key under every member of its list attributes"""
+        indexed = self.__member_values.setdefault(key, {})
+        for attribute, members in values.items():
+            members = tuple(members) if isinstance(
+                members, (list, tuple, set)) else ()
+            old = indexed.get(attribute, ())
+            if members == old:
+                continue
+            buckets = self.__by_member.setdefault((name, attribute), {})
+            self.__drop_members(buckets, old, key)
+            for member in members:
+                buckets.setdefault(member, set()).add(key)
+            indexed[attribute] = members
+
+    @staticmethod
+    def __drop_members(buckets, members, key):
+        """Remove key from the inverted index buckets of members"""
+        for member in members:
+            bucket = buckets.get(member)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del buckets[member]
+
+    def __index_point(self, key, name, latitude, longitude):
+        """Record key in the grid cell of its coordinates"""
+        point = geo.coordinates(latitude, longitude)
+        old = self.__grid_cells.get(key)
+        if old is not None:
+            if old[1] == point:
+                return
+            self.__drop_point(name, key)
+        if point is None:
+            return
+        cell = (math.floor(point[0] / self.__cell_size),
+                math.floor(point[1] / self.__cell_size))
+        self.__grid.setdefault(name, {}).setdefault(cell, {})[key] = point
+        self.__grid_cells[key] = (cell, point)
+
+    def __drop_point(self, name, key):
+        """Remove key from the grid index"""
+        old = self.__grid_cells.pop(key, None)
+        if old is not None:
+            cells = self.__grid[name]
+            del cells[old[0]][key]
+            if not cells[old[0]]:
+                del cells[old[0]]
+
+    def __unindex(self, key):
+        """Drop key from the class and foreign key indexes"""
+        name = key.partition('.')[0]
+        bucket = self.__by_class.get(name)
+        if bucket is not None:
+            bucket.pop(key, None)
+        for attribute, value in self.__fk_values.pop(key, {}).items():
+            self.__drop_fk(self.__by_fk[(name, attribute)], value, key)
+        for attribute, members in self.__member_values.pop(key, {}).items():
+            self.__drop_members(self.__by_member[(name, attribute)],
+                                members, key)
+        self.__drop_point(name, key)
+        self.__mark_text(key, None)
+        for index_id, index in self.__ordered.items():
+            if index_id[0] == name:
+                self.__unplace(index, key)
+
+    @staticmethod
+    def __drop_fk(buckets, value, key):
+        """Remove key from the reverse index bucket of value"""
+        bucket = buckets.get(value)
+        if bucket is not None:
+            bucket.pop(key, None)
+            if not bucket:
+                del buckets[value]
+
+    def __check_index(self):
+        """Rebuild the indexes if __objects was changed directly
+
+        Sizes are always compared; after all() has handed out __objects,
+        every entry is also checked against the class index once, which
+        catches objects replaced under the same key.
+        """
+        indexed = sum(len(keys) for keys in self.__by_class.values())
+        stale = indexed != len(self.__objects)
+        if not stale and FileStorage.__exposed:
+            by_class = self.__by_class
+            stale = any(
+                by_class.get(obj.__class__.__name__, {}).get(key) is not obj
+                for key, obj in self.__objects.items())
+        FileStorage.__exposed = False
+        if stale:
+            self.__rebuild_index()
+
+    def __rebuild_index(self):
+        """Recompute every secondary index from __objects"""
+        self.__materialize_all()
+        self.__by_class.clear()
+        self.__by_fk.clear()
+        self.__fk_values.clear()
+        self.__by_member.clear()
+        self.__member_values.clear()
+        self.__grid.clear()
+        self.__grid_cells.clear()
+        self.__unindexed.clear()
+        FileStorage.__text = None
+        FileStorage.__text_size = 0
+        self.__text_stale.clear()
+        self.__text_changes.clear()
+        self.__ordered.clear()
+        for key, obj in self.__objects.items():
+            self.__index(key, obj)
+        for key in [key for key in self.__serialized
+                    if key not in self.__objects]:
+            del self.__serialized[key]
@@ -0,0 +1,49 @@
+#!/usr/bin/python3
+"""Great-circle helpers shared by the storage engines' places_near()
+
+Coordinates are degrees of latitude and longitude, distances are
+kilometres along a sphere of the Earth's mean radius.
+"""
+import math
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def coordinates(latitude, longitude):
+    """Return (latitude, longitude) as floats, or None if not a point"""
+    try:
+        latitude, longitude = float(latitude), float(longitude)
+    except (TypeError, ValueError):
+        return None
+    if not (-90.0 <= latitude <= 90.0 and -180.0 <= longitude <= 180.0):
+        return None
+    return latitude, longitude
+
+
+def distance_km(lat1, lon1, lat2, lon2):
+    """Haversine distance between two points"""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) *
+         math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bounding_box(latitude, longitude, radius_km):
+    """Return (south, north, west, east) enclosing a circle
+
+    west is greater than east when the box crosses the antimeridian, and
+    the box spans every longitude when the circle reaches a pole.
+    """
+    angle = radius_km / EARTH_RADIUS_KM
+    delta = math.degrees(angle)
+    south, north = latitude - delta, latitude + delta
+    if south <= -90.0 or north >= 90.0:
+        return max(south, -90.0), min(north, 90.0), -180.0, 180.0
+    spread = math.degrees(math.asin(
+        math.sin(angle) / math.cos(math.radians(latitude))))
+    west, east = longitude - spread, longitude + spread
+    if west < -180.0:
+        west += 360.0
+    if east > 180.0:
+        east -= 360.0
+    return south, north, west, east
@@ -0,0 +1,263 @@
+#!/usr/bin/python3
+"""Inverted index with BM25 ranking for storage.search_text()
+
+Each indexed class is one TextIndex whose documents are the values of
+the class's FIELDS joined together, keyed like FileStorage keys.
+dump() and load() save the indexes of every class as a JSON header line
+followed by little-endian arrays, then the lines appended by
+dump_changes(), each of which replaces the snapshot tag:
+
+    header   := {"snapshot": ..., "classes": {name: {"keys": [...],
+                 "vocabulary": [...], "sizes": [...]}}} "\n"
+    class    := lengths(u32[keys]) numbers(u32[postings])
+                frequencies(u16[postings])
+    changes  := {"snapshot": ..., "changes": {name: {key: text or
+                 null}}} "\n"
+"""
+from array import array
+from collections import Counter
+import heapq
+import json
+import math
+import re
+import sys
+
+# text attributes indexed per class name
+FIELDS = {
+    'Place': ('name', 'description'),
+    'Review': ('text',),
+    'State': ('name',),
+    'City': ('name',),
+    'Amenity': ('name',),
+}
+
+_word = re.compile(r'\w+')
+
+
+def tokenize(text):
+    """Return the lowercase words of text"""
+    return _word.findall(text.lower()) if isinstance(text, str) else []
+
+
+def document(name, values):
+    """Return the text indexed for an object of class name
+
+    values is the object, or the dict of a stored record.
+    """
+    if isinstance(values, dict):
+        parts = [values.get(field) for field in FIELDS[name]]
+    else:
+        parts = [getattr(values, field, None) for field in FIELDS[name]]
+    return ' '.join(part for part in parts if isinstance(part, str))
+
+
+class TextIndex:
+    """Term to document postings of one class, ranked with Okapi BM25
+
+    Documents are numbered in the order they are added; the numbers of
+    removed documents stay unused until the index is saved and loaded.
+    """
+    k1 = 1.2
+    b = 0.75
+
+    def __init__(self):
+        """Start an empty index"""
+        # document number -> key, None once removed
+        self.keys = []
+        # key -> document number
+        self.numbers = {}
+        # document number -> number of words
+        self.lengths = []
+        # term -> {document number: term frequency}
+        self.postings = {}
+        # document number -> distinct terms; None after load() until the
+        # first removal derives it from the postings
+        self.terms = {}
+        self.total = 0
+
+    def add(self, key, text):
+        """Index text as the document key, replacing any earlier one"""
+        self.remove(key)
+        words = tokenize(text)
+        counts = Counter(words)
+        number = self.numbers[key] = len(self.keys)
+        self.keys.append(key)
+        self.lengths.append(len(words))
+        self.total += len(words)
+        postings = self.postings
+        for term, count in counts.items():
+            posting = postings.get(term)
+            if posting is None:
+                posting = postings[term] = {}
+            posting[number] = count
+        if self.terms is not None:
+            self.terms[number] = list(counts)
+
+    def remove(self, key):
+        """Drop the document key if it is indexed"""
+        number = self.numbers.pop(key, None)
+        if number is None:
+            return
+        if self.terms is None:
+            self.terms = {}
+            for term, posting in self.postings.items():
+                for other in posting:
+                    self.terms.setdefault(other, []).append(term)
+        self.keys[number] = None
+        self.total -= self.lengths[number]
+        self.lengths[number] = 0
+        for term in self.terms.pop(number, ()):
+            posting = self.postings[term]
+            del posting[number]
+            if not posting:
+                del self.postings[term]
+
+    def search(self, query, limit=10):
+        """Return up to limit (score, key) pairs, best match first"""
+        count = len(self.numbers)
+        terms = []
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if posting:
+                terms.append((math.log(1 + (count - len(posting) + 0.5) /
+                                       (len(posting) + 0.5)), posting))
+        if not terms:
+            return []
+        k1, lengths = self.k1, self.lengths
+        base = k1 * (1 - self.b)
+        scale = k1 * self.b * count / self.total if self.total else 0.0
+        # a term adds at most idf * (k1 + 1) to a score; rarest terms go
+        # first, and once no unseen document can outscore the current
+        # top limit, later terms only update the documents already seen
+        terms.sort(key=lambda item: len(item[1]))
+        remaining = sum(idf for idf, _ in terms) * (k1 + 1)
+        scores = {}
+        for idf, posting in terms:
+            closed = limit is not None and len(scores) >= limit and \
+                heapq.nlargest(limit, scores.values())[-1] >= remaining
+            weight = idf * (k1 + 1)
+            remaining -= weight
+            if closed:
+                for number in scores:
+                    frequency = posting.get(number)
+                    if frequency:
+                        scores[number] += weight * frequency / (
+                            frequency + base + scale * lengths[number])
+                continue
+            get = scores.get
+            for number, frequency in posting.items():
+                scores[number] = get(number, 0.0) + weight * frequency / (
+                    frequency + base + scale * lengths[number])
+        ranked = ((score, number) for number, score in scores.items())
+        if limit is None:
+            ranked = sorted(ranked, reverse=True)
+        else:
+            ranked = heapq.nlargest(limit, ranked)
+        return [(score, self.keys[number]) for score, number in ranked]
+
+
+def dump(indexes, snapshot, f):
+    """Write indexes, a {class name: TextIndex}, to the binary file f
+
+    snapshot is stored as is for load() callers to compare.
+    """
+    header = {'snapshot': snapshot, 'classes': {}}
+    arrays = []
+    for name, index in indexes.items():
+        # renumber the live documents from 0
+        renumber = {}
+        keys = []
+        lengths = array('I')
+        for number, key in enumerate(index.keys):
+            if key is not None:
+                renumber[number] = len(keys)
+                keys.append(key)
+                lengths.append(index.lengths[number])
+        numbers, frequencies, sizes = array('I'), array('H'), []
+        for posting in index.postings.values():
+            sizes.append(len(posting))
+            numbers.extend(map(renumber.__getitem__, posting))
+            frequencies.extend(min(count, 0xffff)
+                               for count in posting.values())
+        header['classes'][name] = {'keys': keys,
+                                   'vocabulary': list(index.postings),
+                                   'sizes': sizes}
+        arrays += [lengths, numbers, frequencies]
+    f.write(json.dumps(header).encode('utf-8') + b'\n')
+    for values in arrays:
+        if sys.byteorder != 'little':
+            values.byteswap()
+        values.tofile(f)
+
+
+def dump_changes(changes, snapshot, f):
+    """Append changes to a file written by dump(), tagged with snapshot
+
+    changes maps class names to {key: text}, text None for removed
+    documents. Returns the number of bytes written.
+    """
+    line = json.dumps({'snapshot': snapshot, 'changes': changes})
+    line = line.encode('utf-8') + b'\n'
+    f.write(line)
+    return len(line)
+
+
+def load(f, snapshot=None):
+    """Read indexes written by dump() and dump_changes() from f
+
+    Returns None when the last saved snapshot differs from snapshot.
+    """
+    saved, indexes = load_base(f)
+    saved = load_changes(indexes, saved, f)
+    if snapshot is not None and saved != snapshot:
+        return None
+    return indexes
+
+
+def load_base(f):
+    """Read what dump() wrote to f as (snapshot, indexes)"""
+    header = json.loads(f.readline())
+    indexes = {}
+    for name, saved in header['classes'].items():
+        index = indexes[name] = TextIndex()
+        keys, sizes = saved['keys'], saved['sizes']
+        lengths, numbers, frequencies = array('I'), array('I'), array('H')
+        lengths.fromfile(f, len(keys))
+        numbers.fromfile(f, sum(sizes))
+        frequencies.fromfile(f, sum(sizes))
+        if sys.byteorder != 'little':
+            for values in (lengths, numbers, frequencies):
+                values.byteswap()
+        index.keys = keys
+        index.numbers = {key: number for number, key in enumerate(keys)}
+        index.lengths = lengths.tolist()
+        index.total = sum(index.lengths)
+        index.terms = None
+        numbers, frequencies = numbers.tolist(), frequencies.tolist()
+        start = 0
+        for term, size in zip(saved['vocabulary'], sizes):
+            index.postings[term] = dict(zip(numbers[start:start + size],
+                                            frequencies[start:start + size]))
+            start += size
+    return header['snapshot'], indexes
+
+
+def load_changes(indexes, saved, f):
+    """Apply the lines dump_changes() appended to f to indexes
+
+    Returns the snapshot of the last complete line, or saved if none;
+    a line cut short by a crash ends the changes.
+    """
+    for line in f:
+        if not line.endswith(b'\n'):
+            break
+        record = json.loads(line)
+        for name, texts in record['changes'].items():
+            index = indexes.setdefault(name, TextIndex())
+            for key, text in texts.items():
+                if text is None:
+                    index.remove(key)
+                else:
+                    index.add(key, text)
+        saved = record['snapshot']
+    return saved
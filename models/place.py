@@ -2,34 +2,43 @@
 """ Place Module for HBNB project """
 from models.base_model import BaseModel
 from models import storage_type
-from models.base_model import BaseModel, Base
-from sqlalchemy import Column, String, Integer, Float, ForeignKey, Table
+from models.base_model import BaseModel, Base, id_type
+from sqlalchemy import Column, String, Integer, Float, ForeignKey, Index
+from sqlalchemy import Table
 from sqlalchemy.orm import relationship
+from models.review import Review
+import models
 
 if storage_type == 'db':
     place_amenity = Table('place_amenity', Base.metadata,
-                          Column('place_id', String(60),
+                          Column('place_id', id_type(),
                                  ForeignKey('places.id', onupdate='CASCADE',
                                             ondelete='CASCADE'),
                                  primary_key=True),
-                          Column('amenity_id', String(60),
+                          Column('amenity_id', id_type(),
                                  ForeignKey('amenities.id', onupdate='CASCADE',
                                             ondelete='CASCADE'),
-                                 primary_key=True))
+                                 primary_key=True, index=True))
 
 
 class Place(BaseModel, Base):
     """ A place to stay """
     if storage_type == 'db':
         __tablename__ = 'places'
-        city_id = Column(String(60), ForeignKey('cities.id'), nullable=False)
-        user_id = Column(String(60), ForeignKey('users.id'), nullable=False)
+        # bounding box prefilter of places_near()
+        __table_args__ = (Index('ix_places_latitude_longitude',
+                                'latitude', 'longitude'),)
+        city_id = Column(id_type(), ForeignKey('cities.id'),
+                         nullable=False, index=True)
+        user_id = Column(id_type(), ForeignKey('users.id'),
+                         nullable=False, index=True)
         name = Column(String(128), nullable=False)
         description = Column(String(1024), nullable=True)
         number_rooms = Column(Integer, nullable=False, default=0)
         number_bathrooms = Column(Integer, nullable=False, default=0)
         max_guest = Column(Integer, nullable=False, default=0)
-        price_by_night = Column(Integer, nullable=False, default=0)
+        price_by_night = Column(Integer, nullable=False, default=0,
+                                index=True)
         latitude = Column(Float, nullable=True)
         longitude = Column(Float, nullable=True)
         amenities = relationship("Amenity", secondary="place_amenity",
@@ -49,3 +58,10 @@ class Place(BaseModel, Base):
         latitude = 0.0
         longitude = 0.0
         amenity_ids = []
+
+    if storage_type != 'db':
+        @property
+        def reviews(self):
+            """list of review instances related to the place"""
+            return list(models.storage.related(
+                Review, 'place_id', self.id).values())
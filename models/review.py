@@ -1,6 +1,6 @@
 #!/usr/bin/python3
 """ Review module for the HBNB project """
-from models.base_model import BaseModel, Base
+from models.base_model import BaseModel, Base, id_type
 from sqlalchemy import Column, String, ForeignKey
 from models import storage_type
 
@@ -9,8 +9,10 @@ class Review(BaseModel, Base):
     """ Review class to store review information """
     if storage_type == 'db':
         __tablename__ = 'reviews'
-        place_id = Column(String(60), ForeignKey('places.id'), nullable=False)
-        user_id = Column(String(60), ForeignKey('users.id'), nullable=False)
+        place_id = Column(id_type(), ForeignKey('places.id'),
+                          nullable=False, index=True)
+        user_id = Column(id_type(), ForeignKey('users.id'),
+                         nullable=False, index=True)
         text = Column(String(1024), nullable=False)
     else:
         place_id = ""
@@ -12,8 +12,9 @@ class State(BaseModel, Base):
     """ State class """
     if storage_type == "db":
         __tablename__ = 'states'
-        name = Column(String(128), nullable=False)
-        cities = relationship("City", backref="state")
+        name = Column(String(128), nullable=False, index=True)
+        cities = relationship("City", backref="state",
+                              order_by="City.name")
     else:
         name = ""
 
@@ -24,12 +25,10 @@ class State(BaseModel, Base):
     if storage_type != "db":
         @property
         def cities(self):
-            """list of city instances related to the state"""
+            """list of city instances related to the state, by name"""
             try:
-                all_cities = models.storage.all(models.City)
-                city_list = [city for city in all_cities.values()
-                             if city.state_id == self.id]
-                return city_list
+                return models.storage.ordered(City, 'name',
+                                              state_id=self.id)
             except Exception as e:
                 print(f"Error getting cities for state: {e}")
                 return None
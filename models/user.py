@@ -13,7 +13,7 @@ class User(BaseModel, Base):
     """This class defines a user by various attributes"""
     if storage_type == 'db':
         __tablename__ = 'users'
-        email = Column(String(128), nullable=False)
+        email = Column(String(128), nullable=False, unique=True)
         password = Column(String(128), nullable=False)
         first_name = Column(String(128), nullable=True)
         last_name = Column(String(128), nullable=True)
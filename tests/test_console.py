@@ -1,13 +1,17 @@
 #!/usr/bin/python3
 
+import os
+import tempfile
 import unittest
 import pep8
+import uuid
 from unittest.mock import patch
 from io import StringIO
-from models import storage
+from models import storage, storage_type
 from console import HBNBCommand
 from models.base_model import BaseModel
 from models.user import User
+from models.engine.file_storage import FileStorage
 
 
 class TestHBNBCommandConsole(unittest.TestCase):
@@ -20,6 +24,13 @@ class TestHBNBCommandConsole(unittest.TestCase):
     def tearDown(self):
         """Test teardown."""
         del self.hbnb_command
+        if storage_type != 'db':
+            type(storage)._FileStorage__text = None
+        for path in ('file.json', 'file.json.log', 'file.json.text'):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
 
     def test_create(self):
         """Test do_create() method."""
@@ -29,6 +40,162 @@ class TestHBNBCommandConsole(unittest.TestCase):
             self.assertTrue(output != "")
             self.assertIsInstance(storage.all()["User." + output], User)
 
+    def test_batch(self):
+        """Test do_begin() and do_commit() methods."""
+        with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+            self.hbnb_command.onecmd("begin")
+            self.hbnb_command.onecmd("create User")
+            output = mock_stdout.getvalue().strip()
+            with patch.object(FileStorage, 'compact') as compact:
+                self.hbnb_command.onecmd("create User")
+                self.assertFalse(compact.called)
+                self.hbnb_command.onecmd("commit")
+                self.assertTrue(compact.called)
+            self.assertIn("User." + output, storage.all())
+
+    def test_all(self):
+        """Test do_all() prints the same list as str() of the objects."""
+        with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+            self.hbnb_command.onecmd("create User")
+            self.hbnb_command.onecmd("create User")
+            mock_stdout.seek(0)
+            mock_stdout.truncate()
+            self.hbnb_command.onecmd("all User")
+            expected = [str(v) for v in storage.all(User).values()]
+            self.assertEqual(mock_stdout.getvalue(), str(expected) + "\n")
+
+    def test_aggregate(self):
+        """Test do_aggregate() prints one line of statistics per group."""
+        with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+            self.hbnb_command.onecmd(
+                'create Place city_id="aggregate" price_by_night=80')
+            self.hbnb_command.onecmd(
+                'create Place city_id="aggregate" price_by_night=120')
+            mock_stdout.seek(0)
+            mock_stdout.truncate()
+            self.hbnb_command.onecmd(
+                "aggregate Place price_by_night by=city_id percentiles=50")
+            lines = [line for line in mock_stdout.getvalue().splitlines()
+                     if line.startswith("aggregate ")]
+            self.assertEqual(len(lines), 1)
+            self.assertIn("'mean': 100.0", lines[0])
+            self.assertIn("'p50': 100.0", lines[0])
+            mock_stdout.seek(0)
+            mock_stdout.truncate()
+            self.hbnb_command.onecmd("aggregate Place percentiles=101")
+            self.assertEqual(mock_stdout.getvalue(),
+                             "** invalid percentiles **\n")
+            mock_stdout.seek(0)
+            mock_stdout.truncate()
+            self.hbnb_command.onecmd("aggregate Place nope")
+            self.assertEqual(mock_stdout.getvalue(),
+                             "** attribute doesn't exist **\n")
+
+    def test_search(self):
+        """Test do_search() lists the best matches first."""
+        word = "w" + uuid.uuid4().hex
+        with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+            self.hbnb_command.onecmd(
+                'create Place description="{0}_island_{0}"'.format(word))
+            self.hbnb_command.onecmd(
+                'create Place description="{}_lighthouse"'.format(word))
+            best, other = mock_stdout.getvalue().split()
+            mock_stdout.seek(0)
+            mock_stdout.truncate()
+            self.hbnb_command.onecmd("search Place {}".format(word))
+            output = mock_stdout.getvalue()
+            self.assertLess(output.index(best), output.index(other))
+            mock_stdout.seek(0)
+            mock_stdout.truncate()
+            self.hbnb_command.onecmd("search Place {} limit=1".format(word))
+            self.assertNotIn(other, mock_stdout.getvalue())
+            mock_stdout.seek(0)
+            mock_stdout.truncate()
+            self.hbnb_command.onecmd("search Place")
+            self.assertEqual(mock_stdout.getvalue(), "** query missing **\n")
+
+    def test_near(self):
+        """Test do_near() lists places nearest first."""
+        with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+            self.hbnb_command.onecmd(
+                "create Place latitude=48.9 longitude=2.4")
+            self.hbnb_command.onecmd(
+                "create Place latitude=48.86 longitude=2.35")
+            far, near = mock_stdout.getvalue().split()
+            mock_stdout.seek(0)
+            mock_stdout.truncate()
+            self.hbnb_command.onecmd("near 48.8566 2.3522 10")
+            output = mock_stdout.getvalue()
+            self.assertIn("0.411 km [Place] ({})".format(near), output)
+            self.assertLess(output.index(near), output.index(far))
+            mock_stdout.seek(0)
+            mock_stdout.truncate()
+            self.hbnb_command.onecmd("near 91 0 10")
+            self.assertEqual(mock_stdout.getvalue(),
+                             "** invalid point **\n")
+
+    def test_near_negative(self):
+        """Test do_near() with negative coordinates given to create."""
+        with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+            self.hbnb_command.onecmd(
+                "create Place latitude=-33.86 longitude=-70.65")
+            place_id = mock_stdout.getvalue().strip()
+            mock_stdout.seek(0)
+            mock_stdout.truncate()
+            self.hbnb_command.onecmd("near -33.86 -70.65 1")
+            self.assertEqual(mock_stdout.getvalue().split()[:4],
+                             ["0.000", "km", "[Place]",
+                              "({})".format(place_id)])
+
+    def test_import(self):
+        """Test do_import() applies commands and records in batches."""
+        state_id = str(uuid.uuid4())
+        lines = ['# states', 'create State name="California"',
+                 '{"__class__": "State", "id": "%s", "name": "Nevada"}'
+                 % state_id,
+                 'create City state_id="%s" name="Reno"' % state_id,
+                 '{"__class__": "Nope"}', '{"__class__": "City", "id": 1}']
+        with tempfile.NamedTemporaryFile('w', suffix='.txt',
+                                         delete=False) as f:
+            f.write('\n'.join(lines) + '\n')
+        self.addCleanup(os.remove, f.name)
+        with patch('sys.stdout', new_callable=StringIO) as mock_stdout, \
+                patch.object(FileStorage, 'compact') as compact:
+            self.hbnb_command.onecmd("import {} batch=3".format(f.name))
+            self.assertEqual(compact.call_count, 2)
+        output = mock_stdout.getvalue().splitlines()
+        self.assertEqual(output[2:4], ["** class doesn't exist **",
+                                       "** invalid record **"])
+        self.assertTrue(output[4].startswith("6 lines in "))
+        self.assertEqual(storage.get('State', state_id).name, "Nevada")
+        self.assertEqual(storage.get('City', output[1]).state_id, state_id)
+        self.assertIn('State.' + output[0], storage.all())
+        with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+            self.hbnb_command.onecmd("import")
+            self.hbnb_command.onecmd("import " + f.name + ".missing")
+            self.assertEqual(mock_stdout.getvalue(),
+                             "** file name missing **\n"
+                             "** file doesn't exist **\n")
+
+
+@unittest.skipIf(storage_type != 'db', "not testing db storage")
+class TestHBNBCommandDBStorage(unittest.TestCase):
+    """TestHBNBCommandDBStorage class."""
+
+    def test_convert(self):
+        """Test do_convert() reports that it needs file storage."""
+        with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+            HBNBCommand().onecmd("convert binary")
+            self.assertEqual(mock_stdout.getvalue(),
+                             "** convert needs file storage **\n")
+
+    def test_show_not_a_uuid(self):
+        """Test do_show() with an id that is not a UUID."""
+        with patch('sys.stdout', new_callable=StringIO) as mock_stdout:
+            HBNBCommand().onecmd("show State nope")
+            self.assertEqual(mock_stdout.getvalue(),
+                             "** no instance found **\n")
+
 
 class TestConsoleCodeStyle(unittest.TestCase):
     """TestConsoleCodeStyle class."""
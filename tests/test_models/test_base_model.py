@@ -110,6 +110,17 @@ class test_basemodel(unittest.TestCase):
         new = BaseModel(**copy)
         self.assertFalse(new is i)
 
+    def test_from_storage(self):
+        """Test rebuilding an instance from its stored dictionary."""
+        i = self.value()
+        copy = i.to_dict()
+        new = type(i).from_storage(copy)
+        self.assertFalse(new is i)
+        self.assertIs(type(new), type(i))
+        self.assertIs(type(new.updated_at), datetime)
+        self.assertEqual(new.to_dict(), copy)
+        self.assertEqual(str(new), str(i))
+
     def test_kwargs_int(self):
         """Test instance creation with invalid kwargs (int)."""
         i = self.value()
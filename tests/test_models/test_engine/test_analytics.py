@@ -0,0 +1,52 @@
+#!/usr/bin/python3
+""" Module for testing the group-by aggregates"""
+import unittest
+from unittest import mock
+from models.engine import analytics
+
+
+class test_analytics(unittest.TestCase):
+    """ Class to test group_stats() with and without NumPy """
+    keys = ['a', 'b', 'a', 'a', None, 'a']
+    values = [10, 7, 40, 20, 1.5, 30]
+
+    def check(self):
+        """ Aggregate the sample columns and check every statistic """
+        result = analytics.group_stats(self.keys, self.values, (0, 50, 90))
+        self.assertEqual(set(result), {'a', 'b', None})
+        self.assertEqual(result['a']['count'], 4)
+        for name, expected in (('sum', 100), ('mean', 25), ('min', 10),
+                               ('max', 40), ('p0', 10), ('p50', 25),
+                               ('p90', 37)):
+            self.assertAlmostEqual(result['a'][name], expected)
+        self.assertEqual(result['b'], {'count': 1, 'sum': 7, 'mean': 7,
+                                       'min': 7, 'max': 7, 'p0': 7,
+                                       'p50': 7, 'p90': 7})
+        self.assertEqual(analytics.group_stats(self.keys),
+                         {'a': {'count': 4}, 'b': {'count': 1},
+                          None: {'count': 1}})
+        self.assertEqual(analytics.group_stats([], []), {})
+
+    def test_python(self):
+        """ Plain Python reductions when NumPy is missing """
+        with mock.patch.object(analytics, 'numpy', None):
+            self.check()
+
+    @unittest.skipIf(analytics.numpy is None, "NumPy is not installed")
+    def test_numpy(self):
+        """ Vectorized reductions match the plain Python ones """
+        self.check()
+
+    def test_extract(self):
+        """ Non-numeric values are skipped and parents map the groups """
+        class Obj:
+            def __init__(self, city_id, price):
+                self.city_id = city_id
+                self.price = price
+        objects = [Obj('c1', 10), Obj('c2', '12'), Obj('c2', None),
+                   Obj('c3', 5), Obj('c1', True), Obj('c1', float('nan'))]
+        self.assertEqual(analytics.extract(objects, 'city_id', 'price'),
+                         (['c1', 'c3'], [0, 1], [10, 5]))
+        self.assertEqual(analytics.extract(
+            objects[:3], 'city_id', parents={'c1': 's1'}),
+            (['s1', None], [0, 1, 1], None))
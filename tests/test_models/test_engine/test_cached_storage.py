@@ -0,0 +1,162 @@
+#!/usr/bin/python3
+""" Module for testing the read-through storage cache"""
+import os
+import unittest
+from unittest import mock
+from models import storage_type
+from models.engine import cached_storage
+from models.engine.cached_storage import CachedStorage, cache_options
+from sqlalchemy import create_engine
+
+
+class test_CachedStorage(unittest.TestCase):
+    """ Class to test CachedStorage against a mock storage engine """
+
+    def setUp(self):
+        """ Wrap a mock storage holding two states and one amenity """
+        self.backend = mock.Mock()
+        self.backend.all.side_effect = lambda cls=None, load=None: {
+            'State': {'State.1': 's1', 'State.2': 's2'},
+            'Amenity': {'Amenity.1': 'a1'}}.get(cls, {})
+        self.backend.get.side_effect = lambda cls, id: cls + '.' + id
+        self.backend.stats.return_value = {'checked_out': 0}
+        self.cache = CachedStorage(self.backend, ttl={'Amenity': 5},
+                                   default_ttl=60, max_objects=3)
+
+    def test_hits_and_misses(self):
+        """ Repeated reads are served from the cache """
+        self.assertEqual(len(self.cache.all('State')), 2)
+        self.cache.all('State')
+        self.assertEqual(self.backend.all.call_count, 1)
+        self.assertEqual(self.cache.get('State', '1'), 'State.1')
+        self.cache.get('State', '1')
+        self.assertEqual(self.backend.get.call_count, 1)
+        stats = self.cache.stats()
+        self.assertEqual(stats['cache_hits'], 2)
+        self.assertEqual(stats['cache_misses'], 2)
+        self.assertEqual(stats['checked_out'], 0)
+
+    def test_results_are_copies(self):
+        """ Callers cannot change cached all() results """
+        self.cache.all('State').clear()
+        self.assertEqual(len(self.cache.all('State')), 2)
+
+    def test_ttl(self):
+        """ Entries expire after their class time to live """
+        with mock.patch.object(cached_storage.time, 'monotonic',
+                               return_value=100):
+            self.cache.all('Amenity')
+            self.cache.all('State')
+        with mock.patch.object(cached_storage.time, 'monotonic',
+                               return_value=110):
+            self.cache.all('Amenity')
+            self.cache.all('State')
+        self.assertEqual(self.backend.all.call_count, 3)
+
+    def test_lru_eviction(self):
+        """ The least recently used entries go once the cap is exceeded """
+        self.cache.all('State')
+        self.cache.get('State', '1')
+        self.cache.all('State')
+        self.cache.get('State', '2')
+        self.assertEqual(self.cache.evictions, 1)
+        self.cache.all('State')
+        self.cache.get('State', '1')
+        self.assertEqual(self.backend.all.call_count, 1)
+        self.assertEqual(self.backend.get.call_count, 3)
+        self.assertLessEqual(self.cache.stats()['cache_objects'], 3)
+
+    def test_writes_invalidate(self):
+        """ new(), delete(), save() and batches drop every result """
+        state = type('State', (), {})()
+        self.cache = CachedStorage(self.backend)
+        self.cache.all('State')
+        self.cache.all('Amenity')
+        self.cache.count()
+        self.cache.new(state)
+        self.backend.new.assert_called_once_with(state)
+        self.cache.all('State')
+        self.cache.all('Amenity')
+        self.assertEqual(self.backend.all.call_count, 4)
+        self.cache.count()
+        self.assertEqual(self.backend.count.call_count, 2)
+        self.cache.delete(state)
+        self.cache.all('Amenity')
+        self.assertEqual(self.backend.all.call_count, 5)
+        self.cache.save()
+        self.backend.save.assert_called_once_with()
+        self.cache.all('Amenity')
+        self.assertEqual(self.backend.all.call_count, 6)
+        with self.assertRaises(KeyError):
+            with self.cache.batch():
+                self.cache.all('Amenity')
+                raise KeyError
+        self.backend.rollback.assert_called_once_with()
+        self.cache.all('Amenity')
+        self.assertEqual(self.backend.all.call_count, 7)
+        with self.cache.transaction():
+            self.cache.all('Amenity')
+        self.backend.commit.assert_called_once_with()
+        self.cache.all('Amenity')
+        self.assertEqual(self.backend.all.call_count, 8)
+
+    def test_delegation(self):
+        """ Other methods go straight to the wrapped storage """
+        self.cache.close()
+        self.backend.close.assert_called_once_with()
+
+    def test_cache_options(self):
+        """ HBNB_CACHE_TTL sets default and per-class lifetimes """
+        env = {'HBNB_CACHE_TTL': '30,State=600', 'HBNB_CACHE_MAX_OBJECTS': '7'}
+        with mock.patch.dict(os.environ, env):
+            options = cache_options()
+        self.assertEqual(options, {'ttl': {'State': 600.0},
+                                   'default_ttl': 30.0, 'max_objects': 7})
+
+
+@unittest.skipIf(storage_type != 'db', "not testing db storage")
+class test_CachedDBStorage(unittest.TestCase):
+    """ Class to test CachedStorage in front of an sqlite stand-in """
+
+    def setUp(self):
+        """ Cache a DBStorage on an in-memory sqlite database """
+        from models.engine import db_storage
+        self.engine = create_engine('sqlite://')
+        with mock.patch.object(db_storage, 'create_engine',
+                               return_value=self.engine):
+            self.storage = db_storage.DBStorage()
+        self.storage.reload()
+        self.cache = CachedStorage(self.storage)
+
+    def tearDown(self):
+        """ Close the session and drop the stand-in database """
+        self.storage.close()
+        self.engine.dispose()
+
+    def test_related_class_saved(self):
+        """ A saved city shows in the cities of a cached state """
+        from models.state import State
+        from models.city import City
+        state = State(name="Nevada")
+        self.cache.new(state)
+        self.cache.save()
+        self.cache.close()
+        self.assertEqual(self.cache.get(State, state.id).cities, [])
+        self.cache.close()
+        self.cache.new(City(name="Reno", state_id=state.id))
+        self.cache.save()
+        self.cache.close()
+        self.assertEqual([city.name for city in
+                          self.cache.get(State, state.id).cities], ["Reno"])
+
+    def test_batch_rollback(self):
+        """ Objects of a rolled back batch are not served afterwards """
+        from models.state import State
+        with self.assertRaises(KeyError):
+            with self.cache.batch():
+                self.cache.new(State(name="Nevada"))
+                self.cache.save()
+                self.assertEqual(len(self.cache.all(State)), 1)
+                raise KeyError
+        self.assertEqual(self.cache.all(State), {})
+        self.assertEqual(self.cache.count(State), 0)
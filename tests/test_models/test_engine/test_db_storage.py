@@ -0,0 +1,509 @@
+#!/usr/bin/python3
+""" Module for testing db storage"""
+import os
+import tempfile
+import unittest
+from unittest import mock
+from models import storage_type
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.exc import TimeoutError
+
+
+@unittest.skipIf(storage_type != 'db', "not testing db storage")
+class test_DBStorage(unittest.TestCase):
+    """ Class to test the db storage method on an sqlite stand-in """
+
+    def setUp(self):
+        """ Open a DBStorage on an in-memory sqlite database """
+        from models.engine import db_storage
+        self.engine = create_engine('sqlite://')
+        with mock.patch.object(db_storage, 'create_engine',
+                               return_value=self.engine):
+            self.storage = db_storage.DBStorage()
+        self.storage.reload()
+        self.selects = []
+        event.listen(self.engine, 'before_cursor_execute', self.record)
+
+    def tearDown(self):
+        """ Close the session and drop the stand-in database """
+        event.remove(self.engine, 'before_cursor_execute', self.record)
+        self.storage.close()
+        self.engine.dispose()
+
+    def record(self, conn, cursor, statement, *args):
+        """ Count the SELECT statements sent to the database """
+        if statement.lstrip().upper().startswith('SELECT'):
+            self.selects.append(statement)
+
+    def populate(self, states):
+        """ Store states with two cities each, then empty the session """
+        from models.state import State
+        from models.city import City
+        for i in range(states):
+            state = State(name="State {}".format(i))
+            self.storage.new(state)
+            for j in range(2):
+                self.storage.new(City(name="City {}".format(j),
+                                      state_id=state.id))
+        self.storage.save()
+        self.storage.close()
+
+    def cities_selects(self, states):
+        """ SELECTs issued to list every state with its cities """
+        self.populate(states - self.storage.count("State"))
+        del self.selects[:]
+        loaded = self.storage.all("State", load=["cities"])
+        self.assertEqual(len(loaded), states)
+        for state in loaded.values():
+            self.assertEqual(len(state.cities), 2)
+        self.storage.close()
+        return len(self.selects)
+
+    def test_all_load_constant_queries(self):
+        """ Eager loading does not issue one query per state """
+        few = self.cities_selects(2)
+        self.assertEqual(few, 2)
+        self.assertEqual(self.cities_selects(20), few)
+
+    def test_bulk_new(self):
+        """ bulk_new() inserts parents first with one statement a chunk """
+        from models.state import State
+        from models.city import City
+        states = [State(name=str(i)) for i in range(5)]
+        objects = states + [City(name=str(i), state_id=states[i].id)
+                            for i in range(5)]
+        inserts = []
+        event.listen(self.engine, 'before_cursor_execute',
+                     lambda conn, cursor, statement, *args:
+                     inserts.append(statement)
+                     if statement.startswith('INSERT') else None)
+        self.assertEqual(self.storage.bulk_new(objects, chunk_size=4), 10)
+        # [4 states] [1 state, 3 cities] [2 cities]
+        self.assertEqual(len(inserts), 4)
+        self.storage.close()
+        self.assertEqual(self.storage.count(State), 5)
+        self.assertEqual(len(self.storage.get(State, states[0].id).cities),
+                         1)
+
+    def test_ordered(self):
+        """ ordered() sorts and filters in the database """
+        from models.state import State
+        from models.city import City
+        state = State(name="Nevada")
+        self.storage.new(state)
+        for name in ("Reno", "Elko", "Ely"):
+            self.storage.new(City(name=name, state_id=state.id))
+        self.storage.new(State(name="Arizona"))
+        self.storage.save()
+        self.storage.close()
+        self.assertEqual([s.name for s in self.storage.ordered(State)],
+                         ["Arizona", "Nevada"])
+        self.assertEqual([c.name for c in self.storage.ordered(
+            City, 'name', state_id=state.id)], ["Elko", "Ely", "Reno"])
+        self.assertEqual([c.name for c in self.storage.get(
+            State, state.id).cities], ["Elko", "Ely", "Reno"])
+
+    def test_search_places(self):
+        """ search_places() filters in a single SELECT """
+        from models.state import State
+        from models.city import City
+        from models.place import Place
+        from models.user import User
+        from models.amenity import Amenity
+        user = User(email="a@b.c", password="pwd")
+        state = State(name="Nevada")
+        reno = City(name="Reno", state_id=state.id)
+        texas = State(name="Texas")
+        other = City(name="Austin", state_id=texas.id)
+        wifi = Amenity(name="Wifi")
+        pool = Amenity(name="Pool")
+        cheap = Place(name="Cheap", city_id=reno.id, user_id=user.id,
+                      price_by_night=50, max_guest=2)
+        large = Place(name="Large", city_id=reno.id, user_id=user.id,
+                      price_by_night=300, max_guest=8)
+        away = Place(name="Away", city_id=other.id, user_id=user.id,
+                     price_by_night=80, max_guest=4)
+        cheap.amenities.extend([wifi, pool])
+        large.amenities.append(wifi)
+        away.amenities.extend([wifi, pool])
+        for obj in (user, state, texas, reno, other, wifi, pool,
+                    cheap, large, away):
+            self.storage.new(obj)
+        self.storage.save()
+        self.storage.close()
+
+        def names(**filters):
+            del self.selects[:]
+            found = self.storage.search_places(**filters)
+            self.assertEqual(len(self.selects), 1)
+            return sorted(place.name for place in found.values())
+        self.assertEqual(names(states=[state.id]), ["Cheap", "Large"])
+        self.assertEqual(names(states=[state.id], cities=[other.id]),
+                         ["Away", "Cheap", "Large"])
+        self.assertEqual(names(amenities=[wifi.id, pool.id]),
+                         ["Away", "Cheap"])
+        self.assertEqual(names(states=[state.id], amenities=[pool.id],
+                               price_range=(None, 100), max_guest=2),
+                         ["Cheap"])
+
+    def test_places_near(self):
+        """ places_near() prefilters on the latitude/longitude index """
+        from models.state import State
+        from models.city import City
+        from models.place import Place
+        from models.user import User
+        user = User(email="a@b.c", password="pwd")
+        state = State(name="France")
+        paris = City(name="Paris", state_id=state.id)
+        self.storage.new(user)
+        self.storage.new(state)
+        self.storage.new(paris)
+        for name, latitude, longitude in (("Louvre", 48.861, 2.336),
+                                          ("Bastille", 48.853, 2.369),
+                                          ("Lyon", 45.764, 4.836),
+                                          ("Fiji", -17.8, 179.99),
+                                          ("Samoa", -17.8, -179.98)):
+            self.storage.new(Place(name=name, city_id=paris.id,
+                                   user_id=user.id, latitude=latitude,
+                                   longitude=longitude))
+        self.storage.new(Place(name="Unset", city_id=paris.id,
+                               user_id=user.id))
+        self.storage.save()
+        self.storage.close()
+
+        def names(*args, **kwargs):
+            return [place.name for place in
+                    self.storage.places_near(*args, **kwargs)]
+        self.assertEqual(names(48.8566, 2.3522, 5), ["Louvre", "Bastille"])
+        self.assertEqual(names(48.8566, 2.3522, 500, limit=2),
+                         ["Louvre", "Bastille"])
+        self.assertEqual(names(-17.8, 180, 5), ["Fiji", "Samoa"])
+        self.assertEqual(names(0, 0, 1), [])
+        self.assertEqual(names(0.01, 0.01, 5), [])
+        self.assertEqual(len(self.storage.places_near(0, 0, 20100)), 5)
+        with self.engine.connect() as connection:
+            plan = connection.execute(text(
+                "EXPLAIN QUERY PLAN SELECT id FROM places "
+                "WHERE latitude BETWEEN 48 AND 49")).fetchall()
+        self.assertIn('ix_places_latitude_longitude', str(plan))
+
+    def test_aggregate(self):
+        """ aggregate() runs a single GROUP BY, joining for state_id """
+        from models.state import State
+        from models.city import City
+        from models.place import Place
+        from models.user import User
+        user = User(email="a@b.c", password="pwd")
+        state = State(name="Nevada")
+        reno = City(name="Reno", state_id=state.id)
+        elko = City(name="Elko", state_id=state.id)
+        for obj in (user, state, reno, elko):
+            self.storage.new(obj)
+        for city, price, guests in ((reno, 100, 2), (reno, 300, 4),
+                                    (elko, 50, 6)):
+            self.storage.new(Place(name="Loft", city_id=city.id,
+                                   user_id=user.id, price_by_night=price,
+                                   max_guest=guests))
+        self.storage.save()
+        self.storage.close()
+        del self.selects[:]
+        by_city = self.storage.aggregate(Place, 'price_by_night', 'city_id')
+        self.assertEqual(len(self.selects), 1)
+        self.assertIn('GROUP BY', self.selects[0])
+        self.assertEqual(by_city[reno.id], {'count': 2, 'sum': 400,
+                                            'mean': 200, 'min': 100,
+                                            'max': 300})
+        self.assertEqual(self.storage.aggregate(
+            'Place', 'max_guest', 'state_id')[state.id]['sum'], 12)
+        self.assertEqual(self.storage.aggregate(
+            Place, 'price_by_night', percentiles=[50]
+        )[None]['p50'], 100)
+        self.assertEqual(self.storage.aggregate(City, group_by='state_id'),
+                         {state.id: {'count': 2}})
+        with self.assertRaises(AttributeError):
+            self.storage.aggregate(Place, 'nope')
+        with self.assertRaises(AttributeError):
+            self.storage.aggregate(Place, 'max_guest', 'nope')
+
+    def test_search_text(self):
+        """ search_text() ranks FTS5 matches kept in sync by triggers """
+        from models.state import State
+        from models.city import City
+        from models.place import Place
+        from models.user import User
+        user = User(email="a@b.c", password="pwd")
+        state = State(name="Nevada")
+        reno = City(name="Reno", state_id=state.id)
+        loft = Place(name="Loft", description="Sunny loft by the beach",
+                     city_id=reno.id, user_id=user.id)
+        house = Place(name="Beach house", description="Beach access",
+                      city_id=reno.id, user_id=user.id)
+        for obj in (user, state, reno, loft, house):
+            self.storage.new(obj)
+        self.storage.save()
+        self.storage.close()
+
+        def names(query, limit=10):
+            return [place.name for place in
+                    self.storage.search_text(Place, query, limit)]
+        self.assertTrue(self.storage._DBStorage__fts)
+        del self.selects[:]
+        self.assertEqual(names("beach"), ["Beach house", "Loft"])
+        self.assertIn('MATCH', self.selects[0])
+        self.assertEqual(names("beach", 1), ["Beach house"])
+        self.assertEqual(names('sunny "OR'), ["Loft"])
+        self.assertEqual(self.storage.search_text('City', "reno")[0].id,
+                         reno.id)
+        house = self.storage.get(Place, house.id)
+        house.description = "Sunny sunny garden"
+        self.storage.delete(self.storage.get(Place, loft.id))
+        self.storage.save()
+        self.storage.close()
+        self.assertEqual(names("sunny"), ["Beach house"])
+        self.storage._DBStorage__fts = False
+        self.assertEqual(names("garden beach"), ["Beach house"])
+        self.assertEqual(names("loft"), [])
+
+    def test_iter_all(self):
+        """ iter_all() streams the same objects as all() """
+        self.populate(3)
+        self.assertEqual(dict(self.storage.iter_all(batch_size=2)),
+                         self.storage.all())
+        self.assertEqual(len(dict(self.storage.iter_all("City"))), 6)
+
+    def test_all_without_load_is_lazy(self):
+        """ Without load, cities are queried state by state """
+        self.populate(3)
+        del self.selects[:]
+        for state in self.storage.all("State").values():
+            state.cities
+        self.assertEqual(len(self.selects), 4)
+
+
+@unittest.skipIf(storage_type != 'db', "not testing db storage")
+class test_DBStoragePool(unittest.TestCase):
+    """ Class to test the connection pool on an sqlite file stand-in """
+
+    env = {'HBNB_MYSQL_POOL_SIZE': '1', 'HBNB_MYSQL_MAX_OVERFLOW': '1',
+           'HBNB_MYSQL_POOL_TIMEOUT': '0.05',
+           'HBNB_MYSQL_POOL_PRE_PING': '0'}
+
+    def setUp(self):
+        """ Open a DBStorage whose engine gets the pool settings """
+        from models.engine import db_storage
+        self.workdir = tempfile.mkdtemp()
+        path = os.path.join(self.workdir, 'hbnb.db')
+        self.options = {}
+
+        def sqlite_engine(url, **options):
+            self.options = options
+            return create_engine('sqlite:///' + path, **options)
+        with mock.patch.dict(os.environ, self.env), \
+                mock.patch.object(db_storage, 'create_engine',
+                                  side_effect=sqlite_engine):
+            self.storage = db_storage.DBStorage()
+        self.storage.reload()
+        self.engine = self.storage._DBStorage__engine
+
+    def tearDown(self):
+        """ Dispose of the engine and remove the database file """
+        self.storage.close()
+        self.engine.dispose()
+        os.remove(os.path.join(self.workdir, 'hbnb.db'))
+        os.rmdir(self.workdir)
+
+    def test_options(self):
+        """ Pool settings come from the environment """
+        self.assertEqual(self.options['pool_size'], 1)
+        self.assertEqual(self.options['max_overflow'], 1)
+        self.assertEqual(self.options['pool_timeout'], 0.05)
+        self.assertEqual(self.options['pool_recycle'], 3600)
+        self.assertFalse(self.options['pool_pre_ping'])
+
+    def test_stats(self):
+        """ stats() reports checked out and overflow connections """
+        first = self.engine.connect()
+        second = self.engine.connect()
+        stats = self.storage.stats()
+        self.assertEqual(stats['size'], 1)
+        self.assertEqual(stats['checked_out'], 2)
+        self.assertEqual(stats['overflow'], 1)
+        with self.assertRaises(TimeoutError):
+            self.engine.connect()
+        stats = self.storage.stats()
+        self.assertEqual(stats['timeouts'], 1)
+        self.assertGreaterEqual(stats['max_wait'], 0.05)
+        self.assertGreaterEqual(stats['wait_time'], stats['max_wait'])
+        first.close()
+        second.close()
+        self.assertEqual(self.storage.stats()['checked_out'], 0)
+
+    @unittest.skipIf(not hasattr(os, 'fork'), "no fork on this platform")
+    def test_fork(self):
+        """ Forked workers start with an empty pool of their own """
+        self.engine.connect().close()
+        self.assertEqual(self.storage.stats()['checked_in'], 1)
+        pid = os.fork()
+        if pid == 0:
+            stats = self.storage.stats()
+            os._exit(0 if stats['checked_in'] == 0 else 1)
+        self.assertEqual(os.waitpid(pid, 0)[1], 0)
+        self.assertEqual(self.storage.stats()['checked_in'], 1)
+
+
+@unittest.skipIf(storage_type != 'db', "not testing db storage")
+class test_DBStorageSQLite(unittest.TestCase):
+    """ Class to test the embedded SQLite backend """
+
+    def setUp(self):
+        """ Open a DBStorage on a temporary SQLite file """
+        from models.engine import db_storage
+        self.workdir = tempfile.mkdtemp()
+        env = {'HBNB_TYPE_STORAGE': 'sqlite',
+               'HBNB_SQLITE_PATH': os.path.join(self.workdir, 'hbnb.db')}
+        with mock.patch.dict(os.environ, env):
+            self.storage = db_storage.DBStorage()
+        self.storage.reload()
+        self.engine = self.storage._DBStorage__engine
+
+    def tearDown(self):
+        """ Dispose of the engine and remove the database files """
+        self.storage.close()
+        self.engine.dispose()
+        for name in os.listdir(self.workdir):
+            os.remove(os.path.join(self.workdir, name))
+        os.rmdir(self.workdir)
+
+    def test_pragmas(self):
+        """ Connections run in WAL mode with foreign keys enforced """
+        with self.engine.connect() as connection:
+            self.assertEqual(connection.execute(
+                text('PRAGMA journal_mode')).scalar(), 'wal')
+            self.assertEqual(connection.execute(
+                text('PRAGMA foreign_keys')).scalar(), 1)
+            self.assertEqual(connection.execute(
+                text('PRAGMA synchronous')).scalar(), 1)
+
+    def test_foreign_key_indexes(self):
+        """ Every foreign key column leads an index or the primary key """
+        inspector = inspect(self.engine)
+        for table in inspector.get_table_names():
+            leading = {index['column_names'][0]
+                       for index in inspector.get_indexes(table)}
+            leading.update(inspector.get_pk_constraint(
+                table)['constrained_columns'][:1])
+            for key in inspector.get_foreign_keys(table):
+                self.assertIn(key['constrained_columns'][0], leading)
+
+    def test_name_indexes(self):
+        """ Name lookups and user emails are indexed """
+        inspector = inspect(self.engine)
+        for table, column in (('states', 'name'), ('cities', 'name')):
+            self.assertIn([column], [index['column_names'] for index in
+                                     inspector.get_indexes(table)])
+        unique = [index['column_names'] for index in
+                  inspector.get_indexes('users') if index['unique']]
+        unique += [constraint['column_names'] for constraint in
+                   inspector.get_unique_constraints('users')]
+        self.assertIn(['email'], unique)
+
+    def test_round_trip(self):
+        """ Models are stored and read back through SQLite """
+        from models.state import State
+        from models.city import City
+        state = State(name="California")
+        self.storage.new(state)
+        self.storage.new(City(name="Fremont", state_id=state.id))
+        self.storage.save()
+        self.storage.close()
+        loaded = self.storage.get(State, state.id)
+        self.assertEqual([city.name for city in loaded.cities], ["Fremont"])
+
+    def other_storage(self):
+        """ A second DBStorage with its own engine on the same file """
+        from models.engine import db_storage
+        env = {'HBNB_TYPE_STORAGE': 'sqlite',
+               'HBNB_SQLITE_PATH': os.path.join(self.workdir, 'hbnb.db')}
+        with mock.patch.dict(os.environ, env):
+            other = db_storage.DBStorage()
+        other.reload()
+        self.addCleanup(other._DBStorage__engine.dispose)
+        self.addCleanup(other.close)
+        return other
+
+    def test_version_shared(self):
+        """ version() changes after commits made through another engine """
+        from models.state import State
+        other = self.other_storage()
+        version = self.storage.version()
+        self.assertEqual(other.version(), version)
+        self.storage.close()
+        other.new(State(name="Nevada"))
+        other.save()
+        self.assertNotEqual(self.storage.version(), version)
+        self.assertEqual(self.storage.version(), other.version())
+
+    def test_cached_page_follows_other_engine(self):
+        """ A page cached by one process is dropped when another writes """
+        from flask import Flask
+        from models.state import State
+        try:
+            from web_flask import page_cache
+        except ImportError:
+            self.skipTest("no storage configured for web_flask")
+        other = self.other_storage()
+        app = Flask(__name__)
+
+        @app.route('/states')
+        @page_cache.cached_page
+        def states():
+            return ','.join(sorted(state.name for state in
+                                   self.storage.all(State).values()))
+        app.teardown_appcontext(lambda exception: self.storage.close())
+        page_cache._pages.clear()
+        client = app.test_client()
+        with mock.patch.object(page_cache, 'storage', self.storage):
+            self.assertEqual(client.get('/states').data, b'')
+            other.new(State(name="Nevada"))
+            other.save()
+            self.assertEqual(client.get('/states').data, b'Nevada')
+
+
+class test_BinaryUUID(unittest.TestCase):
+    """ Class to test the BINARY(16) id column type """
+
+    def test_round_trip(self):
+        """ UUID strings pack into 16 bytes and come back unchanged """
+        from models.base_model import BinaryUUID
+        column = BinaryUUID()
+        value = '0b0e3a4c-7d2f-4b8e-9b6a-3c5d2e1f0a9b'
+        packed = column.process_bind_param(value, None)
+        self.assertEqual(len(packed), 16)
+        self.assertEqual(column.process_result_value(packed, None), value)
+        self.assertIsNone(column.process_bind_param(None, None))
+        self.assertIsNone(column.process_result_value(None, None))
+
+    def test_not_a_uuid(self):
+        """ Ids that are not UUIDs match no row instead of raising """
+        from models.base_model import BinaryUUID
+        from sqlalchemy import Column, MetaData, Table, insert, select
+        table = Table('ids', MetaData(), Column('id', BinaryUUID()))
+        value = '0b0e3a4c-7d2f-4b8e-9b6a-3c5d2e1f0a9b'
+        engine = create_engine('sqlite://')
+        with engine.begin() as connection:
+            table.create(connection)
+            connection.execute(insert(table).values(id=value))
+            for other in ('nope', 12):
+                self.assertEqual(connection.execute(select(table).where(
+                    table.c.id == other)).all(), [])
+            self.assertEqual(connection.execute(select(table.c.id).where(
+                table.c.id == value)).scalar(), value)
+        engine.dispose()
+
+    def test_id_type(self):
+        """ HBNB_BINARY_UUIDS selects the binary column type """
+        from models.base_model import BinaryUUID, id_type
+        with mock.patch.dict(os.environ, {'HBNB_BINARY_UUIDS': '1'}):
+            self.assertIsInstance(id_type(), BinaryUUID)
+        with mock.patch.dict(os.environ, {'HBNB_BINARY_UUIDS': ''}):
+            self.assertNotIsInstance(id_type(), BinaryUUID)
@@ -1,6 +1,8 @@
 #!/usr/bin/python3
 """ Module for testing file storage"""
 import unittest
+from unittest import mock
+import json
 from models.base_model import BaseModel
 from models import storage
 import os
@@ -19,10 +21,15 @@ class test_fileStorage(unittest.TestCase):
 
     def tearDown(self):
         """ Remove storage file at end of tests """
-        try:
-            os.remove('file.json')
-        except:
-            pass
+        vars(storage).pop('_FileStorage__journal', None)
+        type(storage)._FileStorage__format = None
+        type(storage)._FileStorage__detected = None
+        type(storage)._FileStorage__text = None
+        for path in ('file.json', 'file.json.log', 'file.json.text'):
+            try:
+                os.remove(path)
+            except:
+                pass
 
     def test_obj_list_empty(self):
         """ __objects is initially empty """
@@ -76,6 +83,422 @@ class test_fileStorage(unittest.TestCase):
         with self.assertRaises(ValueError):
             storage.reload()
 
+    def test_reload_streaming(self):
+        """ Records split across read chunks are reloaded intact """
+        from models.place import Place
+        place = Place(name="Chez \u00e9t\u00e9 \\ \"quoted\"",
+                      amenity_ids=["a", "b"], latitude=12.5, max_guest=123)
+        place.save()
+        BaseModel().save()
+        saved = {key: obj.to_dict() for key, obj in storage.all().items()}
+        storage.all().clear()
+        storage._FileStorage__read_size = 7
+        try:
+            storage.reload()
+        finally:
+            del storage._FileStorage__read_size
+        self.assertEqual(
+            {key: obj.to_dict() for key, obj in storage.all().items()},
+            saved)
+
+    def test_reload_truncated(self):
+        """ A truncated file is reported as a ValueError """
+        with open('file.json', 'w') as f:
+            f.write('{"BaseModel.1": {"id": ')
+        with self.assertRaises(ValueError):
+            storage.reload()
+
+    def test_reload_lazy(self):
+        """ Lazy reload builds models only when they are looked up """
+        from models.state import State
+        from models.city import City
+        state = State(name="California")
+        state.save()
+        city = City(state_id=state.id, name="Fremont")
+        city.save()
+        BaseModel().save()
+        storage.all().clear()
+        storage._FileStorage__lazy = True
+        try:
+            with mock.patch('json.loads', wraps=json.loads) as loads:
+                storage.reload()
+                self.assertFalse(loads.called)
+        finally:
+            del storage._FileStorage__lazy
+        self.assertEqual(storage.count(), 3)
+        self.assertEqual(storage.count(City), 1)
+        loaded = storage.get(State, state.id)
+        self.assertEqual(loaded.name, "California")
+        self.assertEqual(len(storage._FileStorage__objects), 1)
+        self.assertEqual([c.name for c in loaded.cities], ["Fremont"])
+        storage.save()
+        storage.all().clear()
+        storage.reload()
+        self.assertEqual(len(storage.all()), 3)
+
+    def test_reload_lazy_other_layouts(self):
+        """ Lazy reload also reads snapshots not split one per line """
+        from models.state import State
+        states = [State(name="{Brace}"), State(name="Utah")]
+        with open('file.json', 'w') as f:
+            json.dump({'State.' + state.id: state.to_dict()
+                       for state in states}, f, indent=2)
+        for _ in range(2):
+            storage.all().clear()
+            storage._FileStorage__lazy = True
+            try:
+                storage.reload()
+            finally:
+                del storage._FileStorage__lazy
+            self.assertEqual(sorted(state.name for state in
+                                    storage.all(State).values()),
+                             ["Utah", "{Brace}"])
+            storage.save()
+
+    def test_reload_compact(self):
+        """ Compact reload builds slotted models that behave the same """
+        from models.place import Place
+        place = Place(name="Loft", max_guest=4, amenity_ids=["a"], pets=True)
+        place.save()
+        saved = place.to_dict()
+        storage.all().clear()
+        storage._FileStorage__compact = True
+        try:
+            storage.reload()
+        finally:
+            del storage._FileStorage__compact
+        loaded = storage.get(Place, place.id)
+        self.assertIsInstance(loaded, Place)
+        self.assertIsNot(type(loaded), Place)
+        self.assertEqual(type(loaded).__name__, 'Place')
+        self.assertEqual(loaded.to_dict(), saved)
+        self.assertIn("'name': 'Loft'", str(loaded))
+        self.assertEqual(loaded.description, "")
+        self.assertIn('Place.' + place.id, storage.all(Place))
+        loaded.name = "Attic"
+        storage.save()
+        storage.all().clear()
+        storage.reload()
+        self.assertEqual(storage.get(Place, place.id).name, "Attic")
+
+    def test_compact_size_after_save(self):
+        """ Saving compact models does not give them a __dict__ """
+        import tracemalloc
+        from models.state import State
+        for i in range(200):
+            storage.new(State(name=str(i)))
+        storage.save()
+        storage.all().clear()
+        storage._FileStorage__compact = True
+        try:
+            storage.reload()
+            states = list(storage.all(State).values())
+            tracemalloc.start()
+            try:
+                before = tracemalloc.take_snapshot()
+                for state in states:
+                    state.name = state.name + "!"
+                storage.save()
+                str(states[0])
+                after = tracemalloc.take_snapshot()
+            finally:
+                tracemalloc.stop()
+        finally:
+            del storage._FileStorage__compact
+        grown = sum(stat.size_diff for stat in after.compare_to(
+            before, 'filename') if stat.traceback[0].filename.endswith(
+                'base_model.py'))
+        self.assertLess(grown, 20 * len(states))
+
+    def test_iter_all(self):
+        """ iter_all() yields the same pairs as all(), building lazily """
+        from models.state import State
+        for i in range(5):
+            State(name=str(i)).save()
+        BaseModel().save()
+        self.assertEqual(dict(storage.iter_all(State)), storage.all(State))
+        storage.all().clear()
+        storage._FileStorage__lazy = True
+        try:
+            storage.reload()
+        finally:
+            del storage._FileStorage__lazy
+        states = storage.iter_all('State', batch_size=2)
+        next(states)
+        next(states)
+        self.assertEqual(len(storage._FileStorage__objects), 2)
+        self.assertEqual(len(list(states)), 3)
+        self.assertEqual(len(dict(storage.iter_all())), 6)
+
+    def test_bulk_new(self):
+        """ bulk_new() indexes every object and writes the file once """
+        from unittest import mock
+        from models.city import City
+        from models.engine.file_storage import FileStorage
+        cities = [City(name=str(i), state_id="s") for i in range(5)]
+        with mock.patch.object(FileStorage, 'compact',
+                               autospec=True,
+                               side_effect=FileStorage.compact) as compact:
+            self.assertEqual(storage.bulk_new(iter(cities)), 5)
+        self.assertEqual(compact.call_count, 1)
+        self.assertEqual(storage.count(City), 5)
+        self.assertEqual(len(storage.related(City, 'state_id', "s")), 5)
+        storage.all().clear()
+        storage.reload()
+        self.assertEqual(storage.count(City), 5)
+
+    def test_ordered(self):
+        """ ordered() keeps name-sorted views up to date """
+        from models.state import State
+        from models.city import City
+        state = State(name="Nevada")
+        state.save()
+        for name in ("Reno", "Elko", "Ely"):
+            City(name=name, state_id=state.id).save()
+        City(name="Austin", state_id="other").save()
+        self.assertEqual([c.name for c in state.cities],
+                         ["Elko", "Ely", "Reno"])
+        self.assertEqual([c.name for c in storage.ordered(City)],
+                         ["Austin", "Elko", "Ely", "Reno"])
+        reno = state.cities[-1]
+        reno.name = "Carson City"
+        reno.save()
+        self.assertEqual([c.name for c in state.cities],
+                         ["Carson City", "Elko", "Ely"])
+        storage.delete(reno)
+        self.assertEqual([c.name for c in state.cities], ["Elko", "Ely"])
+        State(name=5).save()
+        State(name=None).save()
+        self.assertEqual([s.name for s in storage.ordered(State)],
+                         [5, "Nevada", None])
+
+    def test_search_places(self):
+        """ search_places() intersects the location and amenity indexes """
+        from models.state import State
+        from models.city import City
+        from models.place import Place
+        state = State()
+        state.save()
+        reno = City(state_id=state.id)
+        reno.save()
+        elsewhere = City(state_id="other")
+        elsewhere.save()
+        cheap = Place(city_id=reno.id, price_by_night=50, max_guest=2,
+                      amenity_ids=["wifi", "pool"])
+        cheap.save()
+        large = Place(city_id=reno.id, price_by_night=300, max_guest=8,
+                      amenity_ids=["wifi"])
+        large.save()
+        away = Place(city_id=elsewhere.id, price_by_night=80, max_guest=4,
+                     amenity_ids=["wifi", "pool"])
+        away.save()
+
+        def ids(**filters):
+            return sorted(place.id for place in
+                          storage.search_places(**filters).values())
+        self.assertEqual(ids(), sorted([cheap.id, large.id, away.id]))
+        self.assertEqual(ids(states=[state.id]),
+                         sorted([cheap.id, large.id]))
+        self.assertEqual(ids(states=[state.id], cities=[elsewhere.id]),
+                         sorted([cheap.id, large.id, away.id]))
+        self.assertEqual(ids(amenities=["wifi", "pool"]),
+                         sorted([cheap.id, away.id]))
+        self.assertEqual(ids(states=[state.id], amenities=["pool"]),
+                         [cheap.id])
+        self.assertEqual(ids(amenities=["sauna"]), [])
+        self.assertEqual(ids(price_range=(60, None)),
+                         sorted([large.id, away.id]))
+        self.assertEqual(ids(price_range=(None, 100), max_guest=3),
+                         [away.id])
+        large.amenity_ids = ["wifi", "pool"]
+        large.save()
+        storage.delete(cheap)
+        self.assertEqual(ids(states=[state.id], amenities=["pool"]),
+                         [large.id])
+
+    def test_search_places_strings(self):
+        """ search_places() compares prices stored as strings as numbers """
+        from models.city import City
+        from models.place import Place
+        reno = City(state_id="nevada")
+        reno.save()
+        cheap = Place(city_id=reno.id, price_by_night=50, max_guest=2)
+        cheap.save()
+        typed = Place(city_id=reno.id, price_by_night="120", max_guest="4")
+        typed.save()
+        Place(city_id=reno.id, price_by_night="free", max_guest="many").save()
+
+        def ids(**filters):
+            return sorted(place.id for place in
+                          storage.search_places(**filters).values())
+        self.assertEqual(ids(price_range=(100, None)), [typed.id])
+        self.assertEqual(ids(price_range=(None, 150)),
+                         sorted([cheap.id, typed.id]))
+        self.assertEqual(ids(cities=[reno.id], price_range=(60, 200)),
+                         [typed.id])
+        self.assertEqual(ids(max_guest=3), [typed.id])
+
+    def test_places_near(self):
+        """ places_near() visits the grid cells around the point """
+        from models.place import Place
+        louvre = Place(name="Louvre", latitude=48.861, longitude=2.336)
+        louvre.save()
+        bastille = Place(name="Bastille", latitude=48.853, longitude=2.369)
+        bastille.save()
+        Place(name="Lyon", latitude=45.764, longitude=4.836).save()
+        Place(name="Fiji", latitude=-17.8, longitude=179.99).save()
+        Place(name="Samoa", latitude=-17.8, longitude=-179.98).save()
+        Place(name="Nowhere", latitude=None, longitude=None).save()
+        Place(name="Unset").save()
+
+        def names(*args, **kwargs):
+            return [place.name for place in
+                    storage.places_near(*args, **kwargs)]
+        self.assertEqual(names(48.8566, 2.3522, 5), ["Louvre", "Bastille"])
+        self.assertEqual(names(48.8566, 2.3522, 5, limit=1), ["Louvre"])
+        self.assertEqual(names(48.8566, 2.3522, 500),
+                         ["Louvre", "Bastille", "Lyon"])
+        self.assertEqual(names(-17.8, 180, 5), ["Fiji", "Samoa"])
+        self.assertEqual(len(storage.places_near(0, 0, 20100)), 5)
+        self.assertEqual(names(0.01, 0.01, 5), [])
+        bastille.latitude, bastille.longitude = 45.76, 4.83
+        bastille.save()
+        storage.delete(louvre)
+        self.assertEqual(names(48.8566, 2.3522, 5), [])
+        self.assertEqual(names(45.764, 4.836, 5), ["Lyon", "Bastille"])
+        storage.all().clear()
+        storage._FileStorage__lazy = True
+        try:
+            storage.reload()
+        finally:
+            del storage._FileStorage__lazy
+        self.assertEqual(names(45.764, 4.836, 5), ["Lyon", "Bastille"])
+        storage.all().clear()
+        storage._FileStorage__compact = True
+        try:
+            storage.reload()
+            self.assertEqual(names(0.01, 0.01, 5), [])
+        finally:
+            del storage._FileStorage__compact
+            storage.all().clear()
+            storage.reload()
+        with self.assertRaises(ValueError):
+            storage.places_near(91, 0, 5)
+
+    def test_search_text(self):
+        """ search_text() ranks with BM25 and follows saves and deletes """
+        from models.place import Place
+        from models.review import Review
+        from models.engine.text_index import TextIndex
+        loft = Place(name="Loft", description="Sunny loft by the beach")
+        loft.save()
+        house = Place(name="Beach house", description="Beach access")
+        house.save()
+        Review(text="The beach was lovely").save()
+
+        def names(query, limit=10):
+            return [place.name for place in
+                    storage.search_text(Place, query, limit)]
+        self.assertEqual(names("beach"), ["Beach house", "Loft"])
+        self.assertEqual(names("beach", 1), ["Beach house"])
+        self.assertEqual(names("sunny"), ["Loft"])
+        self.assertEqual(len(storage.search_text('Review', "beach")), 1)
+        house.description = "Sunny sunny garden"
+        house.save()
+        self.assertEqual(names("sunny"), ["Beach house", "Loft"])
+        storage.delete(loft)
+        storage.save()
+        self.assertEqual(names("sunny"), ["Beach house"])
+        self.assertTrue(os.path.exists('file.json.text'))
+
+        storage.all().clear()
+        storage._FileStorage__lazy = True
+        try:
+            with mock.patch.object(TextIndex, 'add') as add:
+                storage.reload()
+                self.assertEqual(names("garden"), ["Beach house"])
+                self.assertFalse(add.called)
+        finally:
+            del storage._FileStorage__lazy
+        self.assertEqual(storage.search_text('User', "beach"), [])
+
+    def test_search_text_saved_incrementally(self):
+        """ Saves append their text index changes instead of a dump """
+        from models.place import Place
+        from models.user import User
+        Place(name="Loft").save()
+        storage.search_text(Place, "loft")
+        storage.save()
+        dumped = os.stat('file.json.text')
+        Place(name="Garden shed").save()
+        User().save()
+        appended = os.stat('file.json.text')
+        self.assertEqual(appended.st_ino, dumped.st_ino)
+        self.assertLess(appended.st_size - dumped.st_size, 300)
+
+        storage.all().clear()
+        storage.reload()
+        self.assertEqual([place.name for place in
+                          storage.search_text(Place, "shed")],
+                         ["Garden shed"])
+        type(storage)._FileStorage__text_appended = \
+            type(storage)._FileStorage__text_size
+        storage.save()
+        self.assertNotEqual(os.stat('file.json.text').st_ino,
+                            dumped.st_ino)
+        self.assertEqual(len(storage.search_text(Place, "shed loft")), 2)
+
+    def test_aggregate(self):
+        """ aggregate() groups by attributes and by the city's state """
+        from models.state import State
+        from models.city import City
+        from models.place import Place
+        state = State()
+        state.save()
+        reno = City(state_id=state.id)
+        reno.save()
+        elko = City(state_id=state.id)
+        elko.save()
+        for city, price, guests in ((reno, 100, 2), (reno, 300, 4),
+                                    (elko, 50, 6)):
+            Place(city_id=city.id, price_by_night=price,
+                  max_guest=guests).save()
+        by_city = storage.aggregate(Place, 'price_by_night', 'city_id',
+                                    percentiles=[50])
+        self.assertEqual(by_city[reno.id]['count'], 2)
+        self.assertEqual(by_city[reno.id]['mean'], 200)
+        self.assertEqual(by_city[reno.id]['p50'], 200)
+        self.assertEqual(by_city[elko.id]['max'], 50)
+        by_state = storage.aggregate('Place', 'max_guest', 'state_id')
+        self.assertEqual(by_state[state.id]['sum'], 12)
+        self.assertEqual(storage.aggregate(City, group_by='state_id'),
+                         {state.id: {'count': 2}})
+        with self.assertRaises(AttributeError):
+            storage.aggregate(Place, 'nope')
+        with self.assertRaises(AttributeError):
+            storage.aggregate(Place, 'max_guest', 'nope')
+
+    def test_binary_format(self):
+        """ Binary snapshots round-trip and are detected on reload """
+        from models.place import Place
+        place = Place(name="Loft", max_guest=4, latitude=37.5,
+                      amenity_ids=["a"], description=None, wifi=True)
+        place.save()
+        BaseModel().save()
+        saved = {key: obj.to_dict() for key, obj in storage.all().items()}
+        storage.convert('binary')
+        with open('file.json', 'rb') as f:
+            self.assertEqual(f.read(8), b'HBNB\x00BIN')
+        type(storage)._FileStorage__format = None
+        storage.all().clear()
+        storage.reload()
+        self.assertEqual(
+            {key: obj.to_dict() for key, obj in storage.all().items()},
+            saved)
+        BaseModel().save()
+        with open('file.json', 'rb') as f:
+            self.assertEqual(f.read(8), b'HBNB\x00BIN')
+
     def test_reload_from_nonexistent(self):
         """ Nothing happens if file does not exist """
         self.assertEqual(storage.reload(), None)
@@ -102,6 +525,160 @@ class test_fileStorage(unittest.TestCase):
     #         temp = key
     #     self.assertEqual(temp, 'BaseModel' + '.' + _id)
 
+    def test_all_cls(self):
+        """ all(cls) only returns objects of that class """
+        from models.state import State
+        state = State()
+        state.save()
+        base = BaseModel()
+        base.save()
+        self.assertEqual(list(storage.all(State).keys()),
+                         [f'State.{state.id}'])
+        self.assertEqual(list(storage.all('State').keys()),
+                         [f'State.{state.id}'])
+        self.assertEqual(len(storage.all(BaseModel)), 2)
+
+    def test_all_cls_after_delete(self):
+        """ Class index follows delete() and direct removals """
+        from models.state import State
+        first = State()
+        first.save()
+        second = State()
+        second.save()
+        storage.delete(first)
+        self.assertEqual(list(storage.all(State)), [f'State.{second.id}'])
+        del storage.all()[f'State.{second.id}']
+        self.assertEqual(storage.all(State), {})
+
+    def test_all_cls_after_replace(self):
+        """ Class index follows objects replaced under the same key """
+        from models.state import State
+        from models.city import City
+        state = State()
+        city = City(state_id=state.id)
+        city.save()
+        key = f'City.{city.id}'
+        other = City(id=city.id, state_id='elsewhere')
+        storage.all()[key] = other
+        self.assertIs(storage.all(City)[key], other)
+        self.assertEqual(storage.related(City, 'state_id', state.id), {})
+        self.assertEqual(storage.related(City, 'state_id', 'elsewhere'),
+                         {key: other})
+
+    def test_related(self):
+        """ Reverse foreign key index backs State.cities """
+        from models.state import State
+        from models.city import City
+        state = State()
+        state.save()
+        city = City(state_id=state.id)
+        city.save()
+        other = City(state_id='elsewhere')
+        other.save()
+        self.assertEqual(state.cities, [city])
+        self.assertEqual(list(storage.related(City, 'state_id', state.id)),
+                         [f'City.{city.id}'])
+
+    def test_related_after_update(self):
+        """ Reverse index follows foreign keys changed through save() """
+        from models.state import State
+        from models.city import City
+        first = State()
+        second = State()
+        city = City(state_id=first.id)
+        city.save()
+        city.state_id = second.id
+        city.save()
+        self.assertEqual(first.cities, [])
+        self.assertEqual(second.cities, [city])
+        storage.delete(city)
+        self.assertEqual(second.cities, [])
+
+    def test_journal_save(self):
+        """ Journal mode appends records instead of rewriting file.json """
+        storage._FileStorage__journal = True
+        first = BaseModel()
+        first.save()
+        second = BaseModel()
+        second.save()
+        storage.delete(first)
+        storage.save()
+        self.assertFalse(os.path.exists('file.json'))
+        with open('file.json.log') as f:
+            self.assertEqual(len(f.readlines()), 3)
+        storage.all().clear()
+        storage.reload()
+        self.assertEqual(list(storage.all()), [f'BaseModel.{second.id}'])
+
+    def test_journal_torn_line(self):
+        """ A torn last line is dropped before the next save appends """
+        storage._FileStorage__journal = True
+        first = BaseModel()
+        first.save()
+        with open('file.json.log', 'a') as f:
+            f.write('{"key": "BaseModel.torn", "val')
+        storage.all().clear()
+        storage.reload()
+        second = BaseModel()
+        second.save()
+        storage.all().clear()
+        storage.reload()
+        self.assertEqual(sorted(storage.all()),
+                         sorted([f'BaseModel.{first.id}',
+                                 f'BaseModel.{second.id}']))
+
+    def test_journal_compaction(self):
+        """ Journal is folded into a snapshot past its size limit """
+        storage._FileStorage__journal = True
+        storage._FileStorage__journal_max = 0
+        try:
+            new = BaseModel()
+            new.save()
+        finally:
+            del storage._FileStorage__journal_max
+        self.assertFalse(os.path.exists('file.json.log'))
+        with open('file.json') as f:
+            self.assertIn(f'BaseModel.{new.id}', json.load(f))
+
+    def test_save_clean_objects_cached(self):
+        """ save() only serializes objects modified since the last save """
+        from unittest import mock
+        clean = BaseModel()
+        changed = BaseModel()
+        storage.new(clean)
+        storage.new(changed)
+        storage.save()
+        changed.name = "dirty"
+        with mock.patch.object(BaseModel, 'to_dict', autospec=True,
+                               side_effect=BaseModel.to_dict) as to_dict:
+            storage.save()
+            to_dict.assert_called_once_with(changed)
+        with open('file.json') as f:
+            saved = json.load(f)
+        self.assertEqual(saved[f'BaseModel.{changed.id}']['name'], "dirty")
+        self.assertIn(f'BaseModel.{clean.id}', saved)
+
+    def test_batch_defers_save(self):
+        """ Saves inside a batch are written once when it closes """
+        with storage.batch():
+            first = BaseModel()
+            first.save()
+            second = BaseModel()
+            second.save()
+            self.assertFalse(os.path.exists('file.json'))
+        with open('file.json') as f:
+            self.assertEqual(len(json.load(f)), 2)
+
+    def test_batch_rollback(self):
+        """ An exception inside a batch restores the saved state """
+        kept = BaseModel()
+        kept.save()
+        with self.assertRaises(RuntimeError):
+            with storage.transaction():
+                BaseModel().save()
+                raise RuntimeError
+        self.assertEqual(list(storage.all()), [f'BaseModel.{kept.id}'])
+
     def test_storage_var_created(self):
         """ FileStorage object storage created """
         from models.engine.file_storage import FileStorage
@@ -0,0 +1,86 @@
+#!/usr/bin/python3
+""" Module for testing the BM25 text index"""
+import io
+import unittest
+from models.engine.text_index import TextIndex, document, dump, load
+from models.engine.text_index import dump_changes, tokenize
+
+
+class test_TextIndex(unittest.TestCase):
+    """ Class to test tokenizing and ranking """
+
+    def setUp(self):
+        """ Index three short documents """
+        self.index = TextIndex()
+        self.index.add('Place.1', "Cozy loft near the beach")
+        self.index.add('Place.2', "Beach house, beach access, beach view")
+        self.index.add('Place.3', "Quiet cabin in the woods")
+
+    def keys(self, query, limit=10):
+        """ Return the keys found for query, best first """
+        return [key for _, key in self.index.search(query, limit)]
+
+    def test_tokenize(self):
+        """ Words are lowercased and split on punctuation """
+        self.assertEqual(tokenize("Cozy, sunny LOFT!"),
+                         ["cozy", "sunny", "loft"])
+        self.assertEqual(tokenize(None), [])
+
+    def test_rank(self):
+        """ More frequent and rarer terms rank higher """
+        self.assertEqual(self.keys("beach"), ['Place.2', 'Place.1'])
+        self.assertEqual(self.keys("cozy beach"), ['Place.1', 'Place.2'])
+        self.assertEqual(self.keys("beach", limit=1), ['Place.2'])
+        self.assertEqual(self.keys("castle"), [])
+        self.assertEqual(len(self.index.search("the", None)), 2)
+
+    def test_update(self):
+        """ add() replaces a document and remove() drops it """
+        self.index.add('Place.2', "Mountain chalet")
+        self.assertEqual(self.keys("beach"), ['Place.1'])
+        self.index.remove('Place.1')
+        self.index.remove('Place.1')
+        self.assertEqual(self.keys("beach"), [])
+        self.assertNotIn('beach', self.index.postings)
+        self.assertEqual(self.index.total, 7)
+
+    def test_dump_load(self):
+        """ load() restores what dump() saved, renumbering documents """
+        self.index.remove('Place.1')
+        out = io.BytesIO()
+        dump({'Place': self.index}, [1, 2], out)
+        out.seek(0)
+        self.assertIsNone(load(out, [1, 3]))
+        out.seek(0)
+        copy = load(out, [1, 2])['Place']
+        self.assertEqual(copy.search("beach"), self.index.search("beach"))
+        self.assertEqual(copy.keys, ['Place.2', 'Place.3'])
+        self.assertEqual(copy.total, self.index.total)
+        copy.add('Place.3', "Beach hut")
+        self.assertEqual(self.keys("beach"), ['Place.2'])
+        self.assertEqual(sorted(key for _, key in copy.search("beach")),
+                         ['Place.2', 'Place.3'])
+        self.assertNotIn('woods', copy.postings)
+
+    def test_dump_changes(self):
+        """ load() applies appended changes and takes their snapshot """
+        out = io.BytesIO()
+        dump({'Place': self.index}, [1, 2], out)
+        dump_changes({'Place': {'Place.1': None, 'Place.4': "Beach"}},
+                     [1, 3], out)
+        out.seek(0)
+        self.assertIsNone(load(out, [1, 2]))
+        out.seek(0)
+        copy = load(out, [1, 3])['Place']
+        self.assertEqual(sorted(key for _, key in copy.search("beach")),
+                         ['Place.2', 'Place.4'])
+        out.write(b'{"snapshot": [1, 4], "chan')
+        out.seek(0)
+        self.assertIsNotNone(load(out, [1, 3]))
+
+    def test_document(self):
+        """ document() joins the indexed attributes of a class """
+        self.assertEqual(document('Place', {'name': "Loft",
+                                            'description': "Sunny"}),
+                         "Loft Sunny")
+        self.assertEqual(document('Review', {'text': None}), "")
@@ -0,0 +1,59 @@
+#!/usr/bin/python3
+""" Module for testing the web_flask application factory"""
+import unittest
+from models import storage, storage_type
+from models.city import City
+from models.state import State
+from web_flask.app import create_app
+import os
+
+
+class test_create_app(unittest.TestCase):
+    """ Class to test the unified web_flask app """
+
+    def setUp(self):
+        """ Build a test client on an empty text index """
+        if storage_type != 'db':
+            type(storage)._FileStorage__text = None
+        self.client = create_app({'TESTING': True}).test_client()
+
+    def tearDown(self):
+        """ Remove storage files and the text index at end of tests """
+        if storage_type != 'db':
+            type(storage)._FileStorage__text = None
+        for path in ('file.json', 'file.json.log', 'file.json.text'):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def test_basic_routes(self):
+        """ Routes of the text scripts answer with and without slash """
+        self.assertEqual(self.client.get('/').data, b'Hello HBNB!')
+        self.assertEqual(self.client.get('/hbnb/').data, b'HBNB')
+        self.assertEqual(self.client.get('/c/is_fun').data, b'C is fun')
+        self.assertEqual(self.client.get('/python').data, b'Python is cool')
+        self.assertIn(b'is odd',
+                      self.client.get('/number_odd_or_even/3').data)
+
+    def test_state_routes(self):
+        """ Storage backed routes render stored states """
+        state = State(name="Nevada")
+        state.save()
+        for route in ('/states_list', '/cities_by_states', '/states',
+                      '/states/' + state.id, '/hbnb_filters'):
+            response = self.client.get(route)
+            self.assertEqual(response.status_code, 200)
+            self.assertIn(b'Nevada', response.data)
+
+    def test_state_by_id(self):
+        """ A state page lists its cities, unknown ids are not found """
+        state = State(name="Nevada")
+        state.save()
+        City(name="Reno", state_id=state.id).save()
+        data = self.client.get('/states/' + state.id).data
+        self.assertIn(b'State: Nevada', data)
+        self.assertIn(b'Reno', data)
+        response = self.client.get('/states/nope')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'Not found!', response.data)
@@ -0,0 +1,76 @@
+#!/usr/bin/python3
+""" Module for testing the web_flask page cache"""
+import unittest
+from flask import Flask
+from models import storage, storage_type
+from models.state import State
+from web_flask import page_cache
+import os
+
+
+class test_cached_page(unittest.TestCase):
+    """ Class to test cached_page() on a throwaway app """
+
+    def setUp(self):
+        """ Register a cached view that counts its renders """
+        if storage_type != 'db':
+            type(storage)._FileStorage__text = None
+        page_cache._pages.clear()
+        self.renders = 0
+        app = Flask(__name__)
+
+        @app.route('/page')
+        @page_cache.cached_page
+        def page():
+            self.renders += 1
+            return 'render {}'.format(self.renders)
+        self.client = app.test_client()
+
+    def tearDown(self):
+        """ Remove storage files and the text index at end of tests """
+        if storage_type != 'db':
+            type(storage)._FileStorage__text = None
+        for path in ('file.json', 'file.json.log', 'file.json.text'):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def test_cached_until_storage_changes(self):
+        """ Pages are rendered again only after a save() """
+        first = self.client.get('/page')
+        self.assertEqual(self.client.get('/page').data, first.data)
+        self.assertEqual(self.renders, 1)
+        State(name="Nevada").save()
+        self.assertEqual(self.client.get('/page').data, b'render 2')
+        self.assertEqual(self.client.get('/page?x=1').data, b'render 3')
+
+    def test_etag(self):
+        """ A matching If-None-Match gets a 304 until storage changes """
+        etag = self.client.get('/page').headers['ETag']
+        response = self.client.get('/page', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b'')
+        obj = State(name="Nevada")
+        obj.save()
+        response = self.client.get('/page', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+        etag = response.headers['ETag']
+        storage.delete(obj)
+        storage.save()
+        self.assertNotEqual(self.client.get('/page').headers['ETag'], etag)
+
+    def test_etag_shared_by_workers(self):
+        """ The ETag depends on the page alone, not on the process """
+        app = Flask(__name__)
+
+        @app.route('/fixed')
+        @page_cache.cached_page
+        def fixed():
+            return 'fixed'
+        client = app.test_client()
+        etag = client.get('/fixed').headers['ETag']
+        page_cache._pages.clear()
+        response = client.get('/fixed', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
@@ -5,23 +5,26 @@ starts a Flask web application
 
 from flask import Flask, render_template
 from models import *
-from models import storage
+from models import storage, storage_type
+from web_flask.page_cache import cached_page
 app = Flask(__name__)
 
 
 @app.route('/hbnb_filters', strict_slashes=False)
+@cached_page
 def filters():
     """display a HTML page like 6-index.html from static"""
-    states = storage.all("State").values()
-    amenities = storage.all("Amenity").values()
+    states = storage.ordered("State", load=["cities"])
+    amenities = storage.ordered("Amenity")
     return render_template('10-hbnb_filters.html', states=states,
                            amenities=amenities)
 
 
-@app.teardown_appcontext
-def teardown_db(exception):
-    """closes the storage on teardown"""
-    storage.close()
+if storage_type == "db":
+    @app.teardown_appcontext
+    def teardown_db(exception):
+        """closes the storage on teardown"""
+        storage.close()
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port='5000')
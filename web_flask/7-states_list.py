@@ -5,21 +5,24 @@ starts a Flask web application
 
 from flask import Flask, render_template
 from models import *
-from models import storage
+from models import storage, storage_type
+from web_flask.page_cache import cached_page
 app = Flask(__name__)
 
 
 @app.route('/states_list', strict_slashes=False)
+@cached_page
 def states_list():
     """display a HTML page with the states listed in alphabetical order"""
-    states = sorted(list(storage.all("State").values()), key=lambda x: x.name)
+    states = storage.ordered("State")
     return render_template('7-states_list.html', states=states)
 
 
-@app.teardown_appcontext
-def teardown_db(exception):
-    """closes the storage on teardown"""
-    storage.close()
+if storage_type == "db":
+    @app.teardown_appcontext
+    def teardown_db(exception):
+        """closes the storage on teardown"""
+        storage.close()
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port='5000')
@@ -5,21 +5,24 @@ starts a Flask web application
 
 from flask import Flask, render_template
 from models import *
-from models import storage
+from models import storage, storage_type
+from web_flask.page_cache import cached_page
 app = Flask(__name__)
 
 
 @app.route('/cities_by_states', strict_slashes=False)
+@cached_page
 def cities_by_states():
     """display the states and cities listed in alphabetical order"""
-    states = storage.all("State").values()
+    states = storage.ordered("State", load=["cities"])
     return render_template('8-cities_by_states.html', states=states)
 
 
-@app.teardown_appcontext
-def teardown_db(exception):
-    """closes the storage on teardown"""
-    storage.close()
+if storage_type == "db":
+    @app.teardown_appcontext
+    def teardown_db(exception):
+        """closes the storage on teardown"""
+        storage.close()
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port='5000')
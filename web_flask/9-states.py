@@ -5,24 +5,30 @@ starts a Flask web application
 
 from flask import Flask, render_template
 from models import *
-from models import storage
+from models import storage, storage_type
+from web_flask.page_cache import cached_page
 app = Flask(__name__)
 
 
 @app.route('/states', strict_slashes=False)
 @app.route('/states/<state_id>', strict_slashes=False)
+@cached_page
 def states(state_id=None):
     """display the states and cities listed in alphabetical order"""
-    states = storage.all("State")
-    if state_id is not None:
-        state_id = 'State.' + state_id
-    return render_template('9-states.html', states=states, state_id=state_id)
+    states = state = None
+    if state_id is None:
+        states = storage.ordered("State")
+    else:
+        state = storage.get("State", state_id)
+    return render_template('9-states.html', states=states, state=state,
+                           state_id=state_id)
 
 
-@app.teardown_appcontext
-def teardown_db(exception):
-    """closes the storage on teardown"""
-    storage.close()
+if storage_type == "db":
+    @app.teardown_appcontext
+    def teardown_db(exception):
+        """closes the storage on teardown"""
+        storage.close()
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port='5000')
@@ -0,0 +1,39 @@
+#!/usr/bin/python3
+"""
+application factory serving every web_flask route from one app
+
+Run it under a WSGI server, e.g.
+    gunicorn --workers 4 --preload 'web_flask.wsgi:app'
+or with the development server:
+    python3 -m web_flask.app
+"""
+
+from flask import Flask
+from models import storage, storage_type
+from os import getenv
+from web_flask.blueprints.basic import basic
+from web_flask.blueprints.states import states
+
+
+def create_app(config=None):
+    """build the app; config overrides HBNB_FLASK_* settings"""
+    app = Flask(__name__)
+    app.config.from_prefixed_env('HBNB_FLASK')
+    if config:
+        app.config.update(config)
+    app.url_map.strict_slashes = False
+    app.register_blueprint(basic)
+    app.register_blueprint(states)
+
+    if storage_type == "db":
+        @app.teardown_appcontext
+        def teardown_db(exception):
+            """hands the request's session back to the pool"""
+            storage.close()
+
+    return app
+
+
+if __name__ == '__main__':
+    create_app().run(host=getenv('HBNB_API_HOST', '0.0.0.0'),
+                     port=int(getenv('HBNB_API_PORT', '5000')))
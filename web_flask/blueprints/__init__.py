@@ -0,0 +1,4 @@
+#!/usr/bin/python3
+"""
+blueprints with the routes of the numbered web_flask scripts
+"""
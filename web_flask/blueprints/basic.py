@@ -0,0 +1,53 @@
+#!/usr/bin/python3
+"""
+text and number routes of scripts 0 to 6
+"""
+
+from flask import Blueprint, render_template
+
+basic = Blueprint('basic', __name__)
+
+
+@basic.route('/')
+def index():
+    """returns Hello HBNB!"""
+    return 'Hello HBNB!'
+
+
+@basic.route('/hbnb')
+def hbnb():
+    """returns HBNB"""
+    return 'HBNB'
+
+
+@basic.route('/c/<text>')
+def cisfun(text):
+    """display “C ” followed by the value of the text variable"""
+    return 'C ' + text.replace('_', ' ')
+
+
+@basic.route('/python')
+@basic.route('/python/<text>')
+def pythoniscool(text='is cool'):
+    """display “Python ”, followed by the value of the text variable"""
+    return 'Python ' + text.replace('_', ' ')
+
+
+@basic.route('/number/<int:n>')
+def imanumber(n):
+    """display “n is a number” only if n is an integer"""
+    return "{:d} is a number".format(n)
+
+
+@basic.route('/number_template/<int:n>')
+def numbersandtemplates(n):
+    """display a HTML page only if n is an integer"""
+    return render_template('5-number.html', n=n)
+
+
+@basic.route('/number_odd_or_even/<int:n>')
+def numbersandevenness(n):
+    """display a HTML page only if n is an integer"""
+    evenness = 'even' if n % 2 == 0 else 'odd'
+    return render_template('6-number_odd_or_even.html', n=n,
+                           evenness=evenness)
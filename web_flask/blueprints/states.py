@@ -0,0 +1,50 @@
+#!/usr/bin/python3
+"""
+storage backed routes of scripts 7 to 10
+"""
+
+from flask import Blueprint, render_template
+from models import storage
+from web_flask.page_cache import cached_page
+
+states = Blueprint('states', __name__)
+
+
+@states.route('/states_list')
+@cached_page
+def states_list():
+    """display a HTML page with the states listed in alphabetical order"""
+    states = storage.ordered("State")
+    return render_template('7-states_list.html', states=states)
+
+
+@states.route('/cities_by_states')
+@cached_page
+def cities_by_states():
+    """display the states and cities listed in alphabetical order"""
+    states = storage.ordered("State", load=["cities"])
+    return render_template('8-cities_by_states.html', states=states)
+
+
+@states.route('/states')
+@states.route('/states/<state_id>')
+@cached_page
+def states_by_id(state_id=None):
+    """display the states, or the cities of one state"""
+    states = state = None
+    if state_id is None:
+        states = storage.ordered("State")
+    else:
+        state = storage.get("State", state_id)
+    return render_template('9-states.html', states=states, state=state,
+                           state_id=state_id)
+
+
+@states.route('/hbnb_filters')
+@cached_page
+def filters():
+    """display a HTML page like 6-index.html from static"""
+    states = storage.ordered("State", load=["cities"])
+    amenities = storage.ordered("Amenity")
+    return render_template('10-hbnb_filters.html', states=states,
+                           amenities=amenities)
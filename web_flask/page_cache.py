@@ -0,0 +1,54 @@
+#!/usr/bin/python3
+"""
+caches rendered pages until storage changes
+"""
+
+from collections import OrderedDict
+from functools import wraps
+from flask import make_response, request
+from models import storage
+import hashlib
+import threading
+
+# pages kept per process; the least recently used are dropped first
+MAX_PAGES = 1024
+
+_pages = OrderedDict()
+_lock = threading.Lock()
+
+
+def cached_page(view):
+    """serve the view from cache while storage.version() is unchanged
+
+    Pages are keyed on the path and query string. Their ETag is a hash
+    of the body, so every worker sends the same one for the same page;
+    clients that send it back in If-None-Match get a 304 with no body.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        version = storage.version()
+        key = (request.path, request.query_string)
+        with _lock:
+            page = _pages.get(key)
+            if page is not None and page[0] == version:
+                _pages.move_to_end(key)
+            else:
+                page = None
+        if page is None:
+            body = view(*args, **kwargs)
+            data = body.encode('utf-8') if isinstance(body, str) else body
+            etag = hashlib.blake2b(data, digest_size=16).hexdigest()
+            page = (version, body, etag)
+            with _lock:
+                _pages[key] = page
+                _pages.move_to_end(key)
+                while len(_pages) > MAX_PAGES:
+                    _pages.popitem(last=False)
+        version, body, etag = page
+        if etag in request.if_none_match:
+            response = make_response('', 304)
+        else:
+            response = make_response(body)
+        response.set_etag(etag)
+        return response
+    return wrapper
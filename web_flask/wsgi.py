@@ -0,0 +1,8 @@
+#!/usr/bin/python3
+"""
+WSGI entry point: gunicorn 'web_flask.wsgi:app'
+"""
+
+from web_flask.app import create_app
+
+app = create_app()